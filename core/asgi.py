@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+if not settings.DEBUG:
+    # Estáticos pré-compactados e com cache imutável, servidos antes do Django (utils/estaticos.py).
+    from utils.estaticos import ServidorEstaticos
+    application = ServidorEstaticos(application)
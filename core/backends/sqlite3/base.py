@@ -0,0 +1,92 @@
+# core/backends/sqlite3/base.py
+"""
+Backend SQLite ajustado para vários processos (workers do gunicorn) no mesmo arquivo.
+
+Em cada conexão nova aplica os PRAGMAs de `PRAGMAS_PADRAO`, que podem ser
+sobrescritos (ou desligados com None) em `OPTIONS['pragmas']`:
+- `journal_mode=WAL`: leitores não esperam o escritor, nem ele a eles;
+- `synchronous=NORMAL`: seguro com WAL; só o último commit pode se perder numa queda de energia;
+- `busy_timeout`: espera o lock em vez de falhar com "database is locked";
+- `mmap_size`, `cache_size` e `temp_store`: menos syscalls e leituras de disco.
+
+As transações (`atomic`) começam com `BEGIN IMMEDIATE` (`OPTIONS['transaction_mode']`,
+nativo do Django): o lock de escrita é pedido logo no início, e o `busy_timeout`
+vale para ele. Com `BEGIN` comum, duas transações que leram e depois tentam
+escrever se bloqueiam, e uma falha na hora, sem esperar.
+
+A cada `OPTIONS['intervalo_manutencao']` segundos (por processo), um commit ou
+o fechamento de uma conexão roda `PRAGMA optimize` e um checkpoint PASSIVE do WAL,
+para o arquivo -wal não crescer quando há leitores o tempo todo.
+"""
+import logging
+import threading
+import time
+
+from django.db.backends.sqlite3 import base
+
+logger = logging.getLogger(__name__)
+
+PRAGMAS_PADRAO = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,             # ms
+    'mmap_size': 256 * 1024 * 1024,   # bytes
+    'cache_size': -64 * 1024,         # negativo = KiB
+    'temp_store': 'MEMORY',
+}
+INTERVALO_MANUTENCAO = 300  # segundos
+
+_ultima_manutencao = time.monotonic()
+_trava_manutencao = threading.Lock()
+
+
+def _hora_da_manutencao(intervalo):
+    """ True para uma única chamada por intervalo, no processo inteiro. """
+    global _ultima_manutencao
+    agora = time.monotonic()
+    if agora - _ultima_manutencao < intervalo or not _trava_manutencao.acquire(blocking=False):
+        return False
+    try:
+        if agora - _ultima_manutencao < intervalo:
+            return False
+        _ultima_manutencao = agora
+        return True
+    finally:
+        _trava_manutencao.release()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        # Opções deste backend: não são parâmetros de `sqlite3.connect`.
+        self.pragmas = {**PRAGMAS_PADRAO, **kwargs.pop('pragmas', {})}
+        self.intervalo_manutencao = kwargs.pop('intervalo_manutencao', INTERVALO_MANUTENCAO)
+        if 'transaction_mode' not in self.settings_dict['OPTIONS']:
+            self.transaction_mode = 'IMMEDIATE'
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for pragma, valor in self.pragmas.items():
+            if valor is not None:
+                conn.execute(f'PRAGMA {pragma} = {valor}')
+        return conn
+
+    def _commit(self):
+        super()._commit()
+        self._manutencao_periodica()
+
+    def _close(self):
+        self._manutencao_periodica()
+        super()._close()
+
+    def _manutencao_periodica(self):
+        if self.connection is None or self.is_in_memory_db() or not _hora_da_manutencao(self.intervalo_manutencao):
+            return
+        try:
+            self.connection.execute('PRAGMA optimize')
+            self.connection.execute('PRAGMA wal_checkpoint(PASSIVE)')
+        except base.Database.Error:
+            # Manutenção é oportunista: um lock ocupado agora não deve falhar a requisição.
+            logger.warning('Falha na manutenção periódica do SQLite.', exc_info=True)
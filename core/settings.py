@@ -39,10 +39,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Só é ativado com PERFIL_SQL_AMOSTRAGEM (ver abaixo e utils/perfil_sql.py).
+    'utils.perfil_sql.PerfilSQLMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'instituicao.middleware.InstituicaoMiddleware',
+    # Só é ativado com REPLICAS_LEITURA (ver abaixo e utils/replicas.py).
+    'utils.replicas.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -61,7 +66,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
-                'usuario.context_processors.set_breadcrumb',
+                'usuario.context_processors.autorizacao',
                 'utils.context_processors.institutional_context',
             ],
         },
@@ -76,12 +81,65 @@ WSGI_APPLICATION = 'core.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # SQLite com WAL, busy_timeout, mmap e BEGIN IMMEDIATE (ver core/backends/sqlite3/base.py).
+        'ENGINE': 'core.backends.sqlite3',
         # CORRIGIDO: Agora BASE_DIR é um objeto Path, permitindo o operador /
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Sobrescreve os PRAGMAs padrão do backend (None desliga um deles), ex.:
+            # 'pragmas': {'busy_timeout': 10000, 'mmap_size': 512 * 1024 * 1024},
+        },
+    }
+}
+
+# Réplica de leitura (opcional): SI_REPLICA_SQLITE=/caminho/replica.sqlite3 cria
+# o alias 'replica', atualizado a partir do primário com
+# `python manage.py atualizar_replica --intervalo 30`. GETs vão para a réplica,
+# exceto views com `usar_primario` e os segundos seguintes a um POST do mesmo usuário.
+REPLICAS_LEITURA = []
+REPLICA_JANELA_PRIMARIO = 10  # segundos
+
+if os.environ.get('SI_REPLICA_SQLITE'):
+    DATABASES['replica'] = {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.environ['SI_REPLICA_SQLITE'],
+        'OPTIONS': {
+            # O backup copia o modo do primário; a réplica não deve trocá-lo.
+            'pragmas': {'journal_mode': None},
+        },
+        # Nos testes, o alias aponta para o banco de teste do primário.
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICAS_LEITURA = ['replica']
+    DATABASE_ROUTERS = ['utils.replicas.RoteadorReplicas']
+
+
+# Perfil SQL por requisição (Server-Timing e log JSON no logger utils.perfil_sql):
+# SI_PERFIL_SQL=0.05 mede 5% das requisições; 0 ou ausente desliga.
+PERFIL_SQL_AMOSTRAGEM = float(os.environ.get('SI_PERFIL_SQL', 0))
+PERFIL_SQL_LIMITE_N1 = 5  # mesma consulta repetida este número de vezes = N+1
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# O LocMemCache é local a cada processo: as invalidações (autorização, municípios...)
+# só alcançam os demais workers quando o cache é compartilhado, e o progresso das
+# tarefas em segundo plano só é visto pelo processo que as executa. Em produção
+# com vários processos, use Redis ou Memcached, ou, numa só máquina,
+# SI_CACHE_DIR=/caminho/cache (FileBasedCache, compartilhado entre os workers).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+if os.environ.get('SI_CACHE_DIR'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['SI_CACHE_DIR'],
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -128,6 +186,15 @@ STATICFILES_DIRS = [
 # Crie uma pasta 'staticfiles_collected' na raiz do seu projeto.
 STATIC_ROOT = BASE_DIR / 'staticfiles_collected'
 
+# Em produção o collectstatic grava nomes com hash, irmãos .gz/.br e imagens otimizadas,
+# servidos pelo próprio processo (core/wsgi.py, core/asgi.py) com cache imutável.
+# Ver utils/estaticos.py e o comando `relatorio_estaticos`.
+if not DEBUG:
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'utils.estaticos.ArmazenamentoEstaticoComprimido'},
+    }
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -144,6 +211,8 @@ LOGOUT_REDIRECT_URL = 'painel:home'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Brasões e fotos são gravados pelo hash do conteúdo (utils/midia.py): em produção,
+# sirva MEDIA_URL com "Cache-Control: public, max-age=31536000, immutable".
 
 
 
@@ -6,6 +6,8 @@ from django.urls import path, include
 # 1. Importe as bibliotecas necessárias
 from django.conf import settings
 from django.conf.urls.static import static
+from utils import breadcrumbs
+from utils.views import servir_midia
 
 # --- FIM DAS MODIFICAÇÕES ---
 
@@ -15,6 +17,7 @@ urlpatterns = [
     path('autenticacao/', include('autenticacao.urls')),
     path('usuario/', include('usuario.urls')),
     path('instituicoes/', include('instituicao.urls')),
+    path('tarefas/', include('utils.urls')),
 ]
 
 # --- INÍCIO DAS MODIFICAÇÕES ---
@@ -22,7 +25,11 @@ urlpatterns = [
 # 2. Adicione esta linha no final do arquivo
 # Esta linha diz ao Django para servir os arquivos de mídia (da pasta MEDIA_ROOT)
 # apenas quando estivermos em modo de desenvolvimento (DEBUG=True).
+# Os arquivos com nome pelo hash do conteúdo vão com cache imutável (ver utils/midia.py).
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += static(settings.MEDIA_URL, view=servir_midia, document_root=settings.MEDIA_ROOT)
 
-# --- FIM DAS MODIFICAÇÕES ---
\ No newline at end of file
+# --- FIM DAS MODIFICAÇÕES ---
+
+# Pré-compila as cadeias de breadcrumb declaradas nos urls.py dos apps.
+breadcrumbs.compilar(urlpatterns)
@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+if not settings.DEBUG:
+    # Estáticos pré-compactados e com cache imutável, servidos antes do Django (utils/estaticos.py).
+    from utils.estaticos import ServidorEstaticos
+    application = ServidorEstaticos(application)
@@ -1,12 +1,33 @@
 # instituicao/admin.py
 
 from django.contrib import admin
+from django.urls import reverse
+from django.utils.html import format_html
+from usuario.models import ItemModeloHierarquia
+from usuario.exclusao import excluir_instituicao_em_segundo_plano
+from usuario.modelo_hierarquia import aplicar_modelo_em_segundo_plano
 from .models import TipoInstituicao, Instituicao, Estado, Municipio
+from .busca import buscar_municipios
+
+class ItemModeloHierarquiaInline(admin.TabularInline):
+    model = ItemModeloHierarquia
+    extra = 1
 
 @admin.register(TipoInstituicao)
 class TipoInstituicaoAdmin(admin.ModelAdmin):
     list_display = ('nome',)
     search_fields = ('nome',)
+    inlines = (ItemModeloHierarquiaInline,)
+    actions = ('aplicar_modelo_hierarquia',)
+
+    @admin.action(description='Aplicar o modelo de hierarquia às instituições do tipo')
+    def aplicar_modelo_hierarquia(self, request, queryset):
+        for tipo in queryset:
+            tarefa_id = aplicar_modelo_em_segundo_plano(tipo, usuario=request.user)
+            self.message_user(request, format_html(
+                'Aplicando o modelo de {} em segundo plano (<a href="{}">acompanhar</a>).',
+                tipo.nome, reverse('utils:situacao_tarefa', args=[tarefa_id]),
+            ))
 
 @admin.register(Estado)
 class EstadoAdmin(admin.ModelAdmin):
@@ -19,6 +40,26 @@ class MunicipioAdmin(admin.ModelAdmin):
     search_fields = ('nome',)
     list_filter = ('estado',)
     autocomplete_fields = ('estado',)
+    list_select_related = ('estado',)
+
+    # Limite de resultados vindos do índice em memória por busca.
+    limite_busca = 500
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Usa o índice em memória (insensível a acentos) em vez do `icontains`,
+        inclusive nas buscas de autocomplete de outros admins (ex.: Instituição).
+        O filtro lateral de estado entra na busca antes do limite, para que
+        municípios de outros estados não ocupem as vagas.
+        """
+        if not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        try:
+            estado_id = int(request.GET['estado__id__exact'])
+        except (KeyError, ValueError):
+            estado_id = None
+        ids = [r.id for r in buscar_municipios(search_term, limite=self.limite_busca, estado_id=estado_id)]
+        return queryset.filter(pk__in=ids), False
 
     @admin.display(description='UF', ordering='estado__uf')
     def get_uf(self, obj):
@@ -27,20 +68,33 @@ class MunicipioAdmin(admin.ModelAdmin):
 @admin.register(Instituicao)
 class InstituicaoAdmin(admin.ModelAdmin):
     # Usamos um método customizado 'get_uf' para exibir a UF
-    list_display = ('__str__', 'get_uf_from_municipio', 'cnpj')
+    list_display = ('__str__', 'get_uf_from_municipio', 'cnpj', 'excluindo')
+    actions = ('retomar_exclusao',)
     
     # Para buscar, usamos a sintaxe de relacionamento
     search_fields = ('municipio__nome', 'cnpj', 'tipo__nome')
     
     # Para filtrar, também usamos a sintaxe de relacionamento
-    list_filter = ('municipio__estado', 'tipo')
+    list_filter = ('municipio__estado', 'tipo', 'excluindo')
     
     # autocomplete_fields melhora muito a usabilidade para selecionar ForeignKeys
     autocomplete_fields = ('tipo', 'municipio')
 
+    # A UF exibida na lista vem do município e do estado: traz ambos na mesma consulta.
+    list_select_related = ('tipo', 'municipio__estado')
+
     @admin.display(description='UF', ordering='municipio__estado__uf')
     def get_uf_from_municipio(self, obj):
         """ Pega a UF a partir do município relacionado """
         if obj.municipio and obj.municipio.estado:
             return obj.municipio.estado.uf
-        return "N/A"
\ No newline at end of file
+        return "N/A"
+
+    @admin.action(description='Retomar a exclusão (instituições com exclusão em andamento)')
+    def retomar_exclusao(self, request, queryset):
+        for instituicao in queryset.filter(excluindo=True):
+            tarefa_id = excluir_instituicao_em_segundo_plano(instituicao, usuario=request.user)
+            self.message_user(request, format_html(
+                'Exclusão de {} reagendada (<a href="{}">acompanhar</a>).',
+                instituicao.nome_gerado, reverse('utils:situacao_tarefa', args=[tarefa_id]),
+            ))
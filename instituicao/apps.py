@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class InstituicaoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'instituicao'
+
+    def ready(self):
+        # Registra os receivers de invalidação de cache e de recálculo de `nome_gerado`.
+        from . import cache, nomes  # noqa: F401
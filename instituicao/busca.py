@@ -0,0 +1,117 @@
+# instituicao/busca.py
+"""
+Busca de municípios por nome, insensível a acentos e maiúsculas.
+
+Um índice em memória é montado uma única vez por processo a partir de todos os
+municípios: os nomes normalizados ficam em uma lista ordenada, consultada por
+busca binária (prefixo do nome e prefixo de cada palavra), com varredura por
+substring apenas como último recurso. O índice é reconstruído sob demanda
+quando a versão de municípios (ver `instituicao.cache`) muda.
+"""
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import namedtuple
+
+from utils.cache import obter_versao
+from .cache import VERSAO_MUNICIPIOS
+from .models import Municipio
+
+ResultadoMunicipio = namedtuple('ResultadoMunicipio', ['id', 'nome', 'uf', 'estado_id'])
+
+
+def normalizar(texto):
+    """ "São  João-D'El Rei" -> "sao joao d el rei" """
+    decomposto = unicodedata.normalize('NFKD', texto.casefold())
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(''.join(c if c.isalnum() else ' ' for c in sem_acentos).split())
+
+
+class IndiceMunicipios:
+
+    def __init__(self, linhas):
+        # linhas: iterável de (id, nome, uf, estado_id)
+        self.itens = [ResultadoMunicipio(*linha) for linha in linhas]
+        self.normais = [normalizar(item.nome) for item in self.itens]
+
+        nomes = sorted((normal, pos) for pos, normal in enumerate(self.normais))
+        self._nomes = [normal for normal, _ in nomes]
+        self._nomes_pos = [pos for _, pos in nomes]
+
+        # Palavras internas ("paulo" em "sao paulo") para busca por prefixo de palavra.
+        palavras = sorted(
+            (palavra, pos)
+            for pos, normal in enumerate(self.normais)
+            for palavra in normal.split()[1:]
+        )
+        self._palavras = [palavra for palavra, _ in palavras]
+        self._palavras_pos = [pos for _, pos in palavras]
+
+    def __len__(self):
+        return len(self.itens)
+
+    @staticmethod
+    def _prefixo(chaves, posicoes, termo):
+        inicio = bisect_left(chaves, termo)
+        for i in range(inicio, len(chaves)):
+            if not chaves[i].startswith(termo):
+                break
+            yield posicoes[i]
+
+    def _substring(self, termo):
+        for normal, pos in zip(self._nomes, self._nomes_pos):
+            if termo in normal:
+                yield pos
+
+    def buscar(self, termo, limite=10, uf=None, estado_id=None):
+        """
+        Retorna até `limite` municípios (todos, se `limite` for None) em ordem de
+        relevância: prefixo do nome (o nome exato, se existir, vem primeiro),
+        prefixo de uma palavra interna e, por fim, substring. Cada faixa é
+        percorrida em ordem alfabética e a busca para assim que o limite é
+        atingido, então o custo não depende de quantos nomes casam. Os filtros
+        de estado (`uf` ou `estado_id`) valem antes do limite: municípios de
+        outros estados não ocupam vagas do resultado.
+        """
+        termo = normalizar(termo)
+        if not termo:
+            return []
+        uf = uf.upper() if uf else None
+
+        encontrados = {}
+        faixas = (
+            self._prefixo(self._nomes, self._nomes_pos, termo),
+            self._prefixo(self._palavras, self._palavras_pos, termo),
+            self._substring(termo),
+        )
+        for faixa in faixas:
+            for pos in faixa:
+                item = self.itens[pos]
+                if pos in encontrados or (uf and item.uf != uf) or (estado_id is not None and item.estado_id != estado_id):
+                    continue
+                encontrados[pos] = None
+                if limite is not None and len(encontrados) >= limite:
+                    return [self.itens[p] for p in encontrados]
+        return [self.itens[p] for p in encontrados]
+
+
+_indice = None
+_versao_indice = None
+_lock = threading.Lock()
+
+
+def obter_indice():
+    """ Retorna o índice do processo, reconstruindo-o se os municípios mudaram. """
+    global _indice, _versao_indice
+    versao = obter_versao(VERSAO_MUNICIPIOS)
+    if _indice is None or versao != _versao_indice:
+        with _lock:
+            if _indice is None or versao != _versao_indice:
+                linhas = Municipio.objects.order_by().values_list('id', 'nome', 'estado__uf', 'estado_id')
+                _indice = IndiceMunicipios(linhas)
+                _versao_indice = versao
+    return _indice
+
+
+def buscar_municipios(termo, limite=10, uf=None, estado_id=None):
+    return obter_indice().buscar(termo, limite=limite, uf=uf, estado_id=estado_id)
@@ -0,0 +1,139 @@
+# instituicao/cache.py
+"""
+Caches do app de instituições.
+
+Municípios: praticamente não mudam, então a resposta JSON de cada estado é
+serializada e compactada uma única vez e mantida em memória no processo. A
+validade é controlada por uma versão no cache do Django (compartilhada entre
+processos quando o backend de cache também é), incrementada sempre que um
+`Municipio` ou `Estado` é salvo ou excluído. Só estados existentes entram no
+cache (os ids válidos também ficam em memória, sob a mesma versão), para que
+ids arbitrários na query string não façam a memória do processo crescer.
+
+Instituições: cada instituição, já com `tipo` e `municipio__estado`, fica no
+cache do Django por pouco tempo, sob uma versão própria (incrementada quando
+ela é salva ou excluída) e uma época comum (incrementada quando um tipo,
+município ou estado muda, pois os seus nomes aparecem na barra lateral).
+"""
+import gzip
+import hashlib
+import json
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from django.core.cache import cache
+
+from utils.cache import obter_versao, obter_versoes, incrementar_versao
+from .models import Estado, Municipio, TipoInstituicao, Instituicao
+
+VERSAO_MUNICIPIOS = 'instituicao:municipios:versao'
+
+
+class RespostaPreCompactada:
+    """ Corpo JSON de uma resposta, em versão pura e gzip, com seus ETags fortes. """
+
+    def __init__(self, dados):
+        self.corpo = json.dumps(dados, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.corpo_gzip = gzip.compress(self.corpo, compresslevel=9, mtime=0)
+        digest = hashlib.sha1(self.corpo).hexdigest()
+        # Representações diferentes precisam de ETags fortes diferentes.
+        self.etag = f'"{digest}"'
+        self.etag_gzip = f'"{digest}-gz"'
+
+
+_respostas = {}
+_estados = None  # ids dos estados existentes, sob a mesma versão
+_versao_local = None
+_lock = threading.Lock()
+
+
+def obter_municipios_por_estado(estado_id):
+    """
+    Retorna a `RespostaPreCompactada` dos municípios do estado, montando-a se
+    preciso, ou None se o estado não existir.
+    """
+    global _versao_local, _estados
+    versao = obter_versao(VERSAO_MUNICIPIOS)
+    with _lock:
+        if versao != _versao_local:
+            _respostas.clear()
+            _estados = None
+            _versao_local = versao
+        resposta = _respostas.get(estado_id)
+        estados = _estados
+    if estados is None:
+        estados = frozenset(Estado.objects.values_list('pk', flat=True))
+        with _lock:
+            if _versao_local == versao:
+                _estados = estados
+    if estado_id not in estados:
+        return None
+    if resposta is None:
+        dados = list(Municipio.objects.filter(estado_id=estado_id).order_by('nome').values('id', 'nome'))
+        resposta = RespostaPreCompactada(dados)
+        with _lock:
+            if _versao_local == versao:
+                _respostas[estado_id] = resposta
+    return resposta
+
+
+def invalidar_municipios():
+    """ Descarta as respostas em cache; chamada após qualquer escrita em `Municipio` ou `Estado`. """
+    incrementar_versao(VERSAO_MUNICIPIOS)
+
+
+@receiver(post_save, sender=Municipio)
+@receiver(post_delete, sender=Municipio)
+@receiver(post_save, sender=Estado)
+@receiver(post_delete, sender=Estado)
+def municipio_alterado(sender, **kwargs):
+    transaction.on_commit(invalidar_municipios)
+
+
+# --- INSTITUIÇÕES ---
+
+EPOCA_INSTITUICOES = 'instituicao:instituicoes:epoca'
+INSTITUICAO_TIMEOUT = 60
+
+
+def _chave_versao_instituicao(pk):
+    return f'instituicao:instituicao:versao:{pk}'
+
+
+def obter_instituicao(pk):
+    """ Instituição com `tipo` e `municipio__estado`, do cache ou do banco; None se não existir. """
+    if not pk:
+        return None
+    epoca, versao = obter_versoes(EPOCA_INSTITUICOES, _chave_versao_instituicao(pk))
+    chave = f'instituicao:instituicao:{epoca}:{pk}:{versao}'
+    instituicao = cache.get(chave)
+    if instituicao is None:
+        instituicao = Instituicao.objects.select_related('tipo', 'municipio__estado').filter(pk=pk).first()
+        if instituicao is not None:
+            cache.set(chave, instituicao, INSTITUICAO_TIMEOUT)
+    return instituicao
+
+
+@receiver(post_save, sender=Instituicao)
+@receiver(post_delete, sender=Instituicao)
+def instituicao_alterada(sender, instance, **kwargs):
+    chave = _chave_versao_instituicao(instance.pk)  # o pk é anulado após a exclusão
+    transaction.on_commit(lambda: incrementar_versao(chave))
+
+
+@receiver(post_save, sender=TipoInstituicao)
+@receiver(post_delete, sender=TipoInstituicao)
+@receiver(post_save, sender=Municipio)
+@receiver(post_delete, sender=Municipio)
+@receiver(post_save, sender=Estado)
+@receiver(post_delete, sender=Estado)
+def localidade_ou_tipo_alterado(sender, **kwargs):
+    transaction.on_commit(invalidar_instituicoes)
+
+
+def invalidar_instituicoes():
+    """ Descarta todas as instituições em cache (ex.: após renomear municípios em lote). """
+    incrementar_versao(EPOCA_INSTITUICOES)
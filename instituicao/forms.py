@@ -1,5 +1,8 @@
 from django import forms
-from .models import TipoInstituicao, Instituicao, Municipio
+from django.urls import reverse_lazy
+from django.db.models import Q
+from .busca import buscar_municipios
+from .models import TipoInstituicao, Instituicao, Municipio, Estado
 
 class TipoInstituicaoForm(forms.ModelForm):
     """
@@ -21,11 +24,12 @@ class InstituicaoForm(forms.ModelForm):
     Formulário para o Admin SI criar ou editar uma Instituição específica.
     """
     # O queryset de municípios começará vazio e será preenchido dinamicamente via JavaScript.
+    # O atributo 'data-busca-url' habilita a busca rápida (typeahead) de municípios no template.
     municipio = forms.ModelChoiceField(
         queryset=Municipio.objects.none(),
         label="Município",
-        widget=forms.Select(attrs={'class': 'form-select'}),
-        help_text="Selecione um estado primeiro para carregar a lista de municípios."
+        widget=forms.Select(attrs={'class': 'form-select', 'data-busca-url': reverse_lazy('instituicao:ajax_buscar_municipios')}),
+        help_text="Selecione um estado primeiro para carregar a lista de municípios, ou use a busca rápida."
     )
     
     class Meta:
@@ -49,4 +53,45 @@ class InstituicaoForm(forms.ModelForm):
             'cep': forms.TextInput(attrs={'class': 'form-control'}),
             'brasao_instituicao': forms.FileInput(attrs={'class': 'form-control'}),
             'brasao_municipio': forms.FileInput(attrs={'class': 'form-control'}),
-        }
\ No newline at end of file
+        }
+
+class InstituicaoCreateForm(InstituicaoForm):
+    """ Na criação, permite clonar o modelo de hierarquia do tipo na mesma transação. """
+    aplicar_modelo = forms.BooleanField(
+        label="Criar cargos, patentes e funções do modelo do tipo",
+        required=False, initial=True,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+        help_text="Usa o modelo de hierarquia cadastrado para o tipo de instituição (se houver).",
+    )
+
+class FiltroInstituicoesForm(forms.Form):
+    """ Filtros da listagem de instituições (lista do Admin SI e lobby), todos opcionais. """
+    # Municípios encontrados pela busca textual (índice em memória) que entram no filtro.
+    limite_municipios = 200
+
+    q = forms.CharField(label='Buscar', required=False, max_length=150,
+                        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Município ou tipo'}))
+    uf = forms.ModelChoiceField(label='Estado', required=False, to_field_name='uf', empty_label='Todas',
+                                queryset=Estado.objects.all(),
+                                widget=forms.Select(attrs={'class': 'form-select'}))
+    tipo = forms.ModelChoiceField(label='Tipo', required=False, empty_label='Todos',
+                                  queryset=TipoInstituicao.objects.all(),
+                                  widget=forms.Select(attrs={'class': 'form-select'}))
+    municipio = forms.IntegerField(required=False, widget=forms.HiddenInput)
+
+    def filtrar(self, queryset):
+        """ Aplica os filtros válidos ao queryset de `Instituicao`. """
+        dados = self.cleaned_data
+        if dados.get('tipo'):
+            queryset = queryset.filter(tipo=dados['tipo'])
+        if dados.get('municipio'):
+            queryset = queryset.filter(municipio_id=dados['municipio'])
+        if dados.get('uf'):
+            queryset = queryset.filter(municipio__estado=dados['uf'])
+        termo = dados.get('q', '').strip()
+        if termo:
+            # Município: busca insensível a acentos no índice em memória; tipo: prefixo do nome.
+            uf = dados['uf'].uf if dados.get('uf') else None
+            ids = [m.id for m in buscar_municipios(termo, limite=self.limite_municipios, uf=uf)]
+            queryset = queryset.filter(Q(municipio_id__in=ids) | Q(nome_gerado__istartswith=termo))
+        return queryset
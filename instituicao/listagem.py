@@ -0,0 +1,69 @@
+# instituicao/listagem.py
+"""
+Listagem de instituições compartilhada pela lista do Admin SI e pelo lobby.
+
+Tipo, município e estado vêm na mesma consulta (`select_related`); a
+paginação é por cursor sobre (`nome_gerado`, id), atendida pelos índices
+compostos de `Instituicao`, então o custo de cada página não depende do
+número de instituições. A mesma listagem responde em JSON (`?formato=json`)
+para o "Carregar mais" das páginas.
+"""
+from dataclasses import dataclass
+
+from django.http import JsonResponse
+from django.templatetags.static import static
+from django.urls import reverse
+
+from utils.midia import url_miniatura
+from utils.paginacao import PaginaKeyset, paginar_keyset, url_proxima_pagina
+from .forms import FiltroInstituicoesForm
+from .models import Instituicao
+
+INSTITUICOES_POR_PAGINA = 24
+ORDENACAO = ('nome_gerado', 'id')
+
+
+@dataclass
+class ListagemInstituicoes:
+    form: FiltroInstituicoesForm
+    pagina: PaginaKeyset
+    proxima_url: str = None
+
+    def contexto(self):
+        return {'form': self.form, 'instituicoes': self.pagina.itens, 'pagina': self.pagina, 'proxima_url': self.proxima_url}
+
+    def resposta_json(self):
+        return JsonResponse({
+            'resultados': [instituicao_json(instituicao) for instituicao in self.pagina.itens],
+            'proximo': self.pagina.proximo,
+            'proxima_url': self.proxima_url,
+        })
+
+
+def instituicao_json(instituicao):
+    municipio = instituicao.municipio
+    return {
+        'id': instituicao.pk,
+        'nome': instituicao.nome_gerado,
+        'tipo': instituicao.tipo.nome,
+        'municipio': municipio.nome,
+        'uf': municipio.estado.uf,
+        'cnpj': instituicao.cnpj,
+        'brasao': url_miniatura(instituicao.brasao_instituicao, 'm') or static('images/brasao_instituicao_default.png'),
+        'url': reverse('instituicao:detalhe_instituicao', args=[instituicao.pk]),
+        'entrar_url': reverse('instituicao:entrar_contexto', args=[instituicao.pk]),
+        'editar_url': reverse('instituicao:edita_instituicao', args=[instituicao.pk]),
+        'excluir_url': reverse('instituicao:exclui_instituicao', args=[instituicao.pk]),
+    }
+
+
+def listar_instituicoes(request, queryset=None, tamanho=None):
+    """ Página de `queryset` (todas as instituições ativas, por padrão) com os filtros de `request.GET`. """
+    tamanho = tamanho or INSTITUICOES_POR_PAGINA
+    if queryset is None:
+        queryset = Instituicao.objects.ativas()
+    form = FiltroInstituicoesForm(request.GET)
+    queryset = queryset.select_related('tipo', 'municipio__estado')
+    queryset = form.filtrar(queryset) if form.is_valid() else queryset.none()
+    pagina = paginar_keyset(queryset, ORDENACAO, request.GET.get('cursor'), tamanho)
+    return ListagemInstituicoes(form=form, pagina=pagina, proxima_url=url_proxima_pagina(request, pagina))
@@ -0,0 +1,243 @@
+# instituicao/localidades.py
+"""
+Motor de sincronização de Estados e Municípios com os dados do IBGE.
+
+O fluxo é dividido em três fases independentes:
+    1. carregar: lê um snapshot local (arquivo JSON) ou consulta a API do IBGE,
+       buscando os municípios de cada estado em paralelo;
+    2. comparar: carrega em memória o que já existe em `Estado`/`Municipio` e
+       monta um plano contendo apenas inserções, renomeações e remoções;
+    3. aplicar: grava o plano com `bulk_create`/`bulk_update` em lotes, dentro
+       de uma única transação curta.
+
+Formato normalizado dos dados carregados:
+    {'SP': {'nome': 'São Paulo', 'municipios': {3517406: 'Guaíra', ...}}, ...}
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import transaction
+
+from .cache import invalidar_municipios, invalidar_instituicoes
+from .models import Estado, Municipio, Instituicao
+from .nomes import recalcular_nomes
+
+IBGE_API_URL = 'https://servicodados.ibge.gov.br/api/v1/localidades'
+
+
+# --- FASE 1: CARREGAMENTO ---
+
+def carregar_arquivo(caminho):
+    """
+    Lê um snapshot local. Aceita tanto o formato gerado por `salvar_arquivo`
+    quanto a resposta crua de `/api/v1/localidades/municipios` do IBGE.
+    """
+    with open(caminho, encoding='utf-8') as arquivo:
+        dados = json.load(arquivo)
+    if isinstance(dados, dict):
+        return {
+            estado['sigla']: {
+                'nome': estado['nome'],
+                'municipios': {int(m['id']): m['nome'] for m in estado['municipios']},
+            }
+            for estado in dados['estados']
+        }
+    return _agrupar_municipios_ibge(dados)
+
+
+def _uf_do_municipio(municipio):
+    """ Extrai o objeto UF de um município no formato da API do IBGE. """
+    microrregiao = municipio.get('microrregiao')
+    if microrregiao:
+        return microrregiao['mesorregiao']['UF']
+    return municipio['regiao-imediata']['regiao-intermediaria']['UF']
+
+
+def _agrupar_municipios_ibge(municipios):
+    localidades = {}
+    for municipio in municipios:
+        uf = _uf_do_municipio(municipio)
+        estado = localidades.setdefault(uf['sigla'], {'nome': uf['nome'], 'municipios': {}})
+        estado['municipios'][int(municipio['id'])] = municipio['nome']
+    return localidades
+
+
+def buscar_api(url_base=IBGE_API_URL, workers=8, timeout=30):
+    """
+    Consulta a API do IBGE (ou um servidor local que a imite): uma chamada para
+    a lista de estados e, em seguida, as chamadas de municípios em paralelo.
+    """
+    import requests
+
+    def get_json(url):
+        resposta = requests.get(url, timeout=timeout)
+        resposta.raise_for_status()
+        return resposta.json()
+
+    url_base = url_base.rstrip('/')
+    estados = get_json(f'{url_base}/estados?orderBy=nome')
+    urls = [f"{url_base}/estados/{estado['sigla']}/municipios" for estado in estados]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        respostas = list(executor.map(get_json, urls))
+
+    return {
+        estado['sigla']: {
+            'nome': estado['nome'],
+            'municipios': {int(m['id']): m['nome'] for m in municipios},
+        }
+        for estado, municipios in zip(estados, respostas)
+    }
+
+
+def salvar_arquivo(localidades, caminho):
+    """ Grava um snapshot local para permitir sincronizações offline. """
+    dados = {
+        'estados': [
+            {
+                'sigla': uf,
+                'nome': estado['nome'],
+                'municipios': [
+                    {'id': codigo, 'nome': nome}
+                    for codigo, nome in sorted(estado['municipios'].items())
+                ],
+            }
+            for uf, estado in sorted(localidades.items())
+        ]
+    }
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        json.dump(dados, arquivo, ensure_ascii=False, indent=1)
+
+
+# --- FASE 2: COMPARAÇÃO ---
+
+class PlanoSincronizacao:
+    """ Diferenças entre os dados carregados e o banco, prontas para aplicação. """
+
+    def __init__(self):
+        self.estados_novos = []
+        self.estados_renomeados = []
+        self.municipios_novos = []        # (uf, codigo_ibge, nome)
+        self.municipios_alterados = []    # instâncias de Municipio já com os novos valores
+        self.municipios_removidos = []    # ids
+        self.municipios_protegidos = []   # ids que seriam removidos, mas têm instituições vinculadas
+
+    @property
+    def vazio(self):
+        return not (
+            self.estados_novos or self.estados_renomeados or self.municipios_novos
+            or self.municipios_alterados or self.municipios_removidos
+        )
+
+    def resumo(self):
+        return {
+            'estados_novos': len(self.estados_novos),
+            'estados_renomeados': len(self.estados_renomeados),
+            'municipios_novos': len(self.municipios_novos),
+            'municipios_alterados': len(self.municipios_alterados),
+            'municipios_removidos': len(self.municipios_removidos),
+            'municipios_protegidos': len(self.municipios_protegidos),
+        }
+
+
+def calcular_diferencas(localidades, remover_ausentes=True):
+    """
+    Compara os dados carregados com o banco usando apenas duas consultas de
+    leitura. Municípios são casados pelo código IBGE; registros antigos, ainda
+    sem código, são casados por (estado, nome) e recebem o código.
+    """
+    plano = PlanoSincronizacao()
+
+    estados_existentes = {uf: (pk, nome) for pk, uf, nome in Estado.objects.values_list('id', 'uf', 'nome')}
+    id_por_uf = {}
+    for uf, estado in localidades.items():
+        if uf not in estados_existentes:
+            plano.estados_novos.append(Estado(uf=uf, nome=estado['nome']))
+            continue
+        pk, nome = estados_existentes[uf]
+        id_por_uf[uf] = pk
+        if nome != estado['nome']:
+            plano.estados_renomeados.append(Estado(pk=pk, uf=uf, nome=estado['nome']))
+
+    por_codigo = {}
+    sem_codigo = {}
+    for pk, estado_id, nome, codigo in Municipio.objects.values_list('id', 'estado_id', 'nome', 'codigo_ibge'):
+        if codigo is None:
+            sem_codigo[(estado_id, nome)] = pk
+        else:
+            por_codigo[codigo] = (pk, estado_id, nome)
+
+    vistos = set()
+    for uf, estado in localidades.items():
+        estado_id = id_por_uf.get(uf)
+        for codigo, nome in estado['municipios'].items():
+            if estado_id is None:
+                plano.municipios_novos.append((uf, codigo, nome))
+                continue
+            existente = por_codigo.get(codigo)
+            if existente is not None:
+                pk, estado_atual, nome_atual = existente
+                vistos.add(pk)
+                if estado_atual != estado_id or nome_atual != nome:
+                    plano.municipios_alterados.append(Municipio(pk=pk, estado_id=estado_id, nome=nome, codigo_ibge=codigo))
+                continue
+            pk = sem_codigo.pop((estado_id, nome), None)
+            if pk is not None:
+                vistos.add(pk)
+                plano.municipios_alterados.append(Municipio(pk=pk, estado_id=estado_id, nome=nome, codigo_ibge=codigo))
+            else:
+                plano.municipios_novos.append((uf, codigo, nome))
+
+    if remover_ausentes:
+        ausentes = [pk for pk, _, _ in por_codigo.values() if pk not in vistos]
+        ausentes.extend(sem_codigo.values())
+        if ausentes:
+            protegidos = set(
+                Instituicao.objects.filter(municipio_id__in=ausentes).values_list('municipio_id', flat=True)
+            )
+            plano.municipios_protegidos = sorted(protegidos)
+            plano.municipios_removidos = [pk for pk in ausentes if pk not in protegidos]
+
+    return plano
+
+
+# --- FASE 3: APLICAÇÃO ---
+
+def _em_lotes(itens, tamanho):
+    for inicio in range(0, len(itens), tamanho):
+        yield itens[inicio:inicio + tamanho]
+
+
+@transaction.atomic
+def aplicar_plano(plano, batch_size=500):
+    """
+    Grava o plano. A ordem (remoções, atualizações, inserções) evita conflitos
+    com a restrição única (estado, nome) quando um nome muda de dono.
+    """
+    if plano.estados_novos:
+        Estado.objects.bulk_create(plano.estados_novos, batch_size=batch_size)
+    if plano.estados_renomeados:
+        Estado.objects.bulk_update(plano.estados_renomeados, ['nome'], batch_size=batch_size)
+
+    for lote in _em_lotes(plano.municipios_removidos, batch_size):
+        Municipio.objects.filter(pk__in=lote).delete()
+
+    if plano.municipios_alterados:
+        Municipio.objects.bulk_update(
+            plano.municipios_alterados, ['estado', 'nome', 'codigo_ibge'], batch_size=batch_size
+        )
+
+    if plano.municipios_novos:
+        id_por_uf = dict(Estado.objects.values_list('uf', 'id'))
+        Municipio.objects.bulk_create(
+            [Municipio(estado_id=id_por_uf[uf], codigo_ibge=codigo, nome=nome) for uf, codigo, nome in plano.municipios_novos],
+            batch_size=batch_size,
+        )
+
+    # Município ou estado alterado muda o `nome_gerado` das instituições dele.
+    for lote in _em_lotes([m.pk for m in plano.municipios_alterados], batch_size):
+        recalcular_nomes(municipio_id__in=lote)
+
+    # `bulk_create`/`bulk_update` não disparam sinais: invalida os caches explicitamente.
+    transaction.on_commit(invalidar_municipios)
+    if plano.estados_renomeados or plano.municipios_alterados:
+        transaction.on_commit(invalidar_instituicoes)
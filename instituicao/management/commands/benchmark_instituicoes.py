@@ -0,0 +1,99 @@
+# instituicao/management/commands/benchmark_instituicoes.py
+
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from instituicao.models import Estado, Municipio, TipoInstituicao, Instituicao, formatar_nome_gerado
+from utils.paginacao import codificar_cursor
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a lista de instituições (instituicao:lista_instituicoes) e o lobby (painel:dashboard) '
+        'com mil, 10 mil e 100 mil instituições: primeira página, página profunda, filtros por UF, '
+        'tipo e município, busca e modo JSON. Os dados de teste são criados em uma transação '
+        'desfeita ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanhos', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+        parser.add_argument('--repeticoes', type=int, default=20, help='Requisições por cenário.')
+        parser.add_argument('--estados', type=int, default=27)
+        parser.add_argument('--tipos', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=['*'], DEBUG=False):
+                self._executar(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _executar(self, options):
+        estados = Estado.objects.bulk_create([
+            Estado(nome=f'Benchmark {i:02d}', uf=f'{i:02d}') for i in range(options['estados'])
+        ])
+        tipos = TipoInstituicao.objects.bulk_create([
+            TipoInstituicao(nome=f'Benchmark Tipo {i:02d}') for i in range(options['tipos'])
+        ])
+        admin = User.objects.create_superuser('benchmark_instituicoes_admin', 'admin@example.com', None)
+        cliente = Client()
+        cliente.force_login(admin)
+
+        criadas = 0
+        for tamanho in sorted(options['tamanhos']):
+            inicio = time.perf_counter()
+            # Cada município recebe uma instituição de cada tipo (unique_together tipo + município).
+            while criadas < tamanho:
+                quantidade = min(len(tipos), tamanho - criadas)
+                estado = estados[(criadas // len(tipos)) % len(estados)]
+                municipio = Municipio.objects.create(estado=estado, nome=f'Cidade {criadas // len(tipos):06d}')
+                Instituicao.objects.bulk_create([
+                    Instituicao(tipo=tipo, municipio=municipio, nome_gerado=formatar_nome_gerado(tipo.nome, municipio.nome, estado.uf))
+                    for tipo in tipos[:quantidade]
+                ])
+                criadas += quantidade
+            self.stdout.write(f'\n{tamanho:,} instituições (carga: {time.perf_counter() - inicio:.1f}s)')
+            self._cenarios(cliente, estados[0], tipos[0], tamanho, options['repeticoes'])
+
+    def _cenarios(self, cliente, estado, tipo, tamanho, repeticoes):
+        nome, pk = Instituicao.objects.order_by('nome_gerado', 'id').values_list('nome_gerado', 'id')[int(tamanho * 0.9)]
+        cursor = codificar_cursor([nome, pk])
+        municipio = Municipio.objects.filter(estado=estado).order_by('-pk').values_list('pk', flat=True).first()
+        cenarios = [
+            ('primeira página', 'instituicao:lista_instituicoes', {}),
+            ('página profunda (~90%)', 'instituicao:lista_instituicoes', {'cursor': cursor}),
+            ('filtro UF', 'instituicao:lista_instituicoes', {'uf': estado.uf}),
+            ('filtro tipo', 'instituicao:lista_instituicoes', {'tipo': tipo.pk}),
+            ('filtro UF + tipo', 'instituicao:lista_instituicoes', {'uf': estado.uf, 'tipo': tipo.pk}),
+            ('filtro município', 'instituicao:lista_instituicoes', {'municipio': municipio}),
+            ('busca "Benchmark Tipo 1"', 'instituicao:lista_instituicoes', {'q': 'Benchmark Tipo 1'}),
+            ('lobby, primeira página', 'painel:dashboard', {}),
+            ('lobby JSON, página profunda', 'painel:dashboard', {'cursor': cursor, 'formato': 'json'}),
+        ]
+        for rotulo, rota, parametros in cenarios:
+            tempos, consultas = [], 0
+            for _ in range(repeticoes):
+                with CaptureQueriesContext(connection) as capturadas:
+                    inicio = time.perf_counter()
+                    resposta = cliente.get(reverse(rota), parametros)
+                    tempos.append((time.perf_counter() - inicio) * 1000)
+                if resposta.status_code != 200:
+                    raise CommandError(f'{rotulo}: {reverse(rota)}?{urlencode(parametros)} respondeu {resposta.status_code}.')
+                consultas = len(capturadas)
+            self.stdout.write(
+                f'  {rotulo:<30} mediana {statistics.median(tempos):8.2f} ms   '
+                f'p95 {sorted(tempos)[int(len(tempos) * 0.95) - 1]:8.2f} ms   {consultas} consultas'
+            )
@@ -0,0 +1,66 @@
+# instituicao/management/commands/benchmark_municipios.py
+
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.http import JsonResponse
+from django.test import RequestFactory
+
+from instituicao.models import Estado, Municipio
+from instituicao.views import carregar_municipios
+
+
+def carregar_municipios_sem_cache(request):
+    """ Implementação original da view, mantida apenas como referência de comparação. """
+    estado_id = request.GET.get('estado_id')
+    if not estado_id: return JsonResponse([], safe=False)
+    municipios = Municipio.objects.filter(estado_id=estado_id).order_by('nome')
+    return JsonResponse(list(municipios.values('id', 'nome')), safe=False)
+
+
+class Command(BaseCommand):
+    help = 'Mede requisições/segundo do endpoint carregar_municipios, antes e depois do cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uf', help='UF a consultar (padrão: o estado com mais municípios).')
+        parser.add_argument('--requisicoes', type=int, default=2000, help='Requisições por cenário.')
+
+    def _medir(self, view, request, total):
+        inicio = time.perf_counter()
+        for _ in range(total):
+            resposta = view(request)
+        duracao = time.perf_counter() - inicio
+        return total / duracao, resposta
+
+    def handle(self, *args, **options):
+        estados = Estado.objects.annotate(total=Count('municipios')).order_by('-total')
+        estado = estados.filter(uf=options['uf'].upper()).first() if options['uf'] else estados.first()
+        if estado is None or not estado.total:
+            raise CommandError('Nenhum município cadastrado. Execute popular_localidades antes.')
+
+        factory = RequestFactory()
+        usuario = User(username='benchmark')
+        total = options['requisicoes']
+
+        def requisicao(**headers):
+            request = factory.get('/instituicoes/ajax/carregar-municipios/', {'estado_id': estado.pk}, **headers)
+            request.user = usuario
+            return request
+
+        aquecimento = carregar_municipios(requisicao(HTTP_ACCEPT_ENCODING='gzip'))
+        cenarios = [
+            ('sem cache (original)', carregar_municipios_sem_cache, requisicao()),
+            ('com cache', carregar_municipios, requisicao()),
+            ('com cache + gzip', carregar_municipios, requisicao(HTTP_ACCEPT_ENCODING='gzip')),
+            ('revalidação 304', carregar_municipios, requisicao(HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=aquecimento['ETag'])),
+        ]
+
+        self.stdout.write(f'Estado: {estado.nome} ({estado.total} municípios), {total} requisições por cenário')
+        base = None
+        for nome, view, request in cenarios:
+            rps, resposta = self._medir(view, request, total)
+            base = base or rps
+            tamanho = len(resposta.content)
+            self.stdout.write(f'  {nome:<22} {rps:>10.0f} req/s  {rps / base:>6.1f}x  {tamanho:>7} bytes  (HTTP {resposta.status_code})')
@@ -1,56 +1,72 @@
 # instituicao/management/commands/popular_localidades.py
 
+import time
+
 import requests
-from django.core.management.base import BaseCommand
-from django.db import transaction
-from instituicao.models import Estado, Municipio
+from django.core.management.base import BaseCommand, CommandError
+from instituicao import localidades
+
 
 class Command(BaseCommand):
-    help = 'Popula o banco de dados com Estados e Municípios do Brasil usando a API do IBGE.'
+    help = (
+        'Sincroniza Estados e Municípios do Brasil com os dados do IBGE, a partir da API '
+        'ou de um snapshot local, gravando apenas as diferenças.'
+    )
 
-    def handle(self, *args, **kwargs):
-        self.stdout.write(self.style.SUCCESS('Iniciando a população de Estados e Municípios...'))
+    def add_arguments(self, parser):
+        parser.add_argument('--arquivo', help='Snapshot local (JSON) a ser usado no lugar da API do IBGE.')
+        parser.add_argument('--url-base', default=localidades.IBGE_API_URL, help='URL base da API de localidades (permite usar um servidor local).')
+        parser.add_argument('--salvar-arquivo', help='Grava os dados carregados neste arquivo, para sincronizações offline futuras.')
+        parser.add_argument('--workers', type=int, default=8, help='Número de requisições simultâneas à API.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Tamanho dos lotes de escrita.')
+        parser.add_argument('--manter-ausentes', action='store_true', help='Não remove municípios que deixaram de existir na origem.')
+        parser.add_argument('--simular', action='store_true', help='Apenas calcula e exibe as diferenças, sem gravar nada.')
 
-        try:
-            with transaction.atomic():
-                # URL da API do IBGE para estados
-                estados_url = 'https://servicodados.ibge.gov.br/api/v1/localidades/estados?orderBy=nome'
-                
-                self.stdout.write('Buscando estados na API do IBGE...')
-                response_estados = requests.get(estados_url)
-                response_estados.raise_for_status()  # Lança um erro se a requisição falhar
-                estados_data = response_estados.json()
-
-                for estado_data in estados_data:
-                    # Usamos get_or_create para evitar duplicatas
-                    estado, created = Estado.objects.get_or_create(
-                        uf=estado_data['sigla'],
-                        defaults={'nome': estado_data['nome']}
-                    )
-                    
-                    if created:
-                        self.stdout.write(f'Estado "{estado.nome}" criado.')
-
-                    # URL da API para municípios do estado atual
-                    municipios_url = f"https://servicodados.ibge.gov.br/api/v1/localidades/estados/{estado.uf}/municipios"
-                    
-                    self.stdout.write(f'Buscando municípios de {estado.nome}...')
-                    response_municipios = requests.get(municipios_url)
-                    response_municipios.raise_for_status()
-                    municipios_data = response_municipios.json()
-
-                    for municipio_data in municipios_data:
-                        # Usamos get_or_create para cada município
-                        municipio, created_mun = Municipio.objects.get_or_create(
-                            estado=estado,
-                            nome=municipio_data['nome']
-                        )
-                        if created_mun:
-                            self.stdout.write(f'  - Município "{municipio.nome}" criado.')
-
-            self.stdout.write(self.style.SUCCESS('População de dados concluída com sucesso!'))
+    def _fase(self, nome, inicio):
+        self.stdout.write(f'  [{nome}] {time.perf_counter() - inicio:.3f}s')
 
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Iniciando a sincronização de Estados e Municípios...'))
+        inicio_total = time.perf_counter()
+
+        inicio = time.perf_counter()
+        try:
+            if options['arquivo']:
+                self.stdout.write(f"Lendo snapshot local {options['arquivo']}...")
+                dados = localidades.carregar_arquivo(options['arquivo'])
+            else:
+                self.stdout.write('Buscando estados e municípios na API do IBGE...')
+                dados = localidades.buscar_api(options['url_base'], workers=options['workers'])
         except requests.exceptions.RequestException as e:
-            self.stderr.write(self.style.ERROR(f'Erro ao se conectar com a API do IBGE: {e}'))
-        except Exception as e:
-            self.stderr.write(self.style.ERROR(f'Ocorreu um erro inesperado: {e}'))
\ No newline at end of file
+            raise CommandError(f'Erro ao se conectar com a API do IBGE: {e}')
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'Snapshot inválido: {e}')
+        self._fase('carregar', inicio)
+
+        if options['salvar_arquivo']:
+            localidades.salvar_arquivo(dados, options['salvar_arquivo'])
+            self.stdout.write(f"Snapshot gravado em {options['salvar_arquivo']}.")
+
+        inicio = time.perf_counter()
+        plano = localidades.calcular_diferencas(dados, remover_ausentes=not options['manter_ausentes'])
+        self._fase('comparar', inicio)
+
+        for chave, quantidade in plano.resumo().items():
+            self.stdout.write(f'  {chave}: {quantidade}')
+        if plano.municipios_protegidos:
+            self.stdout.write(self.style.WARNING(
+                f'{len(plano.municipios_protegidos)} município(s) ausente(s) na origem foram mantidos por possuírem instituições vinculadas.'
+            ))
+
+        if plano.vazio:
+            self.stdout.write(self.style.SUCCESS(f'Nenhuma alteração necessária ({time.perf_counter() - inicio_total:.3f}s).'))
+            return
+        if options['simular']:
+            self.stdout.write(self.style.WARNING('Simulação: nenhuma alteração foi gravada.'))
+            return
+
+        inicio = time.perf_counter()
+        localidades.aplicar_plano(plano, batch_size=options['batch_size'])
+        self._fase('aplicar', inicio)
+
+        self.stdout.write(self.style.SUCCESS(f'Sincronização concluída com sucesso ({time.perf_counter() - inicio_total:.3f}s).'))
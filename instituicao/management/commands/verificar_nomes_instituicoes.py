@@ -0,0 +1,34 @@
+# instituicao/management/commands/verificar_nomes_instituicoes.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from instituicao.nomes import desatualizadas, expressao_nome_gerado, recalcular_nomes
+
+
+class Command(BaseCommand):
+    help = (
+        'Confere o nome_gerado de todas as instituições contra o tipo, o município e a UF atuais '
+        'e, com --corrigir, corrige os desatualizados em um único UPDATE.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corrigir', action='store_true', help='Grava os nomes corrigidos.')
+        parser.add_argument('--exemplos', type=int, default=20, help='Quantas divergências listar.')
+
+    def handle(self, *args, **options):
+        divergentes = desatualizadas().annotate(esperado=expressao_nome_gerado())
+        total = divergentes.count()
+        for pk, atual, esperado in divergentes.values_list('pk', 'nome_gerado', 'esperado')[:options['exemplos']]:
+            self.stdout.write(f'  #{pk}: "{atual}" -> "{esperado}"')
+        if total > options['exemplos']:
+            self.stdout.write(f'  ... e mais {total - options["exemplos"]}.')
+
+        if not total:
+            self.stdout.write(self.style.SUCCESS('Todos os nomes estão corretos.'))
+        elif options['corrigir']:
+            with transaction.atomic():
+                corrigidas = recalcular_nomes()
+            self.stdout.write(self.style.SUCCESS(f'{corrigidas} nome(s) corrigido(s).'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{total} nome(s) desatualizado(s). Use --corrigir para gravar.'))
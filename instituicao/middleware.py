@@ -0,0 +1,69 @@
+# instituicao/middleware.py
+"""
+Resolução da instituição da requisição.
+
+A instituição indicada na URL é carregada uma única vez por requisição (com
+`tipo` e `municipio__estado` já unidos, via o cache de `instituicao.cache`) e
+anexada em `request.instituicao`, de onde os mixins, as views e o processador
+de contexto a consomem.
+"""
+from usuario.autorizacao import obter_autorizacao
+from .cache import obter_instituicao
+
+
+def carregar_instituicao(pk):
+    """ Carrega a instituição com as relações exibidas nos templates, ou None (inclusive se estiver sendo excluída). """
+    instituicao = obter_instituicao(pk)
+    if instituicao is not None and instituicao.excluindo:
+        return None
+    return instituicao
+
+
+def obter_instituicao_ativa(request):
+    """
+    Instituição ativa da requisição, resolvida uma única vez:
+    1. a instituição da URL (`request.instituicao`);
+    2. a instituição gerenciada pelo Admin SI (`managing_institution_id` na sessão);
+    3. a instituição à qual o perfil do usuário está vinculado.
+    """
+    if not hasattr(request, '_instituicao_ativa'):
+        request._instituicao_ativa = _resolver_instituicao_ativa(request)
+    return request._instituicao_ativa
+
+
+def _resolver_instituicao_ativa(request):
+    instituicao = getattr(request, 'instituicao', None)
+    if instituicao is not None:
+        return instituicao
+
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+
+    if user.is_superuser and 'managing_institution_id' in request.session:
+        instituicao = carregar_instituicao(request.session['managing_institution_id'])
+        if instituicao is None:
+            del request.session['managing_institution_id']
+        return instituicao
+
+    return carregar_instituicao(obter_autorizacao(user).instituicao_id)
+
+
+class InstituicaoMiddleware:
+    """
+    Anexa `request.instituicao` a partir do argumento de URL que identifica a
+    instituição. Por padrão é `instituicao_pk`; views cuja instituição vem em
+    outro argumento (ex.: `pk`) declaram o atributo `instituicao_url_kwarg`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.instituicao = None
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'view_class', view_func)
+        url_kwarg = getattr(view, 'instituicao_url_kwarg', 'instituicao_pk')
+        request.instituicao = carregar_instituicao(view_kwargs.get(url_kwarg))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instituicao', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='municipio',
+            name='codigo_ibge',
+            field=models.PositiveIntegerField(blank=True, null=True, unique=True, verbose_name='Código IBGE'),
+        ),
+    ]
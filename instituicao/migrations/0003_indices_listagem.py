@@ -0,0 +1,25 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instituicao', '0002_municipio_codigo_ibge'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='instituicao',
+            index=models.Index(fields=['nome_gerado', 'id'], name='instituicao_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='instituicao',
+            index=models.Index(fields=['tipo', 'nome_gerado', 'id'], name='instituicao_tipo_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='instituicao',
+            index=models.Index(fields=['municipio', 'nome_gerado', 'id'], name='instituicao_municipio_nome_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:36
+
+import instituicao.models
+import utils.midia
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instituicao', '0003_indices_listagem'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='instituicao',
+            name='brasao_instituicao',
+            field=models.ImageField(blank=True, null=True, storage=utils.midia.ArmazenamentoPorConteudo(), upload_to=instituicao.models.get_upload_path, verbose_name='Brasão da Instituição'),
+        ),
+        migrations.AlterField(
+            model_name='instituicao',
+            name='brasao_municipio',
+            field=models.ImageField(blank=True, null=True, storage=utils.midia.ArmazenamentoPorConteudo(), upload_to=instituicao.models.get_upload_path, verbose_name='Brasão do Município'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instituicao', '0004_armazenamento_por_conteudo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='instituicao',
+            name='excluindo',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Exclusão em andamento'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.shortcuts import get_object_or_404
-from .models import Instituicao
+from django.http import Http404
+from usuario.autorizacao import obter_autorizacao
+from usuario.permissoes import normalizar_permissoes, tem_permissao
+from .middleware import carregar_instituicao
 
 class SuperuserRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
     """
@@ -12,22 +14,40 @@ class SuperuserRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
 class InstituicaoAdminRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
     """
     Garante que o usuário seja um Superuser ou um Admin da instituição específica
-    que está sendo acessada via URL.
+    que está sendo acessada via URL. Se a view declarar `permissao_requerida`,
+    membros da instituição cujas funções concedam essas permissões também têm acesso.
     """
+    # Nome do parâmetro da URL que identifica a instituição (lido também pelo InstituicaoMiddleware).
+    instituicao_url_kwarg = 'instituicao_pk'
+    permissao_requerida = None
+
+    def get_permissao_requerida(self):
+        return normalizar_permissoes(self.permissao_requerida)
+
+    def get_instituicao(self):
+        """ Instituição da URL, já carregada pelo InstituicaoMiddleware. """
+        if not hasattr(self.request, 'instituicao'):
+            # Sem o middleware (ex.: testes com RequestFactory), carrega aqui mesmo.
+            self.request.instituicao = carregar_instituicao(self.kwargs.get(self.instituicao_url_kwarg))
+        if self.request.instituicao is None:
+            raise Http404("Instituição não encontrada.")
+        return self.request.instituicao
+
     def test_func(self):
         # O superusuário sempre tem acesso.
         if self.request.user.is_superuser:
             return True
-        
-        # Pega a instituição que está sendo acessada pela URL.
-        # Espera que a URL tenha um parâmetro chamado 'pk' ou 'instituicao_pk'.
-        instituicao_pk = self.kwargs.get('pk') or self.kwargs.get('instituicao_pk')
-        if not instituicao_pk:
-            return False # Se não houver ID da instituição na URL, nega o acesso.
-            
-        instituicao = get_object_or_404(Instituicao, pk=instituicao_pk)
-        
-        # Verifica se o usuário tem um perfil, pertence à instituição correta e é admin dela.
-        return hasattr(self.request.user, 'userprofile') and \
-               self.request.user.userprofile.instituicao == instituicao and \
-               self.request.user.userprofile.is_admin_instituicao
\ No newline at end of file
+
+        # Se não houver ID da instituição na URL, nega o acesso.
+        if not self.kwargs.get(self.instituicao_url_kwarg):
+            return False
+
+        instituicao = self.get_instituicao()
+
+        # Verifica (pelo snapshot em cache) se o usuário pertence à instituição correta e é admin dela.
+        if obter_autorizacao(self.request.user).is_admin_de(instituicao.pk):
+            return True
+
+        # Ou se as funções dele na instituição concedem as permissões exigidas pela view.
+        perms = self.get_permissao_requerida()
+        return bool(perms) and tem_permissao(self.request.user, *perms, instituicao_id=instituicao.pk)
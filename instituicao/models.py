@@ -1,6 +1,6 @@
 import os
 from django.db import models
-from django.utils.text import slugify
+from utils.midia import armazenamento_por_conteudo
 
 class Estado(models.Model):
     nome = models.CharField(max_length=50, unique=True)
@@ -14,6 +14,8 @@ class Estado(models.Model):
 class Municipio(models.Model):
     estado = models.ForeignKey(Estado, on_delete=models.CASCADE, related_name="municipios")
     nome = models.CharField(max_length=150)
+    # Código oficial do IBGE: chave estável usada pelo `popular_localidades` para detectar renomeações.
+    codigo_ibge = models.PositiveIntegerField(unique=True, blank=True, null=True, verbose_name="Código IBGE")
     class Meta:
         verbose_name = "Município"
         verbose_name_plural = "Municípios"
@@ -29,13 +31,18 @@ class TipoInstituicao(models.Model):
         ordering = ['nome']
     def __str__(self): return self.nome
 
+def formatar_nome_gerado(tipo, municipio, uf):
+    # Mantido em sincronia com `instituicao.nomes.expressao_nome_gerado` (o mesmo formato em SQL).
+    return f"{tipo} - {municipio}-{uf}"
+
 def get_upload_path(instance, filename):
-    tipo_brasao = 'instituicao' if hasattr(instance, 'brasao_instituicao') and instance.brasao_instituicao.name == filename else 'municipio'
-    cidade_slug = slugify(instance.municipio.nome)
-    uf_slug = slugify(instance.municipio.estado.uf)
-    ext = filename.split('.')[-1]
-    novo_nome = f"brasao_{tipo_brasao}_{cidade_slug}_{uf_slug}.{ext}"
-    return os.path.join('brasoes', novo_nome)
+    # O nome final é o hash do conteúdo (ver utils/midia.py); aqui só o diretório importa.
+    return os.path.join('brasoes', filename)
+
+class InstituicaoQuerySet(models.QuerySet):
+    def ativas(self):
+        """ Exclui as instituições com exclusão em andamento (ver usuario/exclusao.py). """
+        return self.filter(excluindo=False)
 
 class Instituicao(models.Model):
     tipo = models.ForeignKey(TipoInstituicao, on_delete=models.PROTECT, verbose_name="Tipo de Instituição")
@@ -49,20 +56,39 @@ class Instituicao(models.Model):
     contato = models.CharField(max_length=100, verbose_name="Contato", blank=True, null=True)
     email_institucional = models.EmailField(verbose_name="E-mail Institucional", blank=True, null=True)
     plano_contratado = models.CharField(max_length=50, verbose_name="Plano Contratado", blank=True, null=True)
-    brasao_instituicao = models.ImageField(upload_to=get_upload_path, verbose_name="Brasão da Instituição", blank=True, null=True)
-    brasao_municipio = models.ImageField(upload_to=get_upload_path, verbose_name="Brasão do Município", blank=True, null=True)
+    brasao_instituicao = models.ImageField(upload_to=get_upload_path, storage=armazenamento_por_conteudo, verbose_name="Brasão da Instituição", blank=True, null=True)
+    brasao_municipio = models.ImageField(upload_to=get_upload_path, storage=armazenamento_por_conteudo, verbose_name="Brasão do Município", blank=True, null=True)
     data_cadastro = models.DateTimeField(auto_now_add=True, verbose_name="Data de Cadastro")
+    # Marcada no início da exclusão em segundo plano: some das listagens antes de os dependentes serem removidos.
+    excluindo = models.BooleanField(default=False, editable=False, verbose_name="Exclusão em andamento")
+
+    objects = InstituicaoQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Instituição"
         verbose_name_plural = "Instituições"
         ordering = ['nome_gerado']
         unique_together = [['tipo', 'municipio']]
+        # Paginação por cursor em (nome_gerado, id), com ou sem filtro por tipo (ver listagem.py).
+        indexes = [
+            models.Index(fields=['nome_gerado', 'id'], name='instituicao_nome_idx'),
+            models.Index(fields=['tipo', 'nome_gerado', 'id'], name='instituicao_tipo_nome_idx'),
+            models.Index(fields=['municipio', 'nome_gerado', 'id'], name='instituicao_municipio_nome_idx'),
+        ]
 
     def __str__(self):
         return self.nome_gerado if self.nome_gerado else f"ID: {self.pk}"
 
     def save(self, *args, **kwargs):
-        if self.tipo and self.municipio:
-            self.nome_gerado = f"{self.tipo.nome} - {self.municipio.nome}-{self.municipio.estado.uf}"
-        super().save(*args, **kwargs)
\ No newline at end of file
+        if self.tipo_id and self.municipio_id:
+            self.nome_gerado = self.montar_nome_gerado()
+        super().save(*args, **kwargs)
+
+    def montar_nome_gerado(self):
+        """ Usa tipo, município e estado já carregados; senão, busca os três nomes em uma consulta. """
+        if Instituicao.tipo.is_cached(self) and Instituicao.municipio.is_cached(self) and Municipio.estado.is_cached(self.municipio):
+            return formatar_nome_gerado(self.tipo.nome, self.municipio.nome, self.municipio.estado.uf)
+        tipo = TipoInstituicao.objects.filter(pk=self.tipo_id).order_by().values('nome')[:1]
+        return formatar_nome_gerado(*Municipio.objects.filter(pk=self.municipio_id).values_list(
+            models.Subquery(tipo), 'nome', 'estado__uf'
+        ).get())
\ No newline at end of file
@@ -0,0 +1,63 @@
+# instituicao/nomes.py
+"""
+Manutenção do campo desnormalizado `Instituicao.nome_gerado`.
+
+O nome é "<tipo> - <município>-<UF>" (ver `formatar_nome_gerado`). Quando um
+tipo, município ou estado muda, as instituições afetadas são recalculadas no
+banco com um único UPDATE, por subconsultas correlacionadas; só as linhas cujo
+nome de fato mudou são gravadas. O comando `verificar_nomes_instituicoes`
+usa a mesma expressão para conferir e corrigir todos os nomes.
+"""
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Value, CharField
+from django.db.models.functions import Concat
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .cache import invalidar_instituicoes
+from .models import Estado, Municipio, TipoInstituicao, Instituicao
+
+
+def expressao_nome_gerado():
+    """ Equivalente em SQL de `formatar_nome_gerado`, para a linha corrente de Instituicao. """
+    municipio = Municipio.objects.filter(pk=OuterRef('municipio_id')).order_by()
+    return Concat(
+        Subquery(TipoInstituicao.objects.filter(pk=OuterRef('tipo_id')).order_by().values('nome')[:1]),
+        Value(' - '),
+        Subquery(municipio.values('nome')[:1]),
+        Value('-'),
+        Subquery(municipio.values('estado__uf')[:1]),
+        output_field=CharField(),
+    )
+
+
+def desatualizadas(**filtros):
+    """ Instituições (filtradas por `filtros`) cujo `nome_gerado` não confere. """
+    return Instituicao.objects.filter(**filtros).exclude(nome_gerado=expressao_nome_gerado())
+
+
+def recalcular_nomes(**filtros):
+    """ Recalcula, em um único UPDATE, os nomes desatualizados. Retorna quantos mudaram. """
+    alteradas = desatualizadas(**filtros).update(nome_gerado=expressao_nome_gerado())
+    if alteradas:
+        # `update()` não envia `post_save`.
+        transaction.on_commit(invalidar_instituicoes)
+    return alteradas
+
+
+@receiver(post_save, sender=TipoInstituicao)
+def tipo_salvo(sender, instance, created, **kwargs):
+    if not created:
+        recalcular_nomes(tipo_id=instance.pk)
+
+
+@receiver(post_save, sender=Municipio)
+def municipio_salvo(sender, instance, created, **kwargs):
+    if not created:
+        recalcular_nomes(municipio_id=instance.pk)
+
+
+@receiver(post_save, sender=Estado)
+def estado_salvo(sender, instance, created, **kwargs):
+    if not created:
+        recalcular_nomes(municipio__estado_id=instance.pk)
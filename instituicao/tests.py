@@ -1,3 +1,514 @@
-from django.test import TestCase
+import io
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from usuario.autorizacao import obter_autorizacao
+from usuario.models import UserProfile, Cargo, Patente, Funcao
+from utils.paginacao import codificar_cursor
+from .busca import IndiceMunicipios, buscar_municipios
+from .models import Estado, Municipio, TipoInstituicao, Instituicao
+
+
+class InstituicaoQueryCountTests(TestCase):
+    """
+    A instituição da URL é carregada uma única vez por requisição (com tipo e
+    município já unidos, e do cache quando quente) e reaproveitada pelos
+    mixins, views e pelo processador de contexto.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        estado = Estado.objects.create(nome='São Paulo', uf='SP')
+        municipio = Municipio.objects.create(estado=estado, nome='Guaíra')
+        tipo = TipoInstituicao.objects.create(nome='Guarda Civil Municipal')
+        cls.instituicao = Instituicao.objects.create(tipo=tipo, municipio=municipio)
+        for i in range(5):
+            Cargo.objects.create(instituicao=cls.instituicao, nome=f'Cargo {i}')
+            Patente.objects.create(instituicao=cls.instituicao, nome=f'Patente {i}', ordem=i)
+            Funcao.objects.create(instituicao=cls.instituicao, nome=f'Função {i}')
+
+        cls.superuser = User.objects.create_superuser('admin_si', 'si@example.com', 'senha')
+        cls.admin = User.objects.create_user('admin_gcm', 'gcm@example.com', 'senha')
+        cls.admin.userprofile.instituicao = cls.instituicao
+        cls.admin.userprofile.is_admin_instituicao = True
+        cls.admin.userprofile.save()
+
+    def setUp(self):
+        cache.clear()
+
+    def assertPaginaConsultas(self, usuario, url, consultas):
+        self.client.force_login(usuario)
+        with self.assertNumQueries(consultas):
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta
+
+    def test_primeiro_acesso_calcula_snapshot_de_autorizacao(self):
+        url = reverse('instituicao:detalhe_instituicao', args=[self.instituicao.pk])
+        # sessão + usuário + instituição + snapshot de autorização (frios)
+        self.assertPaginaConsultas(self.admin, url, 4)
+        # sessão + usuário
+        self.assertPaginaConsultas(self.admin, url, 2)
+
+    def test_paginas_institucionais(self):
+        pk = self.instituicao.pk
+        for usuario in (self.superuser, self.admin):
+            with self.subTest(usuario=usuario.username):
+                self.client.force_login(usuario)
+                self.client.get(reverse('instituicao:gerenciar_hierarquia', args=[pk]))  # aquece os caches
+                # sessão + usuário (a hierarquia vem do snapshot em cache)
+                self.assertPaginaConsultas(usuario, reverse('instituicao:detalhe_instituicao', args=[pk]), 2)
+                self.assertPaginaConsultas(usuario, reverse('instituicao:gerenciar_instituicao', args=[pk]), 2)
+                self.assertPaginaConsultas(usuario, reverse('instituicao:gerenciar_hierarquia', args=[pk]), 2)
+
+    def test_snapshot_da_hierarquia_invalidado_ao_criar_cargo(self):
+        url = reverse('instituicao:gerenciar_hierarquia', args=[self.instituicao.pk])
+        self.client.force_login(self.admin)
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Cargo.objects.create(nome='Inspetor', instituicao=self.instituicao)
+        # sessão + usuário + uma única consulta para cargos, patentes e funções
+        resposta = self.assertPaginaConsultas(self.admin, url, 3)
+        self.assertIn('Inspetor', [cargo.nome for cargo in resposta.context['cargos']])
+
+    def test_contexto_usa_instituicao_da_url(self):
+        resposta = self.assertPaginaConsultas(self.superuser, reverse('instituicao:detalhe_instituicao', args=[self.instituicao.pk]), 4)
+        self.assertEqual(resposta.context['instituicao_ativa'], resposta.context['instituicao'])
+
+    def test_contexto_institucional_preguicoso(self):
+        # O login não usa a instituição ativa: nenhuma consulta à instituição ou ao perfil.
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('autenticacao:login'))
+        tabelas = ' '.join(c['sql'] for c in consultas.captured_queries)
+        self.assertNotIn('instituicao_instituicao', tabelas)
+        self.assertNotIn('usuario_userprofile', tabelas)
+
+    def test_instituicao_em_cache_invalidada_ao_salvar(self):
+        url = reverse('instituicao:detalhe_instituicao', args=[self.instituicao.pk])
+        self.assertPaginaConsultas(self.admin, url, 4)
+        instituicao = Instituicao.objects.get(pk=self.instituicao.pk)
+        instituicao.contato = 'Central 153'
+        with self.captureOnCommitCallbacks(execute=True):
+            instituicao.save()
+        resposta = self.assertPaginaConsultas(self.admin, url, 3)
+        self.assertEqual(resposta.context['instituicao'].contato, 'Central 153')
+
+    def test_autorizacao_invalidada_ao_alterar_perfil(self):
+        url = reverse('instituicao:detalhe_instituicao', args=[self.instituicao.pk])
+        self.assertPaginaConsultas(self.admin, url, 4)
+        perfil = self.admin.userprofile
+        perfil.is_admin_instituicao = False
+        with self.captureOnCommitCallbacks(execute=True):
+            perfil.save()
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_instituicao_inexistente(self):
+        self.client.force_login(self.admin)
+        resposta = self.client.get(reverse('instituicao:gerenciar_hierarquia', args=[999]))
+        self.assertEqual(resposta.status_code, 404)
+
+
+class AtribuicaoEmLoteTests(TestCase):
+    """ Atribuição de cargo, patente e funções a vários membros de uma vez. """
+
+    @classmethod
+    def setUpTestData(cls):
+        estado = Estado.objects.create(nome='São Paulo', uf='SP')
+        tipo = TipoInstituicao.objects.create(nome='Guarda Civil Municipal')
+        cls.instituicao = Instituicao.objects.create(tipo=tipo, municipio=Municipio.objects.create(estado=estado, nome='Guaíra'))
+        cls.outra = Instituicao.objects.create(tipo=tipo, municipio=Municipio.objects.create(estado=estado, nome='Barretos'))
+        cls.cargo = Cargo.objects.create(instituicao=cls.instituicao, nome='Inspetor')
+        cls.patente = Patente.objects.create(instituicao=cls.instituicao, nome='Cabo', ordem=1)
+        cls.ronda = Funcao.objects.create(instituicao=cls.instituicao, nome='Ronda')
+        cls.transito = Funcao.objects.create(instituicao=cls.instituicao, nome='Trânsito')
+        cls.cargo_de_outra = Cargo.objects.create(instituicao=cls.outra, nome='Inspetor')
+
+        cls.admin = User.objects.create_user('admin_gcm')
+        cls.admin.userprofile.instituicao = cls.instituicao
+        cls.admin.userprofile.is_admin_instituicao = True
+        cls.admin.userprofile.save()
+        cls.membros = []
+        for i in range(30):
+            perfil = User.objects.create_user(f'agente{i}').userprofile
+            perfil.instituicao = cls.instituicao
+            perfil.save()
+            perfil.funcoes.add(cls.transito)
+            cls.membros.append(perfil)
+        cls.estranho = User.objects.create_user('de_fora').userprofile
+        cls.estranho.instituicao = cls.outra
+        cls.estranho.save()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+        self.url = reverse('instituicao:atribuir_membros', args=[self.instituicao.pk])
+
+    def _atribuir(self, membros, **dados):
+        return self.client.post(self.url, {'membros': [m.pk for m in membros], **dados}, HTTP_ACCEPT='application/json')
+
+    def test_aplica_alteracoes_em_lote(self):
+        resposta = self._atribuir(self.membros + [self.estranho], cargo=self.cargo.pk, patente=self.patente.pk,
+                                  adicionar_funcoes=[self.ronda.pk], remover_funcoes=[self.transito.pk])
+        self.assertEqual(resposta.json(), {'membros': 30, 'funcoes_removidas': 30})
+        for perfil in UserProfile.objects.filter(instituicao=self.instituicao, is_admin_instituicao=False).prefetch_related('funcoes'):
+            self.assertEqual((perfil.cargo_id, perfil.patente_id), (self.cargo.pk, self.patente.pk))
+            self.assertEqual([f.pk for f in perfil.funcoes.all()], [self.ronda.pk])
+        # Membros de outra instituição são ignorados.
+        self.estranho.refresh_from_db()
+        self.assertIsNone(self.estranho.cargo_id)
+
+    def test_consultas_nao_dependem_do_numero_de_membros(self):
+        resposta = self.client.get(reverse('instituicao:lista_membros', args=[self.instituicao.pk]))  # aquece os caches
+        self.assertContains(resposta, 'form-atribuicao')
+        dados = {'cargo': self.cargo.pk, 'adicionar_funcoes': [self.ronda.pk], 'remover_funcoes': [self.transito.pk]}
+        with CaptureQueriesContext(connection) as poucos:
+            self._atribuir(self.membros[:3], **dados)
+        with CaptureQueriesContext(connection) as muitos:
+            self._atribuir(self.membros, **dados)
+        self.assertEqual(len(poucos), len(muitos))
+
+    def test_rejeita_opcoes_de_outra_instituicao(self):
+        resposta = self._atribuir(self.membros, cargo=self.cargo_de_outra.pk)
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('cargo', resposta.json()['erros'])
+
+    def test_invalida_autorizacao_dos_membros(self):
+        membro = self.membros[0]
+        self.client.force_login(membro.user)
+        self.client.get(reverse('painel:dashboard'))  # aquece o snapshot do membro
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self._atribuir([membro], adicionar_funcoes=[self.ronda.pk])
+        user = User.objects.get(pk=membro.user_id)
+        self.assertIn(self.ronda.pk, obter_autorizacao(user).funcao_ids)
+
+    def test_membro_comum_nao_atribui(self):
+        self.client.force_login(self.membros[0].user)
+        resposta = self._atribuir(self.membros, cargo=self.cargo.pk)
+        self.assertEqual(resposta.status_code, 403)
+
+
+class NomeGeradoTests(TestCase):
+    """ `nome_gerado` acompanha renomeações de tipo, município e estado, por UPDATE em conjunto. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.estado = Estado.objects.create(nome='São Paulo', uf='SP')
+        cls.tipo = TipoInstituicao.objects.create(nome='Guarda Civil Municipal')
+        cls.municipios = [Municipio.objects.create(estado=cls.estado, nome=f'Cidade {i}') for i in range(3)]
+        for municipio in cls.municipios:
+            Instituicao.objects.create(tipo=cls.tipo, municipio=municipio)
+
+    def nomes(self):
+        return list(Instituicao.objects.order_by('pk').values_list('nome_gerado', flat=True))
+
+    def test_renomear_tipo_atualiza_todas_em_um_update(self):
+        self.tipo.nome = 'Guarda Municipal'
+        with CaptureQueriesContext(connection) as consultas:
+            self.tipo.save()
+        updates = [c['sql'] for c in consultas.captured_queries if 'UPDATE "instituicao_instituicao"' in c['sql']]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.nomes(), [f'Guarda Municipal - Cidade {i}-SP' for i in range(3)])
+
+    def test_renomear_municipio_e_uf(self):
+        municipio = self.municipios[1]
+        municipio.nome = 'Guaíra'
+        municipio.save()
+        self.estado.uf = 'XX'
+        self.estado.save()
+        self.assertEqual(self.nomes()[1], 'Guarda Civil Municipal - Guaíra-XX')
+
+    def test_save_nao_busca_relacionados_ja_carregados(self):
+        instituicao = Instituicao.objects.select_related('tipo', 'municipio__estado').first()
+        with self.assertNumQueries(1):  # só o UPDATE
+            instituicao.save()
+        instituicao = Instituicao.objects.first()
+        with self.assertNumQueries(2):  # os três nomes em uma consulta + UPDATE
+            instituicao.save()
+
+    def test_comando_verifica_e_corrige(self):
+        Instituicao.objects.update(nome_gerado='desatualizado')
+        saida = io.StringIO()
+        call_command('verificar_nomes_instituicoes', stdout=saida)
+        self.assertIn('3 nome(s) desatualizado(s)', saida.getvalue())
+        self.assertEqual(set(self.nomes()), {'desatualizado'})
+        call_command('verificar_nomes_instituicoes', '--corrigir', stdout=io.StringIO())
+        self.assertEqual(self.nomes(), [f'Guarda Civil Municipal - Cidade {i}-SP' for i in range(3)])
+
+
+class ListagemInstituicoesTests(TestCase):
+    """ Lista do Admin SI e lobby: filtros e paginação por cursor com número fixo de consultas. """
+
+    @classmethod
+    def setUpTestData(cls):
+        sp = Estado.objects.create(nome='São Paulo', uf='SP')
+        mg = Estado.objects.create(nome='Minas Gerais', uf='MG')
+        cls.gcm = TipoInstituicao.objects.create(nome='Guarda Civil Municipal')
+        defesa = TipoInstituicao.objects.create(nome='Defesa Civil')
+        for i in range(7):
+            estado = sp if i % 2 else mg
+            municipio = Municipio.objects.create(estado=estado, nome=f'Cidade {i}')
+            Instituicao.objects.create(tipo=cls.gcm, municipio=municipio)
+            Instituicao.objects.create(tipo=defesa, municipio=municipio)
+        cls.superuser = User.objects.create_superuser('admin_si', 'si@example.com', 'senha')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.superuser)
+
+    def percorrer(self, url, parametros, consultas=3):
+        nomes, parametros = [], dict(parametros, formato='json')
+        while True:
+            # sessão + usuário + página (+ uma validação por filtro de UF ou tipo)
+            with patch('instituicao.listagem.INSTITUICOES_POR_PAGINA', 4), self.assertNumQueries(consultas):
+                dados = self.client.get(url, parametros).json()
+            nomes += [i['nome'] for i in dados['resultados']]
+            if not dados['proximo']:
+                return nomes
+            parametros['cursor'] = dados['proximo']
+
+    def test_paginas_percorrem_todas_em_ordem(self):
+        nomes = self.percorrer(reverse('instituicao:lista_instituicoes'), {})
+        self.assertEqual(nomes, list(Instituicao.objects.order_by('nome_gerado', 'id').values_list('nome_gerado', flat=True)))
+
+    def test_filtros(self):
+        url = reverse('instituicao:lista_instituicoes')
+        self.assertEqual(len(self.percorrer(url, {'uf': 'SP', 'tipo': self.gcm.pk}, consultas=5)), 3)
+        buscar_municipios('cidade')  # carrega o índice em memória de municípios
+        self.assertEqual(self.percorrer(url, {'q': 'cidade 4'}), ['Defesa Civil - Cidade 4-MG', 'Guarda Civil Municipal - Cidade 4-MG'])
+        self.assertEqual(len(self.percorrer(url, {'q': 'defesa'})), 7)
+
+    def test_cursor_adulterado_volta_ao_inicio(self):
+        primeira = Instituicao.objects.order_by('nome_gerado', 'id').first().nome_gerado
+        for url in (reverse('instituicao:lista_instituicoes'), reverse('painel:dashboard')):
+            for valores in (['a', 'abc'], [None, None], [1, 'x']):
+                with self.subTest(url=url, valores=valores):
+                    resposta = self.client.get(url, {'cursor': codificar_cursor(valores), 'formato': 'json'})
+                    self.assertEqual(resposta.status_code, 200)
+                    self.assertEqual(resposta.json()['resultados'][0]['nome'], primeira)
+            self.assertEqual(self.client.get(url, {'cursor': codificar_cursor(['a', 'abc'])}).status_code, 200)
+
+    def test_lobby_carrega_mais_em_json(self):
+        url = reverse('painel:dashboard')
+        self.assertEqual(len(self.percorrer(url, {})), 14)
+        # sessão + usuário + snapshot de autorização + estados e tipos do filtro + página
+        with self.assertNumQueries(6):
+            resposta = self.client.get(url)
+        self.assertEqual(len(resposta.context['instituicoes_vinculadas']), 14)
+
+
+class SincronizacaoLocalidadesTests(TestCase):
+    """ `popular_localidades` contra a API do IBGE simulada (`requests.get`). """
+
+    ESTADOS = [{'sigla': 'AC', 'nome': 'Acre'}, {'sigla': 'SP', 'nome': 'São Paulo'}]
+    MUNICIPIOS = {
+        'AC': [{'id': 1200013, 'nome': 'Acrelândia'}],
+        'SP': [{'id': 3517406, 'nome': 'Guaíra'}, {'id': 3505500, 'nome': 'Barretos'}, {'id': 3550308, 'nome': 'São Paulo'}],
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sp = Estado.objects.create(nome='Sao Paulo', uf='SP')
+        tipo = TipoInstituicao.objects.create(nome='Guarda Civil Municipal')
+        cls.guaira = Municipio.objects.create(estado=cls.sp, nome='Guaira', codigo_ibge=3517406)
+        cls.barretos = Municipio.objects.create(estado=cls.sp, nome='Barretos')  # legado, sem código
+        cls.extinto = Municipio.objects.create(estado=cls.sp, nome='Extinto', codigo_ibge=3500001)
+        cls.sumiu = Municipio.objects.create(estado=cls.sp, nome='Sumiu', codigo_ibge=3500002)
+        cls.gcm_guaira = Instituicao.objects.create(tipo=tipo, municipio=cls.guaira)
+        Instituicao.objects.create(tipo=tipo, municipio=cls.extinto)
+
+    @classmethod
+    def resposta_ibge(cls, url, timeout=None):
+        resposta = type('Resposta', (), {'raise_for_status': lambda self: None})()
+        if url.endswith('/estados?orderBy=nome'):
+            dados = cls.ESTADOS
+        else:
+            dados = cls.MUNICIPIOS[url.rstrip('/').split('/')[-2]]
+        resposta.json = lambda: dados
+        return resposta
+
+    def sincronizar(self):
+        saida = io.StringIO()
+        with patch('requests.get', side_effect=self.resposta_ibge) as get, self.captureOnCommitCallbacks(execute=True):
+            call_command('popular_localidades', '--workers', '2', stdout=saida)
+        self.assertEqual(get.call_count, 3)
+        return saida.getvalue()
+
+    def test_sincroniza_so_as_diferencas(self):
+        saida = self.sincronizar()
+        self.assertIn('municipios_protegidos: 1', saida)
+
+        self.sp.refresh_from_db()
+        self.assertEqual(self.sp.nome, 'São Paulo')
+        self.assertEqual(Estado.objects.get(uf='AC').municipios.get().codigo_ibge, 1200013)
+        # Renomeado pelo código IBGE, mantendo o id (e o nome das instituições acompanha).
+        self.guaira.refresh_from_db()
+        self.assertEqual(self.guaira.nome, 'Guaíra')
+        self.gcm_guaira.refresh_from_db()
+        self.assertEqual(self.gcm_guaira.nome_gerado, 'Guarda Civil Municipal - Guaíra-SP')
+        # Registro legado, casado por (estado, nome), recebe o código.
+        self.barretos.refresh_from_db()
+        self.assertEqual(self.barretos.codigo_ibge, 3505500)
+        self.assertTrue(Municipio.objects.filter(codigo_ibge=3550308, estado=self.sp).exists())
+        # Ausentes na origem: removido, salvo se houver instituição vinculada.
+        self.assertTrue(Municipio.objects.filter(pk=self.extinto.pk).exists())
+        self.assertFalse(Municipio.objects.filter(pk=self.sumiu.pk).exists())
+
+        # Segunda execução: nada a gravar.
+        with CaptureQueriesContext(connection) as consultas:
+            saida = self.sincronizar()
+        self.assertIn('Nenhuma alteração necessária', saida)
+        self.assertFalse([c for c in consultas.captured_queries if not c['sql'].startswith('SELECT')])
+
+
+class CarregarMunicipiosTests(TestCase):
+    """ JSON pré-serializado dos municípios, com ETag forte, 304 e gzip negociado. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sp = Estado.objects.create(nome='São Paulo', uf='SP')
+        for nome in ('Guaíra', 'Barretos', 'Olímpia'):
+            Municipio.objects.create(estado=cls.sp, nome=nome)
+        cls.usuario = User.objects.create_user('agente')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+        self.url = reverse('instituicao:ajax_carregar_municipios')
+
+    def get(self, **cabecalhos):
+        return self.client.get(self.url, {'estado_id': self.sp.pk}, **cabecalhos)
+
+    def test_etag_304_e_gzip(self):
+        import gzip
+        import json
+
+        pura = self.get()
+        self.assertEqual([m['nome'] for m in json.loads(pura.content)], ['Barretos', 'Guaíra', 'Olímpia'])
+        self.assertFalse(pura.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', pura['Vary'])
+
+        compactada = self.get(HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(compactada['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compactada.content), pura.content)
+        # Representações diferentes, ETags fortes diferentes.
+        self.assertNotEqual(compactada['ETag'], pura['ETag'])
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=pura['ETag']).status_code, 304)
+        revalidada = self.get(HTTP_IF_NONE_MATCH=compactada['ETag'], HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual((revalidada.status_code, revalidada['ETag']), (304, compactada['ETag']))
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=pura['ETag'], HTTP_ACCEPT_ENCODING='gzip').status_code, 200)
+
+    def test_municipio_salvo_troca_a_versao(self):
+        antes = self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            Municipio.objects.create(estado=self.sp, nome='Bebedouro')
+        depois = self.get(HTTP_IF_NONE_MATCH=antes['ETag'])
+        self.assertEqual(depois.status_code, 200)
+        self.assertNotEqual(depois['ETag'], antes['ETag'])
+        self.assertIn('Bebedouro', depois.content.decode())
+
+    def test_estado_invalido(self):
+        self.assertEqual(self.client.get(self.url, {'estado_id': 'x'}).json(), [])
+
+    def test_estado_inexistente_nao_entra_no_cache(self):
+        from . import cache as cache_municipios
+
+        self.get()
+        for estado_id in range(self.sp.pk + 1, self.sp.pk + 50):
+            resposta = self.client.get(self.url, {'estado_id': estado_id})
+            self.assertEqual((resposta.json(), resposta.has_header('ETag')), ([], False))
+        self.assertEqual(set(cache_municipios._respostas), {self.sp.pk})
+
+        # Um estado criado depois troca a versão e passa a ser aceito.
+        with self.captureOnCommitCallbacks(execute=True):
+            mg = Estado.objects.create(nome='Minas Gerais', uf='MG')
+        self.assertTrue(self.client.get(self.url, {'estado_id': mg.pk}).has_header('ETag'))
+
+    def test_gzip_recusado_com_q_zero(self):
+        for cabecalho in ('gzip;q=0', 'gzip; q=0.0, identity', 'br, gzip;q=0'):
+            with self.subTest(cabecalho=cabecalho):
+                self.assertFalse(self.get(HTTP_ACCEPT_ENCODING=cabecalho).has_header('Content-Encoding'))
+        self.assertEqual(self.get(HTTP_ACCEPT_ENCODING='gzip;q=0.5')['Content-Encoding'], 'gzip')
+
+
+class BuscaMunicipiosTests(SimpleTestCase):
+    """ Índice em memória: sem acentos, em faixas de relevância e limitado. """
+
+    NOMES = [
+        ('Cariocas', 'RJ'), ('Rio Claro', 'SP'), ('Três Rios', 'RJ'), ('Vale do Rio Doce', 'MG'),
+        ('Rio Branco', 'AC'), ('São Paulo', 'SP'), ('São Paulo de Olivença', 'AM'), ('Guaíra', 'SP'),
+    ]
+
+    def setUp(self):
+        self.indice = IndiceMunicipios((i, nome, uf, i) for i, (nome, uf) in enumerate(self.NOMES))
+
+    def nomes(self, termo, **kwargs):
+        return [r.nome for r in self.indice.buscar(termo, **kwargs)]
+
+    def test_ordem_prefixo_palavra_substring(self):
+        self.assertEqual(self.nomes('rio'), ['Rio Branco', 'Rio Claro', 'Vale do Rio Doce', 'Três Rios', 'Cariocas'])
+
+    def test_insensivel_a_acentos_e_maiusculas(self):
+        self.assertEqual(self.nomes('GUAIRA'), ['Guaíra'])
+        self.assertEqual(self.nomes('  sÃo   paulo '), ['São Paulo', 'São Paulo de Olivença'])
+        self.assertEqual(self.nomes('olivenca'), ['São Paulo de Olivença'])
+
+    def test_limite_uf_e_termo_vazio(self):
+        self.assertEqual(self.nomes('rio', limite=2), ['Rio Branco', 'Rio Claro'])
+        self.assertEqual(self.nomes('rio', uf='rj'), ['Três Rios', 'Cariocas'])
+        # O filtro de estado vale antes do limite: 'Cariocas' (substring) ainda aparece.
+        self.assertEqual(self.nomes('rio', limite=1, uf='RJ', estado_id=0), ['Cariocas'])
+        self.assertEqual(self.nomes('  '), [])
+        self.assertEqual(self.nomes('-'), [])
+
+
+class BuscaMunicipiosAjaxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        estado = Estado.objects.create(nome='São Paulo', uf='SP')
+        for i in range(60):
+            Municipio.objects.create(estado=estado, nome=f'Santa Cidade {i:02d}')
+        cls.usuario = User.objects.create_user('agente')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def buscar(self, **parametros):
+        return self.client.get(reverse('instituicao:ajax_buscar_municipios'), parametros).json()
+
+    def test_limite_e_termo_vazio(self):
+        self.assertEqual(self.buscar(q=''), [])
+        self.assertEqual(len(self.buscar(q='santa')), 10)
+        self.assertEqual(len(self.buscar(q='santa', limite=3)), 3)
+        self.assertEqual(len(self.buscar(q='santa', limite=500)), 50)
+        self.assertEqual(len(self.buscar(q='santa', limite='x')), 10)
+        self.assertEqual([(r['nome'], r['uf']) for r in self.buscar(q='SANTA cidade 07')], [('Santa Cidade 07', 'SP')])
+
+    def test_filtro_de_estado_antes_do_limite(self):
+        from .admin import MunicipioAdmin
+        from .forms import FiltroInstituicoesForm
+
+        mg = Estado.objects.create(nome='Minas Gerais', uf='MG')
+        santa_rita = Municipio.objects.create(estado=mg, nome='Santa Rita')  # depois das 60 "Santa Cidade" de SP
+        instituicao = Instituicao.objects.create(tipo=TipoInstituicao.objects.create(nome='Guarda Civil Municipal'), municipio=santa_rita)
+
+        self.client.force_login(User.objects.create_superuser('admin_si', 'si@example.com', 'senha'))
+        with patch.object(MunicipioAdmin, 'limite_busca', 5):
+            resposta = self.client.get(reverse('admin:instituicao_municipio_changelist'), {'q': 'santa', 'estado__id__exact': mg.pk})
+        self.assertEqual(list(resposta.context['cl'].result_list), [santa_rita])
+
+        form = FiltroInstituicoesForm({'q': 'santa', 'uf': 'MG'})
+        self.assertTrue(form.is_valid())
+        with patch.object(FiltroInstituicoesForm, 'limite_municipios', 5):
+            self.assertEqual(list(form.filtrar(Instituicao.objects.all())), [instituicao])
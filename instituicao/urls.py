@@ -1,4 +1,5 @@
 from django.urls import path
+from utils.breadcrumbs import Migalha, registrar
 from . import views
 
 app_name = 'instituicao'
@@ -12,11 +13,13 @@ urlpatterns = [
 
     # URL para a chamada dinâmica (AJAX)
     path('ajax/carregar-municipios/', views.carregar_municipios, name='ajax_carregar_municipios'),
+    path('ajax/buscar-municipios/', views.buscar_municipios_ajax, name='ajax_buscar_municipios'),
     
     # URLs para Tipos de Instituição (Globais, para Admin SI)
     path('tipos/', views.TipoInstituicaoView.as_view(), name='lista_tipos'),
     path('tipos/<int:pk>/editar/', views.TipoInstituicaoUpdateView.as_view(), name='edita_tipo'),
     path('tipos/<int:pk>/excluir/', views.TipoInstituicaoDeleteView.as_view(), name='exclui_tipo'),
+    path('tipos/<int:pk>/aplicar-modelo/', views.AplicarModeloHierarquiaView.as_view(), name='aplicar_modelo_tipo'),
 
     # --- ROTAS DE NAVEGAÇÃO E CONTEXTO INSTITUCIONAL ---
     path('<int:pk>/detalhe/', views.InstituicaoDetailView.as_view(), name='detalhe_instituicao'),
@@ -24,6 +27,7 @@ urlpatterns = [
     path('sair-contexto/', views.sair_contexto_institucional, name='sair_contexto'),
     path('<int:pk>/gerenciar/', views.GerenciarInstituicaoView.as_view(), name='gerenciar_instituicao'),
     path('<int:instituicao_pk>/membros/', views.InstituicaoMembrosListView.as_view(), name='lista_membros'),
+    path('<int:instituicao_pk>/membros/atribuir/', views.AtribuirMembrosView.as_view(), name='atribuir_membros'),
     
     # --- ROTAS DE GERENCIAMENTO DE HIERARQUIA LOCAL ---
     
@@ -37,8 +41,32 @@ urlpatterns = [
     # Rotas para Editar e Excluir Patentes
     path('<int:instituicao_pk>/patentes/<int:pk>/editar/', views.PatenteUpdateView.as_view(), name='edita_patente'),
     path('<int:instituicao_pk>/patentes/<int:pk>/excluir/', views.PatenteDeleteView.as_view(), name='exclui_patente'),
+    path('<int:instituicao_pk>/patentes/<int:pk>/mover/', views.MoverPatenteView.as_view(), name='mover_patente'),
+    path('<int:instituicao_pk>/patentes/ordenar/', views.OrdenarPatentesView.as_view(), name='ordenar_patentes'),
 
     # Rotas para Editar e Excluir Funções
     path('<int:instituicao_pk>/funcoes/<int:pk>/editar/', views.FuncaoUpdateView.as_view(), name='edita_funcao'),
     path('<int:instituicao_pk>/funcoes/<int:pk>/excluir/', views.FuncaoDeleteView.as_view(), name='exclui_funcao'),
-]
\ No newline at end of file
+]
+
+# Breadcrumbs (ver utils/breadcrumbs.py)
+registrar(app_name, {
+    'lista_instituicoes': Migalha('Instituições'),
+    'cria_instituicao': Migalha('Nova Instituição', pai='lista_instituicoes'),
+    'edita_instituicao': Migalha('Editar {objeto.nome_gerado}', pai='lista_instituicoes', objeto='object', padrao='Editar Instituição'),
+    'exclui_instituicao': Migalha('Excluir {objeto.nome_gerado}', pai='lista_instituicoes', objeto='object', padrao='Excluir Instituição'),
+    'lista_tipos': Migalha('Tipos de Instituição', pai='lista_instituicoes'),
+    'edita_tipo': Migalha('Editar {objeto.nome}', pai='lista_tipos', objeto='object', padrao='Editar Tipo'),
+    'exclui_tipo': Migalha('Excluir {objeto.nome}', pai='lista_tipos', objeto='object', padrao='Excluir Tipo'),
+
+    'detalhe_instituicao': Migalha('{objeto.nome_gerado}', objeto='instituicao', padrao='Instituição'),
+    'gerenciar_instituicao': Migalha('Gerenciamento', pai='detalhe_instituicao'),
+    'lista_membros': Migalha('Efetivo', pai='gerenciar_instituicao', kwargs_pai={'pk': 'instituicao_pk'}),
+    'gerenciar_hierarquia': Migalha('Hierarquia', pai='gerenciar_instituicao', kwargs_pai={'pk': 'instituicao_pk'}),
+    'edita_cargo': Migalha('Editar {objeto.nome}', pai='gerenciar_hierarquia', objeto='object', padrao='Editar Cargo'),
+    'exclui_cargo': Migalha('Excluir {objeto.nome}', pai='gerenciar_hierarquia', objeto='object', padrao='Excluir Cargo'),
+    'edita_patente': Migalha('Editar {objeto.nome}', pai='gerenciar_hierarquia', objeto='object', padrao='Editar Patente'),
+    'exclui_patente': Migalha('Excluir {objeto.nome}', pai='gerenciar_hierarquia', objeto='object', padrao='Excluir Patente'),
+    'edita_funcao': Migalha('Editar {objeto.nome}', pai='gerenciar_hierarquia', objeto='object', padrao='Editar Função'),
+    'exclui_funcao': Migalha('Excluir {objeto.nome}', pai='gerenciar_hierarquia', objeto='object', padrao='Excluir Função'),
+})
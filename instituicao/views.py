@@ -1,7 +1,13 @@
-from django.http import JsonResponse
-from django.urls import reverse_lazy
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotModified, JsonResponse
+from django.utils.http import parse_etags
+from django.urls import reverse, reverse_lazy
 from django.contrib.auth.decorators import login_required
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView, View
+from django.views.generic.base import ContextMixin
 from django.contrib.messages.views import SuccessMessageMixin
 from django.contrib import messages
 from django.shortcuts import get_object_or_404, render, redirect
@@ -9,19 +15,30 @@ from django.shortcuts import get_object_or_404, render, redirect
 # Importações de Modelos, Formulários e Mixins
 from .models import Instituicao, TipoInstituicao, Estado, Municipio
 from usuario.models import UserProfile, Cargo, Patente, Funcao
-from .forms import InstituicaoForm, TipoInstituicaoForm
-from usuario.forms import CargoForm, PatenteForm, FuncaoForm
+from .forms import InstituicaoForm, InstituicaoCreateForm, TipoInstituicaoForm
+from usuario.forms import CargoForm, PatenteForm, FuncaoForm, AtribuicaoEmLoteForm
+from usuario.atribuicao import atribuir_em_lote
+from usuario.hierarquia import obter_hierarquia
+from usuario.ordenacao import mover_patente, aplicar_ordem
+from usuario.modelo_hierarquia import aplicar_modelo, aplicar_modelo_em_segundo_plano
+from usuario.exclusao import excluir_instituicao_em_segundo_plano
+from usuario.permissoes import tem_permissao
 from .mixins import SuperuserRequiredMixin, InstituicaoAdminRequiredMixin
+from .cache import obter_municipios_por_estado
+from usuario.autorizacao import obter_autorizacao
+from utils.estaticos import codificacoes_aceitas
+from .busca import buscar_municipios
+from .listagem import listar_instituicoes
 
 
 # --- VIEWS PARA MUDANÇA DE CONTEXTO ---
 @login_required
 def entrar_contexto_institucional(request, pk):
     """ Salva na sessão o ID da instituição que o usuário quer gerenciar/visualizar. """
-    instituicao = get_object_or_404(Instituicao, pk=pk)
+    instituicao = get_object_or_404(Instituicao.objects.ativas(), pk=pk)
 
     if not request.user.is_superuser:
-        if not hasattr(request.user, 'userprofile') or request.user.userprofile.instituicao != instituicao:
+        if obter_autorizacao(request.user).instituicao_id != instituicao.pk:
             messages.error(request, "Acesso não permitido.")
             return redirect('painel:dashboard')
 
@@ -39,15 +56,19 @@ def sair_contexto_institucional(request):
 
 
 # --- Views de Gerenciamento Geral de Instituições (para Admin SI) ---
-class InstituicaoListView(SuperuserRequiredMixin, ListView):
-    model = Instituicao
+class InstituicaoListView(SuperuserRequiredMixin, View):
+    """ Lista filtrável, paginada por cursor; `?formato=json` devolve a página em JSON. """
     template_name = 'instituicao/lista_instituicoes.html'
-    context_object_name = 'instituicoes'
-    paginate_by = 10
+
+    def get(self, request, *args, **kwargs):
+        listagem = listar_instituicoes(request)
+        if request.GET.get('formato') == 'json':
+            return listagem.resposta_json()
+        return render(request, self.template_name, listagem.contexto())
 
 class InstituicaoCreateView(SuperuserRequiredMixin, SuccessMessageMixin, CreateView):
     model = Instituicao
-    form_class = InstituicaoForm
+    form_class = InstituicaoCreateForm
     template_name = 'instituicao/instituicao_form.html'
     success_url = reverse_lazy('instituicao:lista_instituicoes')
     success_message = "Instituição criada com sucesso!"
@@ -57,10 +78,19 @@ class InstituicaoCreateView(SuperuserRequiredMixin, SuccessMessageMixin, CreateV
         if self.request.POST and 'estado' in self.request.POST:
             try:
                 estado_id = int(self.request.POST.get('estado'))
-                form.fields['municipio'].queryset = Municipio.objects.filter(estado_id=estado_id).order_by('nome')
+                form.fields['municipio'].queryset = Municipio.objects.filter(estado_id=estado_id).select_related('estado').order_by('nome')
             except (ValueError, TypeError): pass
         return form
 
+    def form_valid(self, form):
+        with transaction.atomic():
+            response = super().form_valid(form)
+            if form.cleaned_data.get('aplicar_modelo'):
+                resultado = aplicar_modelo(self.object.tipo_id, [self.object.pk])
+                if resultado.inseridos:
+                    messages.info(self.request, f"{resultado.inseridos} cargo(s), patente(s) e função(ões) criados a partir do modelo do tipo.")
+        return response
+
     def form_invalid(self, form):
         messages.error(self.request, "Não foi possível salvar a instituição. Por favor, corrija os erros abaixo.")
         return super().form_invalid(form)
@@ -73,6 +103,7 @@ class InstituicaoCreateView(SuperuserRequiredMixin, SuccessMessageMixin, CreateV
 
 class InstituicaoUpdateView(SuperuserRequiredMixin, SuccessMessageMixin, UpdateView):
     model = Instituicao
+    queryset = Instituicao.objects.ativas().select_related('municipio')
     form_class = InstituicaoForm
     template_name = 'instituicao/instituicao_form.html'
     success_url = reverse_lazy('instituicao:lista_instituicoes')
@@ -81,11 +112,11 @@ class InstituicaoUpdateView(SuperuserRequiredMixin, SuccessMessageMixin, UpdateV
     def get_form(self, form_class=None):
         form = super().get_form(form_class)
         if self.request.method == 'GET' and self.object.municipio:
-            form.fields['municipio'].queryset = Municipio.objects.filter(estado=self.object.municipio.estado).order_by('nome')
+            form.fields['municipio'].queryset = Municipio.objects.filter(estado_id=self.object.municipio.estado_id).select_related('estado').order_by('nome')
         elif self.request.POST and 'estado' in self.request.POST:
             try:
                 estado_id = int(self.request.POST.get('estado'))
-                form.fields['municipio'].queryset = Municipio.objects.filter(estado_id=estado_id).order_by('nome')
+                form.fields['municipio'].queryset = Municipio.objects.filter(estado_id=estado_id).select_related('estado').order_by('nome')
             except (ValueError, TypeError): pass
         return form
         
@@ -98,45 +129,144 @@ class InstituicaoUpdateView(SuperuserRequiredMixin, SuccessMessageMixin, UpdateV
         context['titulo_pagina'] = f'Editar Instituição: {self.object.nome_gerado}'
         context['estados'] = Estado.objects.all()
         if self.object.municipio:
-            context['selected_estado_id'] = self.object.municipio.estado.id
+            context['selected_estado_id'] = self.object.municipio.estado_id
         return context
 
-class InstituicaoDeleteView(SuperuserRequiredMixin, SuccessMessageMixin, DeleteView):
+class InstituicaoDeleteView(SuperuserRequiredMixin, DeleteView):
+    """
+    Marca a instituição como em exclusão (ela some das listagens na hora) e
+    exclui os dependentes em lotes, em segundo plano (ver usuario/exclusao.py).
+    O progresso fica em `utils:situacao_tarefa`.
+    """
     model = Instituicao
+    queryset = Instituicao.objects.ativas()
     template_name = 'partials/generic_confirm_delete.html'
     success_url = reverse_lazy('instituicao:lista_instituicoes')
-    success_message = "Instituição excluída com sucesso!"
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['titulo'] = "Excluir Instituição"
         return context
 
+    def form_valid(self, form):
+        tarefa_id = excluir_instituicao_em_segundo_plano(self.object, usuario=self.request.user)
+        situacao_url = reverse('utils:situacao_tarefa', args=[tarefa_id])
+        if 'application/json' in self.request.headers.get('Accept', ''):
+            return JsonResponse({'tarefa': tarefa_id, 'situacao_url': situacao_url}, status=202)
+        messages.info(self.request, f"A exclusão de {self.object.nome_gerado} foi iniciada e continua em segundo plano.")
+        return redirect(self.get_success_url())
+
 # --- Views de Visualização e Gerenciamento Institucional ---
 
 class InstituicaoDetailView(InstituicaoAdminRequiredMixin, DetailView):
     model = Instituicao
     template_name = 'instituicao/detalhe_instituicao.html'
     context_object_name = 'instituicao'
+    instituicao_url_kwarg = 'pk'
+    def get_object(self, queryset=None):
+        return self.get_instituicao()
 
 class InstituicaoMembrosListView(InstituicaoAdminRequiredMixin, ListView):
     model = UserProfile
     template_name = 'instituicao/membros_lista.html'
     context_object_name = 'membros'
     paginate_by = 20
+    permissao_requerida = 'usuario.view_userprofile'
     def get_queryset(self):
-        self.instituicao = get_object_or_404(Instituicao, pk=self.kwargs['pk'])
+        self.instituicao = self.get_instituicao()
         return UserProfile.objects.filter(instituicao=self.instituicao).select_related('user', 'cargo', 'patente').order_by('user__username')
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['instituicao'] = self.instituicao
+        if self.pode_atribuir():
+            context['atribuicao_form'] = AtribuicaoEmLoteForm(self.instituicao)
         return context
+    def pode_atribuir(self):
+        user = self.request.user
+        return (user.is_superuser or obter_autorizacao(user).is_admin_de(self.instituicao.pk)
+                or tem_permissao(user, AtribuirMembrosView.permissao_requerida, instituicao_id=self.instituicao.pk))
+
+def ler_dados(request):
+    """ Corpo da requisição: o JSON (se enviado como JSON) ou o POST. None se o JSON for inválido. """
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body)
+        except ValueError:
+            return None
+    return request.POST
+
+class AtribuirMembrosView(InstituicaoAdminRequiredMixin, View):
+    """
+    Atribui cargo/patente e adiciona/remove funções dos membros selecionados,
+    em uma transação e com um número de consultas que não depende de quantos
+    membros são alterados. Aceita formulário ou JSON; responde em JSON se o
+    cliente pedir (`Accept: application/json`).
+    """
+    permissao_requerida = 'usuario.change_userprofile'
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        instituicao = self.get_instituicao()
+        dados = ler_dados(request)
+        if dados is None:
+            return JsonResponse({'erros': {'__all__': ['JSON inválido.']}}, status=400)
+        responder_json = 'application/json' in request.headers.get('Accept', '')
+
+        form = AtribuicaoEmLoteForm(instituicao, dados)
+        if not form.is_valid():
+            if responder_json:
+                return JsonResponse({'erros': form.errors}, status=400)
+            messages.error(request, f"Erro na atribuição: {next(iter(form.errors.values()))[0]}")
+            return redirect('instituicao:lista_membros', instituicao_pk=instituicao.pk)
+
+        d = form.cleaned_data
+        resultado = atribuir_em_lote(
+            instituicao, d['membros'], cargo_id=d['cargo'], patente_id=d['patente'],
+            adicionar_funcoes=d['adicionar_funcoes'], remover_funcoes=d['remover_funcoes'],
+        )
+        if responder_json:
+            return JsonResponse({'membros': resultado.membros, 'funcoes_removidas': resultado.funcoes_removidas})
+        messages.success(request, f"{resultado.membros} membro(s) atualizado(s).")
+        return redirect('instituicao:lista_membros', instituicao_pk=instituicao.pk)
 
 @login_required
 def carregar_municipios(request):
-    estado_id = request.GET.get('estado_id')
-    if not estado_id: return JsonResponse([], safe=False)
-    municipios = Municipio.objects.filter(estado_id=estado_id).order_by('nome')
-    return JsonResponse(list(municipios.values('id', 'nome')), safe=False)
+    """
+    Retorna os municípios de um estado a partir do cache pré-serializado, com
+    ETag forte para que o navegador revalide com `If-None-Match` e receba 304.
+    Estados inexistentes recebem uma lista vazia, sem passar pelo cache.
+    """
+    try:
+        estado_id = int(request.GET.get('estado_id'))
+    except (TypeError, ValueError):
+        return JsonResponse([], safe=False)
+
+    resposta = obter_municipios_por_estado(estado_id)
+    if resposta is None:
+        return JsonResponse([], safe=False)
+    usar_gzip = 'gzip' in codificacoes_aceitas(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    etag = resposta.etag_gzip if usar_gzip else resposta.etag
+
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        http = HttpResponseNotModified()
+    else:
+        http = HttpResponse(resposta.corpo_gzip if usar_gzip else resposta.corpo, content_type='application/json')
+        if usar_gzip:
+            http['Content-Encoding'] = 'gzip'
+    http['ETag'] = etag
+    http['Cache-Control'] = 'private, no-cache'
+    http['Vary'] = 'Accept-Encoding, Cookie'
+    return http
+
+@login_required
+def buscar_municipios_ajax(request):
+    """ Typeahead de municípios: busca insensível a acentos no índice em memória. """
+    termo = request.GET.get('q', '').strip()
+    try:
+        limite = min(max(int(request.GET.get('limite', 10)), 1), 50)
+    except ValueError:
+        limite = 10
+    resultados = buscar_municipios(termo, limite=limite, uf=request.GET.get('uf'))
+    return JsonResponse([r._asdict() for r in resultados], safe=False)
 
 
 # --- PAINEL DE GERENCIAMENTO INSTITUCIONAL ---
@@ -144,11 +274,14 @@ class GerenciarInstituicaoView(InstituicaoAdminRequiredMixin, DetailView):
     model = Instituicao
     template_name = 'instituicao/gerenciar/painel.html'
     context_object_name = 'instituicao'
+    instituicao_url_kwarg = 'pk'
+    def get_object(self, queryset=None):
+        return self.get_instituicao()
 
 # --- CLASSE BASE PARA AS VIEWS DE GERENCIAMENTO DE HIERARQUIA---
 class BaseGerenciarView(InstituicaoAdminRequiredMixin):
     def dispatch(self, request, *args, **kwargs):
-        self.instituicao = get_object_or_404(Instituicao, pk=self.kwargs['instituicao_pk'])
+        self.instituicao = self.get_instituicao()
         return super().dispatch(request, *args, **kwargs)
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -156,43 +289,52 @@ class BaseGerenciarView(InstituicaoAdminRequiredMixin):
         return context
 
 # --- VIEW UNIFICADA PARA GERENCIAR HIERARQUIA (CRIAÇÃO IN-LINE E LISTAGEM) ---
-class GerenciarHierarquiaView(BaseGerenciarView, View):
+class GerenciarHierarquiaView(BaseGerenciarView, ContextMixin, View):
     template_name = 'instituicao/gerenciar/gerenciar_hierarquia.html'
+    formularios = {'cargo': CargoForm, 'patente': PatenteForm, 'funcao': FuncaoForm}
+
+    def dispatch(self, request, *args, **kwargs):
+        # `form_type` vira nome de permissão: só os valores conhecidos passam.
+        if request.method == 'POST' and request.POST.get('form_type') not in self.formularios:
+            return HttpResponseBadRequest("Ação inválida.")
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_permissao_requerida(self):
+        if self.request.method == 'POST':
+            return (f"usuario.add_{self.request.POST['form_type']}",)
+        return ('usuario.view_cargo', 'usuario.view_patente', 'usuario.view_funcao')
 
     def get_context_data(self, **kwargs):
         # A instituição é pega do 'dispatch' da classe base
         context = super().get_context_data(**kwargs)
+        hierarquia = obter_hierarquia(self.instituicao.pk)
         context.update({
-            'cargos': Cargo.objects.filter(instituicao=self.instituicao),
-            'patentes': Patente.objects.filter(instituicao=self.instituicao).order_by('ordem'),
-            'funcoes': Funcao.objects.filter(instituicao=self.instituicao),
+            'cargos': hierarquia.cargos,
+            'patentes': hierarquia.patentes,
+            'funcoes': hierarquia.funcoes,
             'cargo_form': CargoForm(),
             'patente_form': PatenteForm(),
             'funcao_form': FuncaoForm(),
+            'pode_ordenar': self.pode_ordenar(),
         })
         return context
 
+    def pode_ordenar(self):
+        user = self.request.user
+        return (user.is_superuser or obter_autorizacao(user).is_admin_de(self.instituicao.pk)
+                or tem_permissao(user, BaseOrdenarPatentesView.permissao_requerida, instituicao_id=self.instituicao.pk))
+
     def get(self, request, *args, **kwargs):
-        # Para a view funcionar, o 'instituicao_pk' é o 'pk' da URL principal
-        self.instituicao = get_object_or_404(Instituicao, pk=kwargs.get('instituicao_pk'))
         context = self.get_context_data(**kwargs)
         return render(request, self.template_name, context)
 
     def post(self, request, *args, **kwargs):
-        self.instituicao = get_object_or_404(Instituicao, pk=kwargs.get('instituicao_pk'))
-        form_type = request.POST.get('form_type')
-        form_map = {'cargo': CargoForm, 'patente': PatenteForm, 'funcao': FuncaoForm}
-        form_class = form_map.get(form_type)
-
-        if not form_class:
-            messages.error(request, "Ação inválida.")
-            return redirect('instituicao:gerenciar_instituicao', pk=self.instituicao.pk)
-
-        form = form_class(request.POST)
+        form_type = request.POST['form_type']
+        formulario = self.formularios[form_type]
+        # A instituição vem antes da validação, para as checagens que dependem dela (ex.: ordem da patente).
+        form = formulario(request.POST, instance=formulario._meta.model(instituicao=self.instituicao))
         if form.is_valid():
-            instance = form.save(commit=False)
-            instance.instituicao = self.instituicao
-            instance.save()
+            form.save()
             messages.success(request, f"{form.Meta.model._meta.verbose_name.title()} adicionado com sucesso!")
         else:
             context = self.get_context_data(instituicao_pk=self.instituicao.pk)
@@ -205,6 +347,8 @@ class GerenciarHierarquiaView(BaseGerenciarView, View):
 # --- VIEWS DE EDIÇÃO E EXCLUSÃO PARA HIERARQUIA ---
 class BaseHierarquiaUpdateView(BaseGerenciarView, SuccessMessageMixin, UpdateView):
     template_name = 'partials/generic_form.html'
+    def get_permissao_requerida(self):
+        return (f'usuario.change_{self.model._meta.model_name}',)
     def get_queryset(self):
         return self.model.objects.filter(instituicao=self.instituicao)
     def get_success_url(self):
@@ -231,10 +375,12 @@ class FuncaoUpdateView(BaseHierarquiaUpdateView):
 
 class BaseHierarquiaDeleteView(BaseGerenciarView, SuccessMessageMixin, DeleteView):
     template_name = 'partials/generic_confirm_delete.html'
+    def get_permissao_requerida(self):
+        return (f'usuario.delete_{self.model._meta.model_name}',)
     def get_queryset(self):
         return self.model.objects.filter(instituicao=self.instituicao)
     def get_success_url(self):
-        return reverse_lazy('instituicao:gerenciar_hierarquia', kwargs={'instituicao_pk': self.object.instituicao.pk})
+        return reverse_lazy('instituicao:gerenciar_hierarquia', kwargs={'instituicao_pk': self.instituicao.pk})
 
 class CargoDeleteView(BaseHierarquiaDeleteView):
     model = Cargo
@@ -248,6 +394,56 @@ class FuncaoDeleteView(BaseHierarquiaDeleteView):
     model = Funcao
     success_message = "Função excluída com sucesso!"
 
+# --- REORDENAÇÃO DAS PATENTES (arrastar e soltar) ---
+class BaseOrdenarPatentesView(BaseGerenciarView, View):
+    """ Respostas em JSON para o arrastar e soltar; redireciona se vier de um formulário. """
+    permissao_requerida = 'usuario.change_patente'
+    http_method_names = ['post']
+
+    def responder(self, request, dados=None, erro=None):
+        if 'application/json' in request.headers.get('Accept', ''):
+            if erro:
+                return JsonResponse({'erros': {'__all__': [erro]}}, status=400)
+            return JsonResponse(dados)
+        if erro:
+            messages.error(request, erro)
+        else:
+            messages.success(request, "Ordem das patentes atualizada.")
+        return redirect('instituicao:gerenciar_hierarquia', instituicao_pk=self.instituicao.pk)
+
+class MoverPatenteView(BaseOrdenarPatentesView):
+    """ Move uma patente para antes (`antes=<id>`) ou depois (`depois=<id>`) de outra; grava só a linha movida. """
+
+    def post(self, request, *args, **kwargs):
+        patente = get_object_or_404(Patente.objects.only('id', 'instituicao_id', 'ordem'), pk=kwargs['pk'], instituicao=self.instituicao)
+        dados = ler_dados(request)
+        if dados is None:
+            return self.responder(request, erro='JSON inválido.')
+        try:
+            antes, depois = (int(dados[c]) if dados.get(c) not in (None, '') else None for c in ('antes', 'depois'))
+            resultado = mover_patente(patente, antes=antes, depois=depois)
+        except (TypeError, ValueError):
+            return self.responder(request, erro='Identificador de patente inválido.')
+        except ValidationError as e:
+            return self.responder(request, erro=e.messages[0])
+        return self.responder(request, {'id': patente.pk, 'ordem': resultado.ordem, 'rebalanceada': resultado.rebalanceada})
+
+class OrdenarPatentesView(BaseOrdenarPatentesView):
+    """ Aplica a ordem completa (`ordem`: ids de todas as patentes, da menor para a maior) de uma vez. """
+
+    def post(self, request, *args, **kwargs):
+        dados = ler_dados(request)
+        if dados is None:
+            return self.responder(request, erro='JSON inválido.')
+        ids = dados.getlist('ordem') if hasattr(dados, 'getlist') else dados.get('ordem')
+        try:
+            alteradas = aplicar_ordem(self.instituicao.pk, [int(pk) for pk in ids or ()])
+        except (TypeError, ValueError):
+            return self.responder(request, erro='Identificador de patente inválido.')
+        except ValidationError as e:
+            return self.responder(request, erro=e.messages[0])
+        return self.responder(request, {'alteradas': alteradas})
+
 
 # --- Views de Tipo de Instituição (Global) ---
 class TipoInstituicaoView(SuperuserRequiredMixin, View):
@@ -270,6 +466,23 @@ class TipoInstituicaoView(SuperuserRequiredMixin, View):
             context = {'tipos': tipos, 'form': form}
             return render(request, self.template_name, context)
 
+class AplicarModeloHierarquiaView(SuperuserRequiredMixin, View):
+    """
+    Clona o modelo de hierarquia do tipo em todas as instituições do tipo, em
+    segundo plano. O progresso (instituições processadas, itens inseridos e
+    ignorados) fica em `utils:situacao_tarefa`.
+    """
+    http_method_names = ['post']
+
+    def post(self, request, pk):
+        tipo = get_object_or_404(TipoInstituicao, pk=pk)
+        tarefa_id = aplicar_modelo_em_segundo_plano(tipo, usuario=request.user)
+        situacao_url = reverse('utils:situacao_tarefa', args=[tarefa_id])
+        if 'application/json' in request.headers.get('Accept', ''):
+            return JsonResponse({'tarefa': tarefa_id, 'situacao_url': situacao_url}, status=202)
+        messages.info(request, f"Aplicando o modelo de hierarquia de {tipo.nome} às instituições do tipo em segundo plano.")
+        return redirect('instituicao:lista_tipos')
+
 class TipoInstituicaoUpdateView(SuperuserRequiredMixin, SuccessMessageMixin, UpdateView):
     model = TipoInstituicao
     form_class = TipoInstituicaoForm
@@ -1,7 +1,9 @@
 # painel/views.py
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from instituicao.models import Instituicao
+from instituicao.middleware import carregar_instituicao
+from instituicao.listagem import listar_instituicoes
+from usuario.autorizacao import obter_autorizacao
 
 def home(request):
     """
@@ -16,19 +18,18 @@ def dashboard(request):
     o template a partir do seu novo caminho correto.
     """
     if request.user.is_superuser:
-        # O Admin SI vê todas as instituições para poder gerenciá-las
-        instituicoes_vinculadas = Instituicao.objects.all()
+        # O Admin SI vê todas as instituições para poder gerenciá-las, com filtros e
+        # "Carregar mais" (`?formato=json`), paginadas por cursor.
+        listagem = listar_instituicoes(request)
+        if request.GET.get('formato') == 'json':
+            return listagem.resposta_json()
+        context = listagem.contexto()
+        context['instituicoes_vinculadas'] = context.pop('instituicoes')
     else:
         # Um usuário comum (futuramente) verá apenas as instituições às quais tem vínculo
-        try:
-            instituicoes_vinculadas = Instituicao.objects.filter(userprofile=request.user.userprofile)
-        except: # Captura o caso de não ter perfil ainda
-            instituicoes_vinculadas = []
-
-
-    context = {
-        'instituicoes_vinculadas': instituicoes_vinculadas
-    }
+        instituicao = carregar_instituicao(obter_autorizacao(request.user).instituicao_id)
+        # Usuário sem perfil ou sem vínculo: lista vazia
+        context = {'instituicoes_vinculadas': [instituicao] if instituicao else []}
     # --- CORREÇÃO AQUI ---
     # O caminho do template foi atualizado para o local correto.
     return render(request, 'painel/dashboard.html', context)
\ No newline at end of file
@@ -1,3 +1,28 @@
 from django.contrib import admin
+from .models import Cargo, Patente, Funcao
 
-# Register your models here.
+# O __str__ de Cargo, Patente e Função usa `instituicao.municipio`: as listagens já o
+# trazem na mesma consulta.
+
+@admin.register(Cargo)
+class CargoAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'instituicao')
+    list_filter = ('instituicao',)
+    search_fields = ('nome', 'instituicao__nome_gerado')
+    list_select_related = ('instituicao__municipio',)
+
+@admin.register(Patente)
+class PatenteAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'ordem', 'instituicao')
+    list_filter = ('instituicao',)
+    search_fields = ('nome', 'instituicao__nome_gerado')
+    list_select_related = ('instituicao__municipio',)
+
+@admin.register(Funcao)
+class FuncaoAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'instituicao')
+    list_filter = ('instituicao',)
+    search_fields = ('nome', 'instituicao__nome_gerado')
+    list_select_related = ('instituicao__municipio',)
+    # As permissões marcadas aqui são compiladas em bitsets por `usuario.permissoes`.
+    filter_horizontal = ('permissoes',)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UsuarioConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'usuario'
+
+    def ready(self):
+        # Registra os receivers de invalidação dos snapshots de autorização e de hierarquia e das permissões.
+        from . import autorizacao, hierarquia, permissoes  # noqa: F401
@@ -0,0 +1,64 @@
+# usuario/atribuicao.py
+"""
+Atribuição em lote de cargo, patente e funções aos membros de uma instituição.
+
+Tudo é feito por conjuntos, em uma transação: um UPDATE para cargo/patente, um
+DELETE na tabela intermediária de `funcoes` para as funções removidas e um
+INSERT em lote (ignorando vínculos já existentes) para as adicionadas. O número
+de consultas não depende de quantos membros são alterados. Nenhuma dessas
+operações envia sinais por perfil, então os snapshots de autorização dos
+usuários afetados são invalidados explicitamente.
+"""
+from dataclasses import dataclass
+
+from django.db import transaction
+
+from .autorizacao import invalidar_autorizacao
+from .models import UserProfile
+
+# Valor que, em cargo/patente, indica "remover" (None indica "manter").
+REMOVER = 0
+
+
+@dataclass
+class ResultadoAtribuicao:
+    membros: int = 0
+    funcoes_removidas: int = 0
+
+
+@transaction.atomic
+def atribuir_em_lote(instituicao, perfil_ids, cargo_id=None, patente_id=None, adicionar_funcoes=(), remover_funcoes=()):
+    """
+    Aplica as alterações aos perfis `perfil_ids` que pertencem à `instituicao`
+    (os demais são ignorados). `cargo_id`/`patente_id`: None mantém, `REMOVER`
+    limpa, outro valor atribui. Os ids de cargo, patente e funções devem ter
+    sido validados contra a instituição (ver `AtribuicaoEmLoteForm`).
+    """
+    membros = list(
+        UserProfile.objects.filter(instituicao=instituicao, pk__in=perfil_ids).values_list('id', 'user_id')
+    )
+    resultado = ResultadoAtribuicao(membros=len(membros))
+    if not membros:
+        return resultado
+    ids = [perfil_id for perfil_id, _ in membros]
+
+    alteracoes = {}
+    if cargo_id is not None:
+        alteracoes['cargo_id'] = cargo_id or None
+    if patente_id is not None:
+        alteracoes['patente_id'] = patente_id or None
+    if alteracoes:
+        UserProfile.objects.filter(pk__in=ids).update(**alteracoes)
+
+    Vinculo = UserProfile.funcoes.through
+    remover = set(remover_funcoes) - set(adicionar_funcoes)
+    if remover:
+        resultado.funcoes_removidas, _ = Vinculo.objects.filter(userprofile_id__in=ids, funcao_id__in=remover).delete()
+    if adicionar_funcoes:
+        Vinculo.objects.bulk_create(
+            [Vinculo(userprofile_id=perfil_id, funcao_id=funcao_id) for perfil_id in ids for funcao_id in set(adicionar_funcoes)],
+            ignore_conflicts=True,
+        )
+
+    invalidar_autorizacao(*(user_id for _, user_id in membros))
+    return resultado
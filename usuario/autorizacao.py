@@ -0,0 +1,139 @@
+# usuario/autorizacao.py
+"""
+Snapshot de autorização por usuário.
+
+Tudo o que os mixins, a sidebar e o lobby precisam saber sobre o vínculo de um
+usuário (instituição, se é admin, status, cargo/patente/funções e foto) é
+calculado uma única vez, em uma consulta, e guardado no cache do Django sob uma
+chave que inclui:
+    - a versão do usuário, incrementada quando o seu perfil ou as suas funções mudam;
+    - uma época global, incrementada quando uma instituição, cargo, patente ou
+      função é excluída (o banco anula/remove os vínculos sem enviar sinais ao perfil).
+Para um usuário com o snapshot "quente", a autorização não custa nenhuma consulta.
+"""
+from dataclasses import dataclass
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from instituicao.models import Instituicao
+from utils.cache import obter_versoes, incrementar_versao
+from utils.midia import url_miniatura
+from .models import UserProfile, Cargo, Patente, Funcao
+
+EPOCA_AUTORIZACAO = 'usuario:autorizacao:epoca'
+# Salvaguarda para caches locais por processo (ver CACHES em core/settings.py).
+AUTORIZACAO_TIMEOUT = 300
+
+
+def _chave_versao(user_id):
+    return f'usuario:autorizacao:versao:{user_id}'
+
+
+@dataclass(frozen=True)
+class Autorizacao:
+    user_id: int = None
+    perfil_id: int = None
+    instituicao_id: int = None
+    is_admin_instituicao: bool = False
+    status_vinculo: str = UserProfile.StatusVinculo.SEM_VINCULO
+    cargo_id: int = None
+    patente_id: int = None
+    funcao_ids: tuple = ()
+    foto: str = ''
+
+    @property
+    def tem_perfil(self):
+        return self.perfil_id is not None
+
+    @property
+    def foto_url(self):
+        # Miniatura 'p' (avatares de 40px); o original enquanto ela não existir.
+        return url_miniatura(self.foto, 'p')
+
+    def is_admin_de(self, instituicao_id):
+        """ True se o usuário é administrador da instituição informada. """
+        return self.is_admin_instituicao and self.instituicao_id is not None and self.instituicao_id == instituicao_id
+
+
+AUTORIZACAO_VAZIA = Autorizacao()
+
+
+def _calcular_autorizacao(user_id):
+    linhas = list(
+        UserProfile.objects.filter(user_id=user_id).values_list(
+            'id', 'instituicao_id', 'is_admin_instituicao', 'status_vinculo',
+            'cargo_id', 'patente_id', 'foto', 'funcoes',
+        )
+    )
+    if not linhas:
+        return Autorizacao(user_id=user_id)
+    perfil_id, instituicao_id, is_admin, status, cargo_id, patente_id, foto, _ = linhas[0]
+    return Autorizacao(
+        user_id=user_id,
+        perfil_id=perfil_id,
+        instituicao_id=instituicao_id,
+        is_admin_instituicao=is_admin,
+        status_vinculo=status,
+        cargo_id=cargo_id,
+        patente_id=patente_id,
+        funcao_ids=tuple(sorted(linha[-1] for linha in linhas if linha[-1] is not None)),
+        foto=foto or '',
+    )
+
+
+def obter_autorizacao(user):
+    """ Retorna o snapshot de autorização do usuário, memorizado no próprio objeto. """
+    if not getattr(user, 'is_authenticated', False):
+        return AUTORIZACAO_VAZIA
+    autorizacao = getattr(user, '_autorizacao', None)
+    if autorizacao is None:
+        epoca, versao = obter_versoes(EPOCA_AUTORIZACAO, _chave_versao(user.pk))
+        chave = f'usuario:autorizacao:{epoca}:{user.pk}:{versao}'
+        autorizacao = cache.get(chave)
+        if autorizacao is None:
+            autorizacao = _calcular_autorizacao(user.pk)
+            cache.set(chave, autorizacao, AUTORIZACAO_TIMEOUT)
+        user._autorizacao = autorizacao
+    return autorizacao
+
+
+def invalidar_autorizacao(*user_ids):
+    """ Descarta o snapshot dos usuários informados (após a transação corrente). """
+    def invalidar():
+        for user_id in user_ids:
+            incrementar_versao(_chave_versao(user_id))
+    transaction.on_commit(invalidar)
+
+
+def invalidar_todas_autorizacoes():
+    transaction.on_commit(lambda: incrementar_versao(EPOCA_AUTORIZACAO))
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def perfil_alterado(sender, instance, **kwargs):
+    invalidar_autorizacao(instance.user_id)
+
+
+@receiver(m2m_changed, sender=UserProfile.funcoes.through)
+def funcoes_alteradas(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidar_autorizacao(instance.user_id)
+    elif pk_set:
+        invalidar_autorizacao(*UserProfile.objects.filter(pk__in=pk_set).values_list('user_id', flat=True))
+    else:
+        # `funcao.userprofile_set.clear()`: os perfis afetados já não são conhecidos.
+        invalidar_todas_autorizacoes()
+
+
+@receiver(post_delete, sender=Instituicao)
+@receiver(post_delete, sender=Cargo)
+@receiver(post_delete, sender=Patente)
+@receiver(post_delete, sender=Funcao)
+def vinculo_excluido(sender, **kwargs):
+    invalidar_todas_autorizacoes()
@@ -0,0 +1,119 @@
+# usuario/exclusao.py
+"""
+Exclusão de instituições e usuários em segundo plano, em lotes.
+
+O coletor do Django carrega todos os dependentes em memória e grava tudo em
+uma única transação, presa à requisição. Aqui a exclusão vira uma tarefa
+(`utils.tarefas`) que remove ou anula os dependentes em lotes de
+`LOTE_EXCLUSAO` linhas, cada lote em uma transação curta, e relata o
+progresso. Só depois o registro principal é excluído, quando o coletor já não
+encontra quase nada.
+
+A instituição é marcada com `excluindo` antes de a tarefa começar: sai na hora
+das listagens (`Instituicao.objects.ativas()`) e das páginas institucionais. O
+usuário é desativado, o que impede novos logins.
+
+Se o processo cair no meio da tarefa, a marca fica no banco e a exclusão pode
+ser retomada: cada etapa só trata o que ainda resta, então executar de novo é
+seguro. O comando `retomar_exclusoes` (ou uma tarefa de inicialização) refaz
+todas as pendentes; no admin, a ação "Retomar a exclusão" reagenda as
+selecionadas.
+"""
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from instituicao.models import Instituicao
+from utils.tarefas import iniciar_tarefa
+from .autorizacao import invalidar_autorizacao
+from .models import UserProfile, Cargo, Patente, Funcao
+
+LOTE_EXCLUSAO = 500
+
+FuncoesDoPerfil = UserProfile.funcoes.through
+
+
+def _em_lotes(queryset, acao, lote):
+    """
+    Aplica `acao` a `queryset` em lotes de `lote` linhas, cada um na sua
+    transação; a ação precisa tirar as linhas do queryset (excluir ou anular
+    o filtro). Gera o tamanho de cada lote.
+    """
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:lote])
+            if not ids:
+                return
+            acao(queryset.model.objects.filter(pk__in=ids))
+        yield len(ids)
+
+
+def _excluir(queryset):
+    queryset.delete()
+
+
+def _desvincular_perfis(queryset):
+    user_ids = list(queryset.values_list('user_id', flat=True))
+    queryset.update(instituicao=None, cargo=None, patente=None)
+    # `update()` não envia `post_save`.
+    invalidar_autorizacao(*user_ids)
+
+
+def _executar_etapas(etapas, tarefa, lote):
+    """ Executa as etapas (nome, queryset, ação) em lotes; devolve as linhas tratadas por etapa. """
+    total = sum(queryset.count() for _, queryset, _ in etapas)
+    feito = 0
+    resultado = {nome: 0 for nome, _, _ in etapas}
+    for nome, queryset, acao in etapas:
+        for quantidade in _em_lotes(queryset, acao, lote):
+            feito += quantidade
+            resultado[nome] += quantidade
+            if tarefa is not None:
+                tarefa.relatar(feito, total, **resultado)
+    return resultado
+
+
+def excluir_instituicao(instituicao_id, tarefa=None, lote=LOTE_EXCLUSAO):
+    """ Desvincula os membros, exclui a hierarquia em lotes e, por fim, a instituição. """
+    etapas = [
+        ('membros_desvinculados', UserProfile.objects.filter(instituicao_id=instituicao_id), _desvincular_perfis),
+        ('funcoes_atribuidas', FuncoesDoPerfil.objects.filter(funcao__instituicao_id=instituicao_id), _excluir),
+        ('funcoes', Funcao.objects.filter(instituicao_id=instituicao_id), _excluir),
+        ('cargos', Cargo.objects.filter(instituicao_id=instituicao_id), _excluir),
+        ('patentes', Patente.objects.filter(instituicao_id=instituicao_id), _excluir),
+    ]
+    resultado = _executar_etapas(etapas, tarefa, lote)
+    with transaction.atomic():
+        Instituicao.objects.filter(pk=instituicao_id).delete()
+    return resultado
+
+
+def exclusoes_pendentes():
+    """ Instituições marcadas com `excluindo` cuja exclusão não terminou. """
+    return Instituicao.objects.filter(excluindo=True).order_by('pk')
+
+
+def excluir_usuario(user_id, tarefa=None, lote=LOTE_EXCLUSAO):
+    """ Exclui em lotes o histórico do admin e as funções atribuídas e, por fim, o usuário e o perfil. """
+    etapas = [
+        ('historico_admin', LogEntry.objects.filter(user_id=user_id), _excluir),
+        ('funcoes_atribuidas', FuncoesDoPerfil.objects.filter(userprofile__user_id=user_id), _excluir),
+    ]
+    resultado = _executar_etapas(etapas, tarefa, lote)
+    with transaction.atomic():
+        User.objects.filter(pk=user_id).delete()
+    return resultado
+
+
+def excluir_instituicao_em_segundo_plano(instituicao, usuario=None):
+    """ Marca a instituição como em exclusão e agenda `excluir_instituicao`; devolve o id da tarefa. """
+    instituicao.excluindo = True
+    instituicao.save(update_fields=['excluindo'])
+    return iniciar_tarefa(f'Exclusão: {instituicao.nome_gerado}', excluir_instituicao, instituicao.pk, usuario=usuario)
+
+
+def excluir_usuario_em_segundo_plano(user, usuario=None):
+    """ Desativa o usuário e agenda `excluir_usuario`; devolve o id da tarefa. """
+    user.is_active = False
+    user.save(update_fields=['is_active'])
+    return iniciar_tarefa(f'Exclusão: {user.username}', excluir_usuario, user.pk, usuario=usuario)
@@ -4,6 +4,9 @@ from .models import Cargo, Patente, Funcao
 from .models import UserProfile, Instituicao # Necessário para AdminUserCreationForm
 from django.contrib.auth.models import User
 from django.db import transaction
+from django.db.models import Q
+from .atribuicao import REMOVER
+from .hierarquia import obter_hierarquia, aplicar_em_formulario
 
 class CargoForm(forms.ModelForm):
     """ Formulário para criar/editar um Cargo dentro de uma instituição. """
@@ -21,6 +24,25 @@ class PatenteForm(forms.ModelForm):
             'nome': forms.TextInput(attrs={'class': 'form-control'}),
             'ordem': forms.NumberInput(attrs={'class': 'form-control'}),
         }
+        help_texts = {'ordem': 'Deixe em branco para colocar no fim. A ordem também pode ser ajustada arrastando as patentes.'}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['ordem'].required = False
+        if self.instance.pk is None:
+            self.instance.ordem = None  # no fim, se não for informada (ver Patente.save)
+
+    def clean_ordem(self):
+        # Duas patentes na mesma posição tornariam ambíguo o "antes/depois de" da reordenação.
+        ordem = self.cleaned_data.get('ordem')
+        if ordem is not None and self.instance.instituicao_id and (self.instance.pk is None or 'ordem' in self.changed_data):
+            ocupada = (
+                Patente.objects.filter(instituicao_id=self.instance.instituicao_id, ordem=ordem)
+                .exclude(pk=self.instance.pk).values_list('nome', flat=True).first()
+            )
+            if ocupada is not None:
+                raise forms.ValidationError(f"A ordem {ordem} já é usada pela patente '{ocupada}'.")
+        return ordem
 
 class FuncaoForm(forms.ModelForm):
     """ Formulário para criar/editar uma Função dentro de uma instituição. """
@@ -39,21 +61,16 @@ class AdminUserCreationForm(forms.ModelForm):
         fields = ['instituicao', 'cargo', 'patente', 'funcoes', 'cpf', 'celular', 'foto', 'is_admin_instituicao']
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        instituicao_id = None
         if 'instituicao' in self.data:
             try:
                 instituicao_id = int(self.data.get('instituicao'))
-                self.fields['cargo'].queryset = Cargo.objects.filter(instituicao_id=instituicao_id).order_by('nome')
-                self.fields['patente'].queryset = Patente.objects.filter(instituicao_id=instituicao_id).order_by('ordem')
-                self.fields['funcoes'].queryset = Funcao.objects.filter(instituicao_id=instituicao_id).order_by('nome')
             except (ValueError, TypeError): pass
-        elif self.instance.pk and self.instance.instituicao:
-             self.fields['cargo'].queryset = self.instance.instituicao.cargos.order_by('nome')
-             self.fields['patente'].queryset = self.instance.instituicao.patentes.order_by('ordem')
-             self.fields['funcoes'].queryset = self.instance.instituicao.funcoes.order_by('nome')
-        else:
-             self.fields['cargo'].queryset = Cargo.objects.none()
-             self.fields['patente'].queryset = Patente.objects.none()
-             self.fields['funcoes'].queryset = Funcao.objects.none()
+        elif self.instance.pk:
+            instituicao_id = self.instance.instituicao_id
+        # Opções vindas do snapshot da hierarquia: nenhuma consulta por renderização.
+        aplicar_em_formulario(self, instituicao_id)
+        self.fields['instituicao'].queryset = Instituicao.objects.ativas().only('id', 'nome_gerado')
 
 class UserProfileEditForm(forms.ModelForm):
     first_name = forms.CharField(label='Nome', required=False, widget=forms.TextInput(attrs={'class': 'form-control'}))
@@ -68,7 +85,106 @@ class UserProfileEditForm(forms.ModelForm):
             self.fields['first_name'].initial = self.instance.user.first_name
             self.fields['last_name'].initial = self.instance.user.last_name
             self.fields['email'].initial = self.instance.user.email
-        if self.instance.pk and self.instance.instituicao:
-             self.fields['cargo'].queryset = self.instance.instituicao.cargos.order_by('nome')
-             self.fields['patente'].queryset = self.instance.instituicao.patentes.order_by('ordem')
-             self.fields['funcoes'].queryset = self.instance.instituicao.funcoes.order_by('nome')
\ No newline at end of file
+        instituicao_id = self.instance.instituicao_id
+        if 'instituicao' in self.data:
+            try:
+                instituicao_id = int(self.data.get('instituicao'))
+            except (ValueError, TypeError): pass
+        aplicar_em_formulario(self, instituicao_id)
+        self.fields['instituicao'].queryset = Instituicao.objects.ativas().only('id', 'nome_gerado')
+
+# --- Filtros do diretório de usuários ---
+
+class FiltroUsuariosForm(forms.Form):
+    """ Filtros do diretório de usuários (`user_list`), todos opcionais. """
+    q = forms.CharField(label='Buscar', required=False, max_length=150,
+                        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Usuário, nome ou e-mail'}))
+    instituicao = forms.ModelChoiceField(label='Instituição', required=False,
+                                         queryset=Instituicao.objects.ativas().only('id', 'nome_gerado').order_by('nome_gerado'),
+                                         widget=forms.Select(attrs={'class': 'form-select'}))
+    status = forms.ChoiceField(label='Status', required=False,
+                               choices=[('', 'Todos')] + list(UserProfile.StatusVinculo.choices),
+                               widget=forms.Select(attrs={'class': 'form-select'}))
+    patente = forms.ModelChoiceField(label='Patente', required=False, queryset=Patente.objects.none(),
+                                     widget=forms.Select(attrs={'class': 'form-select'}))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # As patentes dependem da instituição escolhida.
+        try:
+            instituicao_id = int(self.data.get('instituicao'))
+        except (TypeError, ValueError):
+            instituicao_id = None
+        if instituicao_id:
+            aplicar_em_formulario(self, instituicao_id, campos=('patente',))
+
+    def filtrar(self, queryset):
+        """ Aplica os filtros válidos ao queryset de `UserProfile`. """
+        dados = self.cleaned_data
+        if dados.get('instituicao'):
+            queryset = queryset.filter(instituicao=dados['instituicao'])
+        if dados.get('status'):
+            queryset = queryset.filter(status_vinculo=dados['status'])
+        if dados.get('patente'):
+            queryset = queryset.filter(patente=dados['patente'])
+        termo = dados.get('q', '').strip()
+        if termo:
+            # Busca por prefixo: atendida pelos índices NOCASE de auth_user (migração 0003).
+            queryset = queryset.filter(
+                Q(user__username__istartswith=termo)
+                | Q(user__first_name__istartswith=termo)
+                | Q(user__last_name__istartswith=termo)
+                | Q(user__email__istartswith=termo)
+            )
+        return queryset
+
+# --- Importação de usuários em lote (Admin SI) ---
+
+class ImportacaoUsuariosForm(forms.Form):
+    instituicao = forms.ModelChoiceField(label='Instituição de destino',
+                                         queryset=Instituicao.objects.ativas().only('id', 'nome_gerado').order_by('nome_gerado'),
+                                         widget=forms.Select(attrs={'class': 'form-select'}))
+    arquivo = forms.FileField(label='Arquivo CSV', widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'}))
+    delimitador = forms.ChoiceField(label='Separador', choices=[(',', 'Vírgula (,)'), (';', 'Ponto e vírgula (;)')],
+                                    widget=forms.Select(attrs={'class': 'form-select'}))
+
+# --- Atribuição em lote de cargo, patente e funções ---
+
+class AtribuicaoEmLoteForm(forms.Form):
+    """
+    Alterações aplicadas de uma vez aos membros selecionados. As opções vêm do
+    snapshot da hierarquia da instituição e são validadas em memória.
+    """
+    membros = forms.Field(widget=forms.MultipleHiddenInput, error_messages={'required': 'Selecione ao menos um membro.'})
+    cargo = forms.TypedChoiceField(label='Cargo', coerce=int, required=False, empty_value=None,
+                                   widget=forms.Select(attrs={'class': 'form-select'}))
+    patente = forms.TypedChoiceField(label='Patente', coerce=int, required=False, empty_value=None,
+                                     widget=forms.Select(attrs={'class': 'form-select'}))
+    adicionar_funcoes = forms.TypedMultipleChoiceField(label='Adicionar funções', coerce=int, required=False,
+                                                       widget=forms.SelectMultiple(attrs={'class': 'form-select'}))
+    remover_funcoes = forms.TypedMultipleChoiceField(label='Remover funções', coerce=int, required=False,
+                                                     widget=forms.SelectMultiple(attrs={'class': 'form-select'}))
+
+    def __init__(self, instituicao, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        hierarquia = obter_hierarquia(instituicao.pk)
+        cargos = hierarquia.escolhas('cargo')
+        patentes = hierarquia.escolhas('patente')
+        funcoes = hierarquia.escolhas('funcao')
+        self.fields['cargo'].choices = [('', '— manter —'), (REMOVER, '— remover cargo —')] + cargos
+        self.fields['patente'].choices = [('', '— manter —'), (REMOVER, '— remover patente —')] + patentes
+        self.fields['adicionar_funcoes'].choices = funcoes
+        self.fields['remover_funcoes'].choices = funcoes
+
+    def clean_membros(self):
+        # Os membros são restritos à instituição na própria atribuição.
+        try:
+            return [int(pk) for pk in self.cleaned_data['membros']]
+        except (TypeError, ValueError):
+            raise forms.ValidationError('Seleção de membros inválida.')
+
+    def clean(self):
+        dados = super().clean()
+        if not any(dados.get(campo) not in (None, []) for campo in ('cargo', 'patente', 'adicionar_funcoes', 'remover_funcoes')):
+            raise forms.ValidationError('Escolha ao menos uma alteração para aplicar.')
+        return dados
@@ -0,0 +1,127 @@
+# usuario/hierarquia.py
+"""
+Snapshot da hierarquia (cargos, patentes e funções) de cada instituição.
+
+Formulários, views e o admin precisam das mesmas listas de cargos, patentes e
+funções da instituição a cada renderização. O snapshot é imutável: ids,
+nomes, ordem e os rótulos já formatados ("Nome (Município)", como no
+`__str__` dos modelos). Ele é lido em uma única consulta e guardado no cache
+sob uma versão por instituição, incrementada a cada criação, alteração ou
+exclusão de um cargo, patente ou função. A época de instituições
+(`instituicao.cache`) também entra na chave, pois o rótulo usa o nome do município.
+Com um cache local por processo, a versão só muda no processo que fez a
+alteração; nos demais, o snapshot expira em `HIERARQUIA_TIMEOUT`.
+"""
+from collections import namedtuple
+from dataclasses import dataclass
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Value, CharField, IntegerField
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from instituicao.cache import EPOCA_INSTITUICOES
+from utils.cache import obter_versoes, incrementar_versao
+from .models import Cargo, Patente, Funcao
+
+# Salvaguarda para caches locais por processo (ver CACHES em core/settings.py).
+HIERARQUIA_TIMEOUT = 300
+
+ItemHierarquia = namedtuple('ItemHierarquia', ['pk', 'nome', 'ordem', 'rotulo'])
+
+
+def _chave_versao(instituicao_id):
+    return f'usuario:hierarquia:versao:{instituicao_id}'
+
+
+@dataclass(frozen=True)
+class Hierarquia:
+    instituicao_id: int
+    cargos: tuple = ()
+    patentes: tuple = ()
+    funcoes: tuple = ()
+
+    def itens(self, categoria):
+        """ `categoria`: 'cargo', 'patente' ou 'funcao' (como em `form_type`). """
+        return {'cargo': self.cargos, 'patente': self.patentes, 'funcao': self.funcoes}[categoria]
+
+    def escolhas(self, categoria, rotulo=False):
+        """ [(pk, nome)] (ou com o rótulo completo) para widgets de seleção. """
+        return [(item.pk, item.rotulo if rotulo else item.nome) for item in self.itens(categoria)]
+
+
+def _carregar(instituicao_id):
+    def consulta(modelo, categoria, ordem):
+        return (
+            modelo.objects.filter(instituicao_id=instituicao_id).order_by()
+            .annotate(categoria=Value(categoria, output_field=CharField()), posicao=ordem,
+                      municipio=F('instituicao__municipio__nome'))
+            .values_list('categoria', 'id', 'nome', 'posicao', 'municipio')
+        )
+    linhas = consulta(Cargo, 'cargo', Value(0, output_field=IntegerField())).union(
+        consulta(Patente, 'patente', F('ordem')),
+        consulta(Funcao, 'funcao', Value(0, output_field=IntegerField())),
+        all=True,
+    )
+    grupos = {'cargo': [], 'patente': [], 'funcao': []}
+    for categoria, pk, nome, ordem, municipio in linhas:
+        grupos[categoria].append(ItemHierarquia(pk, nome, ordem, f'{nome} ({municipio})'))
+    # Mesma ordem do Meta.ordering de cada modelo.
+    return Hierarquia(
+        instituicao_id=instituicao_id,
+        cargos=tuple(sorted(grupos['cargo'], key=lambda i: i.nome)),
+        patentes=tuple(sorted(grupos['patente'], key=lambda i: (i.ordem, i.nome))),
+        funcoes=tuple(sorted(grupos['funcao'], key=lambda i: i.nome)),
+    )
+
+
+def obter_hierarquia(instituicao_id):
+    """ Snapshot da hierarquia da instituição (vazio se `instituicao_id` for None). """
+    if not instituicao_id:
+        return Hierarquia(instituicao_id=None)
+    epoca, versao = obter_versoes(EPOCA_INSTITUICOES, _chave_versao(instituicao_id))
+    chave = f'usuario:hierarquia:{epoca}:{instituicao_id}:{versao}'
+    hierarquia = cache.get(chave)
+    if hierarquia is None:
+        hierarquia = _carregar(instituicao_id)
+        cache.set(chave, hierarquia, HIERARQUIA_TIMEOUT)
+    return hierarquia
+
+
+def aplicar_em_formulario(form, instituicao_id, campos=('cargo', 'patente', 'funcoes')):
+    """
+    Restringe os campos de modelo `cargo`, `patente` e `funcoes` do formulário
+    à instituição e preenche as opções a partir do snapshot. A renderização não
+    faz consultas; a validação continua usando o queryset filtrado.
+    """
+    hierarquia = obter_hierarquia(instituicao_id)
+    modelos = {'cargo': (Cargo, 'cargo'), 'patente': (Patente, 'patente'), 'funcoes': (Funcao, 'funcao')}
+    for campo in campos:
+        field = form.fields.get(campo)
+        if field is None:
+            continue
+        modelo, categoria = modelos[campo]
+        field.queryset = modelo.objects.filter(instituicao_id=instituicao_id) if instituicao_id else modelo.objects.none()
+        escolhas = hierarquia.escolhas(categoria)
+        if getattr(field, 'empty_label', None) is not None:
+            escolhas = [('', field.empty_label)] + escolhas
+        field.choices = escolhas
+
+
+def invalidar_hierarquia(*instituicao_ids):
+    """ Descarta o snapshot das instituições (após a transação corrente). """
+    def invalidar():
+        for instituicao_id in instituicao_ids:
+            incrementar_versao(_chave_versao(instituicao_id))
+    transaction.on_commit(invalidar)
+
+
+@receiver(post_save, sender=Cargo)
+@receiver(post_delete, sender=Cargo)
+@receiver(post_save, sender=Patente)
+@receiver(post_delete, sender=Patente)
+@receiver(post_save, sender=Funcao)
+@receiver(post_delete, sender=Funcao)
+def hierarquia_alterada(sender, instance, **kwargs):
+    invalidar_hierarquia(instance.instituicao_id)
@@ -0,0 +1,243 @@
+# usuario/importacao.py
+"""
+Importação de usuários em lote a partir de um CSV.
+
+O arquivo é lido em fluxo, em lotes. Cada linha é validada em memória contra
+os cargos, patentes e funções da instituição de destino (lidos do snapshot da
+hierarquia, `usuario.hierarquia`). As senhas são criptografadas em um pool de
+processos iniciados com `spawn` (`usuario.senhas`) enquanto o lote anterior é
+gravado; lotes com menos de `LIMITE_EM_PROCESSO` senhas são criptografados
+ali mesmo. `User`, `UserProfile` e as linhas de
+`funcoes` são inseridos com `bulk_create`, sem disparar o `post_save` por
+linha. Linhas inválidas são relatadas individualmente e não interrompem o
+lote; um CSV malformado interrompe a leitura com `ValueError`, depois de
+gravar as linhas anteriores.
+
+Colunas (cabeçalho obrigatório; só `username` é obrigatória):
+    username, senha, nome, sobrenome, email, cpf, celular, cargo, patente, funcoes, admin
+`funcoes` aceita vários nomes separados por ';'. Sem `senha`, a conta é criada
+com senha inutilizável (o agente define a sua pela recuperação de senha).
+"""
+import csv
+import os
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from .hierarquia import obter_hierarquia
+from .models import UserProfile
+from .senhas import criptografar, obter_pool
+
+COLUNAS = ('username', 'senha', 'nome', 'sobrenome', 'email', 'cpf', 'celular', 'cargo', 'patente', 'funcoes', 'admin')
+SEPARADOR_FUNCOES = ';'
+VERDADEIROS = {'1', 's', 'sim', 'x', 'true', 'verdadeiro'}
+# Abaixo disso, criptografar no próprio processo sai mais barato que despachar ao pool.
+LIMITE_EM_PROCESSO = 8
+
+
+@dataclass
+class ErroLinha:
+    linha: int
+    username: str
+    mensagem: str
+
+    def __str__(self):
+        return f'linha {self.linha} ({self.username or "sem username"}): {self.mensagem}'
+
+
+@dataclass
+class ResultadoImportacao:
+    criados: int = 0
+    erros: list = field(default_factory=list)
+
+    @property
+    def lidos(self):
+        return self.criados + len(self.erros)
+
+
+@dataclass
+class _Agente:
+    linha: int
+    user: User
+    perfil: UserProfile
+    senha: str
+    funcao_ids: list
+
+
+def _normalizar(nome):
+    return ' '.join(nome.split()).casefold()
+
+
+class ImportadorUsuarios:
+
+    def __init__(self, instituicao, workers=None, batch_size=500, status=UserProfile.StatusVinculo.ATIVO):
+        self.instituicao = instituicao
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.status = status
+        hierarquia = obter_hierarquia(instituicao.pk)
+        self.cargos = {_normalizar(item.nome): item.pk for item in hierarquia.cargos}
+        self.patentes = {_normalizar(item.nome): item.pk for item in hierarquia.patentes}
+        self.funcoes = {_normalizar(item.nome): item.pk for item in hierarquia.funcoes}
+        self._vistos = set()
+
+    # --- leitura e validação ---
+
+    def importar_arquivo(self, arquivo, delimitador=','):
+        """ Importa de um arquivo de texto aberto (ou qualquer iterável de linhas CSV). """
+        leitor = csv.DictReader(arquivo, delimiter=delimitador)
+        try:
+            colunas = leitor.fieldnames or ()
+        except csv.Error as e:
+            raise ValueError(f'CSV malformado no cabeçalho: {e}.') from e
+        if 'username' not in {(coluna or '').strip().lower() for coluna in colunas}:
+            raise ValueError(f"Cabeçalho do CSV sem a coluna 'username'. Colunas aceitas: {', '.join(COLUNAS)}.")
+        # A linha 1 é o cabeçalho.
+        return self.importar(self._ler(leitor))
+
+    @staticmethod
+    def _ler(leitor):
+        numero = 1
+        try:
+            for numero, dados in enumerate(leitor, start=2):
+                yield numero, dados
+        except csv.Error as e:
+            raise ValueError(f'CSV malformado na linha {numero + 1}: {e}.') from e
+
+    def importar(self, linhas):
+        """ `linhas`: iterável de (número da linha, dict da linha). """
+        resultado = ResultadoImportacao()
+        pendente = None
+        try:
+            for lote in self._lotes(linhas, resultado):
+                futuros = self._criptografar_lote(lote)
+                if pendente is not None:
+                    self._gravar(*pendente, resultado)
+                pendente = (lote, futuros)
+        except ValueError as e:
+            if pendente is not None:
+                self._gravar(*pendente, resultado)
+            raise ValueError(f'{e} {resultado.criados} usuário(s) das linhas anteriores foram importados.') from e
+        if pendente is not None:
+            self._gravar(*pendente, resultado)
+        return resultado
+
+    def _lotes(self, linhas, resultado):
+        lote = []
+        try:
+            for numero, dados in linhas:
+                lote.append((numero, {k.strip().lower(): (v or '').strip() for k, v in dados.items() if k}))
+                if len(lote) >= self.batch_size:
+                    yield self._validar_lote(lote, resultado)
+                    lote = []
+        except ValueError:
+            # Arquivo malformado: as linhas já lidas ainda são gravadas.
+            if lote:
+                yield self._validar_lote(lote, resultado)
+            raise
+        if lote:
+            yield self._validar_lote(lote, resultado)
+
+    def _validar_lote(self, lote, resultado):
+        existentes = set(User.objects.filter(username__in=[d.get('username', '') for _, d in lote]).values_list('username', flat=True))
+        agentes = []
+        for numero, dados in lote:
+            username = dados.get('username', '')
+            try:
+                agentes.append(self._validar(numero, dados, existentes))
+            except ValidationError as e:
+                resultado.erros.append(ErroLinha(numero, username, '; '.join(e.messages)))
+        return agentes
+
+    def _validar(self, numero, dados, existentes):
+        username = dados.get('username', '')
+        if not username:
+            raise ValidationError('username vazio.')
+        User.username_validator(username)
+        if len(username) > 150:
+            raise ValidationError('username com mais de 150 caracteres.')
+        if username in self._vistos:
+            raise ValidationError('username repetido no arquivo.')
+        if username in existentes:
+            raise ValidationError('username já cadastrado.')
+
+        email = dados.get('email', '')
+        if email:
+            validate_email(email)
+        for coluna, limite in (('cpf', 14), ('celular', 15), ('nome', 150), ('sobrenome', 150)):
+            if len(dados.get(coluna, '')) > limite:
+                raise ValidationError(f'{coluna} com mais de {limite} caracteres.')
+
+        cargo_id = self._buscar(self.cargos, dados.get('cargo'), 'Cargo')
+        patente_id = self._buscar(self.patentes, dados.get('patente'), 'Patente')
+        funcao_ids = [
+            self._buscar(self.funcoes, nome, 'Função')
+            for nome in dados.get('funcoes', '').split(SEPARADOR_FUNCOES) if nome.strip()
+        ]
+
+        self._vistos.add(username)
+        user = User(username=username, email=email, first_name=dados.get('nome', ''), last_name=dados.get('sobrenome', ''))
+        perfil = UserProfile(
+            instituicao=self.instituicao, cargo_id=cargo_id, patente_id=patente_id,
+            status_vinculo=self.status,
+            is_admin_instituicao=dados.get('admin', '').casefold() in VERDADEIROS,
+            cpf=dados.get('cpf') or None, celular=dados.get('celular') or None,
+        )
+        return _Agente(numero, user, perfil, dados.get('senha', ''), list(dict.fromkeys(funcao_ids)))
+
+    def _buscar(self, indice, nome, rotulo):
+        if not nome:
+            return None
+        pk = indice.get(_normalizar(nome))
+        if pk is None:
+            raise ValidationError(f"{rotulo} '{nome}' não existe em {self.instituicao}.")
+        return pk
+
+    # --- senhas e gravação ---
+
+    def _criptografar_lote(self, agentes):
+        senhas = [agente.senha for agente in agentes]
+        if sum(1 for senha in senhas if senha) < LIMITE_EM_PROCESSO:
+            futuro = Future()
+            futuro.set_result(criptografar(senhas))
+            return [futuro]
+        pool = obter_pool(self.workers)
+        tamanho = max(1, -(-len(senhas) // self.workers))
+        return [pool.submit(criptografar, senhas[i:i + tamanho]) for i in range(0, len(senhas), tamanho)]
+
+    def _gravar(self, agentes, futuros, resultado):
+        hashes = [h for futuro in futuros for h in futuro.result()]
+        for agente, senha in zip(agentes, hashes):
+            agente.user.password = senha
+        if not agentes:
+            return
+        try:
+            with transaction.atomic():
+                self._inserir(agentes)
+            resultado.criados += len(agentes)
+        except IntegrityError:
+            # Conflito com um cadastro concorrente: refaz linha a linha para isolar o erro.
+            for agente in agentes:
+                agente.user.pk = agente.perfil.pk = None
+                try:
+                    with transaction.atomic():
+                        self._inserir([agente])
+                    resultado.criados += 1
+                except IntegrityError as e:
+                    resultado.erros.append(ErroLinha(agente.linha, agente.user.username, f'erro ao gravar: {e}'))
+
+    def _inserir(self, agentes):
+        # `bulk_create` não envia `post_save`: o perfil é criado aqui, não pelo sinal.
+        users = User.objects.bulk_create([agente.user for agente in agentes])
+        for agente, user in zip(agentes, users):
+            agente.perfil.user_id = user.pk
+        perfis = UserProfile.objects.bulk_create([agente.perfil for agente in agentes])
+        Vinculo = UserProfile.funcoes.through
+        Vinculo.objects.bulk_create([
+            Vinculo(userprofile_id=perfil.pk, funcao_id=funcao_id)
+            for agente, perfil in zip(agentes, perfis) for funcao_id in agente.funcao_ids
+        ])
@@ -0,0 +1,85 @@
+# usuario/management/commands/benchmark_permissoes.py
+
+import time
+
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User, Group, Permission
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from instituicao.models import Estado, Municipio, TipoInstituicao, Instituicao
+from usuario.models import Funcao
+from usuario.permissoes import tem_permissao
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara verificações/segundo do motor de permissões por função com o '
+        'ModelBackend.has_perm do Django. Os dados de teste são criados em uma '
+        'transação desfeita ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verificacoes', type=int, default=20000, help='Verificações por cenário.')
+        parser.add_argument('--funcoes', type=int, default=4, help='Funções atribuídas ao usuário.')
+        parser.add_argument('--permissoes-por-funcao', type=int, default=15)
+
+    def _medir(self, nome, total, verificar):
+        inicio = time.perf_counter()
+        for _ in range(total):
+            if not verificar():
+                raise CommandError(f'{nome}: a verificação negou a permissão.')
+        taxa = total / (time.perf_counter() - inicio)
+        self.stdout.write(f'  {nome:<40} {taxa:>12,.0f} verificações/s')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._executar(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _executar(self, options):
+        total = options['verificacoes']
+        permissoes = list(Permission.objects.select_related('content_type').order_by('id'))
+        por_funcao = options['permissoes_por_funcao']
+
+        estado = Estado.objects.create(nome='Benchmark', uf='ZZ')
+        municipio = Municipio.objects.create(estado=estado, nome='Benchmark')
+        tipo = TipoInstituicao.objects.create(nome='Benchmark de Permissões')
+        instituicao = Instituicao.objects.create(tipo=tipo, municipio=municipio)
+
+        usuario = User.objects.create_user('benchmark_permissoes')
+        perfil = usuario.userprofile
+        perfil.instituicao = instituicao
+        perfil.save()
+
+        grupos = []
+        for i in range(options['funcoes']):
+            perms = permissoes[i * por_funcao:(i + 1) * por_funcao]
+            funcao = Funcao.objects.create(instituicao=instituicao, nome=f'Função {i}')
+            funcao.permissoes.set(perms)
+            perfil.funcoes.add(funcao)
+            grupo = Group.objects.create(name=f'benchmark_permissoes_{i}')
+            grupo.permissions.set(perms)
+            grupos.append(grupo)
+        usuario.groups.set(grupos)
+
+        alvo = permissoes[(options['funcoes'] - 1) * por_funcao]
+        perm = f'{alvo.content_type.app_label}.{alvo.codename}'
+        backend = ModelBackend()
+
+        self.stdout.write(f"Permissão verificada: {perm} ({options['funcoes']} funções x {por_funcao} permissões)")
+        # "Frio": um objeto de usuário novo por verificação, como em cada requisição.
+        self._medir('ModelBackend.has_perm (frio)', max(total // 20, 1),
+                    lambda: backend.has_perm(User(pk=usuario.pk, is_active=True), perm))
+        self._medir('funções/bitset (frio, cache aquecido)', total,
+                    lambda: tem_permissao(User(pk=usuario.pk), perm))
+        # "Quente": o mesmo objeto de usuário, com as permissões já memorizadas.
+        self._medir('ModelBackend.has_perm (quente)', total, lambda: backend.has_perm(usuario, perm))
+        self._medir('funções/bitset (quente)', total, lambda: tem_permissao(usuario, perm))
@@ -0,0 +1,135 @@
+# usuario/management/commands/benchmark_usuarios.py
+
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from instituicao.models import Estado, Municipio, TipoInstituicao, Instituicao
+from usuario.models import UserProfile, Patente
+from utils.paginacao import codificar_cursor
+
+
+class _Rollback(Exception):
+    pass
+
+
+NOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Fábio', 'Gabriela', 'Hugo', 'Isabela', 'João', 'Karina', 'Lucas']
+SOBRENOMES = ['Silva', 'Souza', 'Oliveira', 'Santos', 'Pereira', 'Lima', 'Costa', 'Almeida', 'Ribeiro', 'Gomes']
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede o diretório de usuários (usuario:user_list) com 10 mil, 100 mil e 1 milhão '
+        'de perfis: primeira página, página profunda, busca, filtros e modo JSON. Os dados '
+        'de teste são criados em uma transação desfeita ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanhos', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--repeticoes', type=int, default=20, help='Requisições por cenário.')
+        parser.add_argument('--instituicoes', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=['*'], DEBUG=False):
+                self._executar(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _executar(self, options):
+        aleatorio = random.Random(42)
+        estado = Estado.objects.create(nome='Benchmark', uf='ZZ')
+        tipo = TipoInstituicao.objects.create(nome='Benchmark de Usuários')
+        instituicoes, patentes = [], {}
+        for i in range(options['instituicoes']):
+            municipio = Municipio.objects.create(estado=estado, nome=f'Benchmark {i}')
+            instituicao = Instituicao.objects.create(tipo=tipo, municipio=municipio)
+            instituicoes.append(instituicao)
+            patentes[instituicao.pk] = [
+                Patente.objects.create(instituicao=instituicao, nome=f'Patente {j}', ordem=j) for j in range(5)
+            ]
+
+        admin = User.objects.create_superuser('benchmark_usuarios_admin', 'admin@example.com', None)
+        cliente = Client()
+        cliente.force_login(admin)
+
+        criados = 0
+        for tamanho in sorted(options['tamanhos']):
+            inicio = time.perf_counter()
+            while criados < tamanho:
+                lote = min(options['batch_size'], tamanho - criados)
+                self._criar_lote(aleatorio, criados, lote, instituicoes, patentes)
+                criados += lote
+            self.stdout.write(f'\n{tamanho:,} perfis (carga: {time.perf_counter() - inicio:.1f}s)')
+            self._cenarios(cliente, instituicoes[0], tamanho, options['repeticoes'])
+
+    def _criar_lote(self, aleatorio, inicio, quantidade, instituicoes, patentes):
+        usuarios = []
+        for i in range(inicio, inicio + quantidade):
+            nome, sobrenome = aleatorio.choice(NOMES), aleatorio.choice(SOBRENOMES)
+            usuarios.append(User(
+                # Números embaralhados para que a ordem do username não siga a do id.
+                username=f'{nome.lower()}.{sobrenome.lower()}{(i * 7919) % 10_000_019}',
+                first_name=nome, last_name=sobrenome,
+                email=f'agente{i}@example.com', password='!',
+            ))
+        usuarios = User.objects.bulk_create(usuarios)
+        perfis = []
+        for usuario in usuarios:
+            instituicao = aleatorio.choice(instituicoes)
+            perfis.append(UserProfile(
+                user_id=usuario.pk, instituicao=instituicao,
+                patente=aleatorio.choice(patentes[instituicao.pk]),
+                status_vinculo=aleatorio.choice(UserProfile.StatusVinculo.values),
+            ))
+        UserProfile.objects.bulk_create(perfis)
+
+    def _cenarios(self, cliente, instituicao, tamanho, repeticoes):
+        url = reverse('usuario:user_list')
+        # Cursor de uma página "profunda" (a ~90% da lista).
+        username, pk = (
+            UserProfile.objects.order_by('user__username', 'id')
+            .values_list('user__username', 'id')[int(tamanho * 0.9)]
+        )
+        cursor = codificar_cursor([username, pk])
+        cenarios = [
+            ('primeira página', {}),
+            ('página profunda (~90%)', {'cursor': cursor}),
+            ('busca por prefixo "ana.s"', {'q': 'ana.s'}),
+            ('busca por sobrenome "Ribe"', {'q': 'Ribe'}),
+            ('instituição + status', {'instituicao': instituicao.pk, 'status': UserProfile.StatusVinculo.ATIVO}),
+            ('JSON, página profunda', {'cursor': cursor, 'formato': 'json'}),
+        ]
+        for nome, parametros in cenarios:
+            tempos, consultas = [], 0
+            for _ in range(repeticoes):
+                with CaptureQueriesContext(connection) as capturadas:
+                    inicio = time.perf_counter()
+                    resposta = cliente.get(url, parametros)
+                    tempos.append((time.perf_counter() - inicio) * 1000)
+                if resposta.status_code != 200:
+                    raise CommandError(f'{nome}: {url}?{urlencode(parametros)} respondeu {resposta.status_code}.')
+                consultas = len(capturadas)
+            self.stdout.write(
+                f'  {nome:<30} mediana {statistics.median(tempos):8.2f} ms   '
+                f'p95 {sorted(tempos)[int(len(tempos) * 0.95) - 1]:8.2f} ms   {consultas} consultas'
+            )
+
+        # Referência: a mesma página profunda com OFFSET.
+        tempos = []
+        for _ in range(max(repeticoes // 4, 1)):
+            inicio = time.perf_counter()
+            list(UserProfile.objects.select_related('user', 'instituicao', 'cargo', 'patente')
+                 .order_by('user__username', 'id')[int(tamanho * 0.9):int(tamanho * 0.9) + 50])
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        self.stdout.write(f'  {"(referência) OFFSET profundo, só ORM":<30} mediana {statistics.median(tempos):8.2f} ms')
@@ -0,0 +1,44 @@
+# usuario/management/commands/importar_usuarios.py
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from instituicao.models import Instituicao
+from usuario.importacao import ImportadorUsuarios, COLUNAS
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa agentes de um CSV para uma instituição, criando usuários, perfis e funções '
+        f'em lote. Colunas: {", ".join(COLUNAS)} (só username é obrigatória).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do CSV (UTF-8, com cabeçalho).')
+        parser.add_argument('--instituicao', type=int, required=True, help='ID da instituição de destino.')
+        parser.add_argument('--workers', type=int, default=None, help='Processos para criptografar as senhas (padrão: nº de CPUs).')
+        parser.add_argument('--batch-size', type=int, default=500, help='Linhas por lote de escrita.')
+        parser.add_argument('--delimitador', default=',', help="Separador de colunas do CSV (ex.: ';').")
+
+    def handle(self, *args, **options):
+        instituicao = Instituicao.objects.select_related('tipo', 'municipio__estado').filter(pk=options['instituicao']).first()
+        if instituicao is None:
+            raise CommandError(f"Instituição {options['instituicao']} não encontrada.")
+
+        importador = ImportadorUsuarios(instituicao, workers=options['workers'], batch_size=options['batch_size'])
+        inicio = time.perf_counter()
+        try:
+            with open(options['arquivo'], encoding='utf-8-sig', newline='') as arquivo:
+                resultado = importador.importar_arquivo(arquivo, delimitador=options['delimitador'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        duracao = time.perf_counter() - inicio
+
+        for erro in resultado.erros:
+            self.stderr.write(f'  {erro}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.criados} usuário(s) criado(s) em {instituicao} '
+            f'({resultado.lidos} linha(s) lida(s), {len(resultado.erros)} com erro) em {duracao:.1f}s.'
+        ))
+
@@ -0,0 +1,31 @@
+# usuario/management/commands/retomar_exclusoes.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from usuario.exclusao import LOTE_EXCLUSAO, excluir_instituicao, exclusoes_pendentes
+
+
+class Command(BaseCommand):
+    help = (
+        'Retoma as exclusões de instituições interrompidas (marcadas com "excluindo", por exemplo '
+        'depois de um worker reiniciar no meio da tarefa), executando-as aqui mesmo, em lotes. '
+        'Pode rodar na inicialização do serviço: sem pendências, não faz nada.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=LOTE_EXCLUSAO, help='Linhas por transação.')
+
+    def handle(self, *args, **options):
+        falhas = 0
+        for instituicao in exclusoes_pendentes():
+            try:
+                resultado = excluir_instituicao(instituicao.pk, lote=options['lote'])
+            except Exception as e:
+                falhas += 1
+                self.stderr.write(f'{instituicao.nome_gerado}: falhou ({e}); continua marcada para exclusão.')
+                continue
+            if options['verbosity']:
+                detalhes = ', '.join(f'{nome} {quantidade}' for nome, quantidade in resultado.items())
+                self.stdout.write(f'{instituicao.nome_gerado}: excluída ({detalhes}).')
+        if falhas:
+            raise CommandError(f'{falhas} exclusão(ões) não concluída(s).')
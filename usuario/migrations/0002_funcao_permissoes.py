@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('usuario', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='funcao',
+            name='permissoes',
+            field=models.ManyToManyField(blank=True, related_name='funcoes', to='auth.permission', verbose_name='Permissões'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Busca por prefixo (`istartswith`) do diretório de usuários em auth_user. O
+# SQLite só usa um índice em `LIKE 'x%'` se a coluna indexada for NOCASE; o
+# PostgreSQL compara UPPER(coluna) com text_pattern_ops.
+COLUNAS_BUSCA = ['username', 'first_name', 'last_name', 'email']
+
+
+def criar_indices_busca(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for coluna in COLUNAS_BUSCA:
+        nome = f'auth_user_{coluna}_prefixo_idx'
+        if vendor == 'sqlite':
+            schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {nome} ON auth_user ({coluna} COLLATE NOCASE)')
+        elif vendor == 'postgresql':
+            schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {nome} ON auth_user (UPPER({coluna}::text) text_pattern_ops)')
+
+
+def remover_indices_busca(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        for coluna in COLUNAS_BUSCA:
+            schema_editor.execute(f'DROP INDEX IF EXISTS auth_user_{coluna}_prefixo_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instituicao', '0002_municipio_codigo_ibge'),
+        ('usuario', '0002_funcao_permissoes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['instituicao', 'status_vinculo'], name='perfil_instituicao_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['status_vinculo'], name='perfil_status_idx'),
+        ),
+        migrations.RunPython(criar_indices_busca, remover_indices_busca),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:28
+
+from django.db import migrations, models
+
+# Reespaça as patentes existentes (ordem densa, digitada à mão) em intervalos,
+# mantendo a ordem atual. Ver usuario/ordenacao.py.
+INTERVALO = 1024
+
+
+def espacar_ordem(apps, schema_editor):
+    Patente = apps.get_model('usuario', 'Patente')
+    alteradas, instituicao_atual, posicao = [], None, 0
+    for patente in Patente.objects.order_by('instituicao_id', 'ordem', 'nome', 'pk').only('id', 'instituicao_id', 'ordem'):
+        if patente.instituicao_id != instituicao_atual:
+            instituicao_atual, posicao = patente.instituicao_id, 0
+        posicao += 1
+        patente.ordem = posicao * INTERVALO
+        alteradas.append(patente)
+    Patente.objects.bulk_update(alteradas, ['ordem'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instituicao', '0002_municipio_codigo_ibge'),
+        ('usuario', '0003_indices_diretorio'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patente',
+            index=models.Index(fields=['instituicao', 'ordem'], name='patente_instituicao_ordem_idx'),
+        ),
+        migrations.RunPython(espacar_ordem, migrations.RunPython.noop),
+    ]
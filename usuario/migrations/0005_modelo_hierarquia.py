@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instituicao', '0002_municipio_codigo_ibge'),
+        ('usuario', '0004_ordem_patentes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemModeloHierarquia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('categoria', models.CharField(choices=[('cargo', 'Cargo'), ('patente', 'Patente'), ('funcao', 'Função')], max_length=10, verbose_name='Categoria')),
+                ('nome', models.CharField(max_length=100, verbose_name='Nome')),
+                ('ordem', models.PositiveIntegerField(default=0, help_text='Para patentes: posição na hierarquia (menor para maior)')),
+                ('tipo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='modelo_hierarquia', to='instituicao.tipoinstituicao', verbose_name='Tipo de Instituição')),
+            ],
+            options={
+                'verbose_name': 'Item do Modelo de Hierarquia',
+                'verbose_name_plural': 'Modelo de Hierarquia',
+                'ordering': ['tipo', 'categoria', 'ordem', 'nome'],
+                'unique_together': {('tipo', 'categoria', 'nome')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:36
+
+import utils.midia
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuario', '0005_modelo_hierarquia'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='foto',
+            field=models.ImageField(blank=True, null=True, storage=utils.midia.ArmazenamentoPorConteudo(), upload_to='profile_photos/', verbose_name='Foto do Perfil'),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# usuario/modelo_hierarquia.py
+"""
+Modelos de hierarquia: cargos, patentes e funções padrão de um tipo de
+instituição, clonados em lote para uma instituição ou para todas as do tipo.
+
+As instituições são processadas em lotes, cada um em uma transação, com um
+`bulk_create(ignore_conflicts=True)` por modelo: nomes que a instituição já
+tem (`unique_together` instituição + nome) são ignorados. Os inseridos são
+contados pela diferença de contagem antes e depois do lote. As patentes do
+modelo entram depois das que a instituição já tiver, espaçadas como em
+`usuario.ordenacao`.
+"""
+from dataclasses import dataclass, asdict
+
+from django.db import transaction
+from django.db.models import Max
+
+from instituicao.models import Instituicao
+from utils.tarefas import iniciar_tarefa
+from .hierarquia import invalidar_hierarquia
+from .models import ItemModeloHierarquia, Cargo, Patente, Funcao
+from .ordenacao import INTERVALO
+
+INSTITUICOES_POR_LOTE = 100
+
+
+@dataclass
+class ResultadoAplicacao:
+    instituicoes: int = 0
+    inseridos: int = 0
+    ignorados: int = 0
+
+
+def _contar(instituicao_ids):
+    return sum(modelo.objects.filter(instituicao_id__in=instituicao_ids).count() for modelo in (Cargo, Patente, Funcao))
+
+
+def _aplicar_lote(itens, instituicao_ids):
+    antes = _contar(instituicao_ids)
+    ultimas = dict(
+        Patente.objects.filter(instituicao_id__in=instituicao_ids).order_by()
+        .values('instituicao_id').annotate(ultima=Max('ordem')).values_list('instituicao_id', 'ultima')
+    )
+    Cargo.objects.bulk_create(
+        [Cargo(instituicao_id=i, nome=nome) for i in instituicao_ids for nome in itens['cargo']],
+        ignore_conflicts=True,
+    )
+    Patente.objects.bulk_create(
+        [
+            Patente(instituicao_id=i, nome=nome, ordem=(ultimas.get(i) or 0) + posicao * INTERVALO)
+            for i in instituicao_ids for posicao, nome in enumerate(itens['patente'], start=1)
+        ],
+        ignore_conflicts=True,
+    )
+    Funcao.objects.bulk_create(
+        [Funcao(instituicao_id=i, nome=nome) for i in instituicao_ids for nome in itens['funcao']],
+        ignore_conflicts=True,
+    )
+    # `bulk_create` não envia `post_save`.
+    invalidar_hierarquia(*instituicao_ids)
+    return _contar(instituicao_ids) - antes
+
+
+def aplicar_modelo(tipo_id, instituicao_ids=None, tarefa=None, lote=INSTITUICOES_POR_LOTE):
+    """
+    Aplica o modelo do tipo às instituições `instituicao_ids` (todas as do tipo
+    se None). `tarefa` (opcional) recebe o progresso a cada lote.
+    """
+    itens = {categoria: [] for categoria in ItemModeloHierarquia.Categoria.values}
+    for categoria, nome in ItemModeloHierarquia.objects.filter(tipo_id=tipo_id).values_list('categoria', 'nome'):
+        itens[categoria].append(nome)
+    if instituicao_ids is None:
+        instituicao_ids = Instituicao.objects.ativas().filter(tipo_id=tipo_id).order_by('pk').values_list('id', flat=True)
+    ids = list(instituicao_ids)
+    por_instituicao = sum(len(nomes) for nomes in itens.values())
+
+    resultado = ResultadoAplicacao()
+    for inicio in range(0, len(ids) if por_instituicao else 0, lote):
+        parte = ids[inicio:inicio + lote]
+        with transaction.atomic():
+            inseridos = _aplicar_lote(itens, parte)
+        resultado.instituicoes += len(parte)
+        resultado.inseridos += inseridos
+        resultado.ignorados += len(parte) * por_instituicao - inseridos
+        if tarefa is not None:
+            tarefa.relatar(resultado.instituicoes, len(ids), **asdict(resultado))
+    return resultado
+
+
+def _aplicar_em_segundo_plano(tipo_id, instituicao_ids, tarefa):
+    return asdict(aplicar_modelo(tipo_id, instituicao_ids, tarefa=tarefa))
+
+
+def aplicar_modelo_em_segundo_plano(tipo, instituicao_ids=None, usuario=None):
+    """ Agenda `aplicar_modelo` como tarefa em segundo plano; devolve o id da tarefa. """
+    return iniciar_tarefa(
+        f'Modelo de hierarquia: {tipo.nome}', _aplicar_em_segundo_plano, tipo.pk, instituicao_ids, usuario=usuario,
+    )
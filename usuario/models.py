@@ -1,11 +1,28 @@
 # usuario/models.py
 from django.db import models
-from django.contrib.auth.models import User
+from django.contrib.auth.models import User, Permission
 from django.utils.translation import gettext_lazy as _
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.urls import reverse
-from instituicao.models import Instituicao
+from instituicao.models import Instituicao, TipoInstituicao
+from utils.midia import armazenamento_por_conteudo
+
+
+def rotulo_hierarquia(item):
+    """
+    "Nome (Município)" de um cargo, patente ou função. Usa a instituição já
+    carregada (`select_related`) ou a do cache de instituições
+    (`instituicao.cache`), para que listar vários itens não custe duas
+    consultas por objeto.
+    """
+    if type(item).instituicao.is_cached(item) and Instituicao.municipio.is_cached(item.instituicao):
+        instituicao = item.instituicao
+    else:
+        from instituicao.cache import obter_instituicao
+        instituicao = obter_instituicao(item.instituicao_id)
+    return f"{item.nome} ({instituicao.municipio.nome})" if instituicao else item.nome
+
 
 class Cargo(models.Model):
     instituicao = models.ForeignKey(Instituicao, on_delete=models.CASCADE, related_name='cargos', verbose_name="Instituição")
@@ -15,32 +32,59 @@ class Cargo(models.Model):
         verbose_name_plural = "Cargos"
         ordering = ['instituicao', 'nome']
         unique_together = [['instituicao', 'nome']]
-    def __str__(self): return f"{self.nome} ({self.instituicao.municipio.nome})"
+    def __str__(self): return rotulo_hierarquia(self)
     def get_absolute_url(self): return reverse('instituicao:edita_cargo', kwargs={'instituicao_pk': self.instituicao.pk, 'pk': self.pk})
 
 class Patente(models.Model):
     instituicao = models.ForeignKey(Instituicao, on_delete=models.CASCADE, related_name='patentes', verbose_name="Instituição")
     nome = models.CharField(max_length=100, verbose_name="Nome da Patente")
+    # Espaçada em intervalos (ver usuario/ordenacao.py): mover uma patente grava só a linha movida.
     ordem = models.PositiveIntegerField(default=0, help_text="Usado para ordenar por hierarquia (menor para maior)")
     class Meta:
         verbose_name = "Patente"
         verbose_name_plural = "Patentes"
         ordering = ['instituicao', 'ordem']
         unique_together = [['instituicao', 'nome']]
-    def __str__(self): return f"{self.nome} ({self.instituicao.municipio.nome})"
+        indexes = [models.Index(fields=['instituicao', 'ordem'], name='patente_instituicao_ordem_idx')]
+    def __str__(self): return rotulo_hierarquia(self)
+    def save(self, *args, **kwargs):
+        # Sem ordem informada, a patente entra no fim da hierarquia.
+        if self.ordem is None:
+            from .ordenacao import proxima_ordem
+            self.ordem = proxima_ordem(self.instituicao_id)
+        super().save(*args, **kwargs)
     def get_absolute_url(self): return reverse('instituicao:edita_patente', kwargs={'instituicao_pk': self.instituicao.pk, 'pk': self.pk})
 
 class Funcao(models.Model):
     instituicao = models.ForeignKey(Instituicao, on_delete=models.CASCADE, related_name='funcoes', verbose_name="Instituição")
     nome = models.CharField(max_length=100, verbose_name="Nome da Função")
+    # Permissões concedidas a quem exerce a função (compiladas em bitsets por `usuario.permissoes`).
+    permissoes = models.ManyToManyField(Permission, blank=True, related_name='funcoes', verbose_name="Permissões")
     class Meta:
         verbose_name = "Função"
         verbose_name_plural = "Funções"
         ordering = ['instituicao', 'nome']
         unique_together = [['instituicao', 'nome']]
-    def __str__(self): return f"{self.nome} ({self.instituicao.municipio.nome})"
+    def __str__(self): return rotulo_hierarquia(self)
     def get_absolute_url(self): return reverse('instituicao:edita_funcao', kwargs={'instituicao_pk': self.instituicao.pk, 'pk': self.pk})
 
+class ItemModeloHierarquia(models.Model):
+    """ Cargo, patente ou função do modelo de hierarquia de um tipo de instituição (ver usuario/modelo_hierarquia.py). """
+    class Categoria(models.TextChoices):
+        CARGO = 'cargo', 'Cargo'
+        PATENTE = 'patente', 'Patente'
+        FUNCAO = 'funcao', 'Função'
+    tipo = models.ForeignKey(TipoInstituicao, on_delete=models.CASCADE, related_name='modelo_hierarquia', verbose_name="Tipo de Instituição")
+    categoria = models.CharField(max_length=10, choices=Categoria.choices, verbose_name="Categoria")
+    nome = models.CharField(max_length=100, verbose_name="Nome")
+    ordem = models.PositiveIntegerField(default=0, help_text="Para patentes: posição na hierarquia (menor para maior)")
+    class Meta:
+        verbose_name = "Item do Modelo de Hierarquia"
+        verbose_name_plural = "Modelo de Hierarquia"
+        ordering = ['tipo', 'categoria', 'ordem', 'nome']
+        unique_together = [['tipo', 'categoria', 'nome']]
+    def __str__(self): return f"{self.get_categoria_display()}: {self.nome}"
+
 class UserProfile(models.Model):
     class StatusVinculo(models.TextChoices):
         SEM_VINCULO = 'SV', _('Sem Vínculo')
@@ -57,13 +101,18 @@ class UserProfile(models.Model):
     is_admin_instituicao = models.BooleanField(default=False, verbose_name="É Administrador da Instituição")
     cpf = models.CharField(max_length=14, verbose_name=_("CPF"), blank=True, null=True)
     celular = models.CharField(max_length=15, verbose_name=_("Celular"), blank=True, null=True)
-    foto = models.ImageField(upload_to='profile_photos/', verbose_name=_("Foto do Perfil"), blank=True, null=True)
+    foto = models.ImageField(upload_to='profile_photos/', storage=armazenamento_por_conteudo, verbose_name=_("Foto do Perfil"), blank=True, null=True)
     data_criacao = models.DateTimeField(auto_now_add=True, verbose_name=_("Data de Criação do Perfil"))
 
     class Meta:
         verbose_name = _("Perfil de Usuário")
         verbose_name_plural = _("Perfis de Usuários")
         ordering = ['user__username']
+        # Filtros do diretório de usuários (`user_list`).
+        indexes = [
+            models.Index(fields=['instituicao', 'status_vinculo'], name='perfil_instituicao_status_idx'),
+            models.Index(fields=['status_vinculo'], name='perfil_status_idx'),
+        ]
 
     def __str__(self):
         return self.user.username
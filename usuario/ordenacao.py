@@ -0,0 +1,136 @@
+# usuario/ordenacao.py
+"""
+Ordenação das patentes de uma instituição por "ranking com intervalos".
+
+As patentes ficam espaçadas de `INTERVALO` em `ordem` (1024, 2048, ...). Mover
+uma patente para antes ou depois de outra grava só a linha movida, com o ponto
+médio entre as vizinhas. Quando o espaço entre duas vizinhas fica pequeno, um
+rebalanceamento (que reespaça toda a hierarquia com um único `bulk_update`) é
+agendado em segundo plano; se o espaço acabar de vez, ou se a referência
+dividir a `ordem` com outra patente, ele é feito na hora, antes de gravar o
+movimento. O formulário de patentes não aceita uma `ordem` já usada na
+instituição; empates só surgem de dados antigos ou gravações fora dele.
+
+`update()` e `bulk_update()` não enviam `post_save`: o snapshot da hierarquia
+é invalidado explicitamente.
+"""
+from dataclasses import dataclass
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Max
+
+from utils.tarefas import agendar
+from .hierarquia import invalidar_hierarquia
+from .models import Patente
+
+INTERVALO = 1024
+# Abaixo deste espaço entre vizinhas, agenda um rebalanceamento.
+ESPACO_MINIMO = 8
+
+
+@dataclass
+class ResultadoMovimento:
+    ordem: int
+    rebalanceada: bool = False
+
+
+def proxima_ordem(instituicao_id):
+    """ `ordem` para uma patente nova, no fim da hierarquia. """
+    ultima = Patente.objects.filter(instituicao_id=instituicao_id).aggregate(ultima=Max('ordem'))['ultima']
+    return (ultima or 0) + INTERVALO
+
+
+@transaction.atomic
+def rebalancear(instituicao_id):
+    """ Reespaça as patentes da instituição, mantendo a ordem atual. Retorna quantas mudaram. """
+    patentes = list(
+        Patente.objects.select_for_update().filter(instituicao_id=instituicao_id)
+        .order_by('ordem', 'nome', 'pk').only('id', 'ordem')
+    )
+    alteradas = []
+    for posicao, patente in enumerate(patentes, start=1):
+        if patente.ordem != posicao * INTERVALO:
+            patente.ordem = posicao * INTERVALO
+            alteradas.append(patente)
+    if alteradas:
+        Patente.objects.bulk_update(alteradas, ['ordem'])
+        invalidar_hierarquia(instituicao_id)
+    return len(alteradas)
+
+
+def _vizinhas(patente, antes, depois):
+    """
+    (ordem anterior, ordem seguinte, empate) do ponto de destino; None = sem
+    vizinha. `empate` indica outra patente com a mesma `ordem` da referência
+    (ex.: digitada no formulário), caso em que "imediatamente antes/depois"
+    não tem posição definida sem reespaçar.
+    """
+    irmas = Patente.objects.filter(instituicao_id=patente.instituicao_id).exclude(pk=patente.pk)
+    try:
+        referencia = irmas.values_list('ordem', flat=True).get(pk=antes if antes is not None else depois)
+    except Patente.DoesNotExist:
+        raise ValidationError('A patente de referência não pertence a esta instituição.')
+    # A própria referência (ou uma empatada com ela) e a próxima no sentido do movimento.
+    if antes is not None:
+        ordens = list(irmas.filter(ordem__lte=referencia).order_by('-ordem').values_list('ordem', flat=True)[:2])
+    else:
+        ordens = list(irmas.filter(ordem__gte=referencia).order_by('ordem').values_list('ordem', flat=True)[:2])
+    proxima = ordens[1] if len(ordens) > 1 else None
+    empate = proxima == referencia
+    if antes is not None:
+        return proxima, referencia, empate
+    return referencia, proxima, empate
+
+
+@transaction.atomic
+def mover_patente(patente, antes=None, depois=None):
+    """
+    Coloca `patente` imediatamente antes da patente `antes` ou depois da
+    patente `depois` (ids, da mesma instituição).
+    """
+    if (antes is None) == (depois is None):
+        raise ValidationError("Informe 'antes' ou 'depois'.")
+    if patente.pk in (antes, depois):
+        raise ValidationError('Uma patente não pode ser movida em relação a si mesma.')
+
+    rebalanceada = False
+    anterior, seguinte, empate = _vizinhas(patente, antes, depois)
+    if empate or (seguinte is not None and seguinte - (anterior or 0) < 2):
+        # Sem espaço entre as vizinhas, ou ordens repetidas: reespaça tudo agora e recalcula.
+        rebalancear(patente.instituicao_id)
+        rebalanceada = True
+        anterior, seguinte, _ = _vizinhas(patente, antes, depois)
+
+    if seguinte is None:
+        ordem = anterior + INTERVALO
+    else:
+        ordem = ((anterior or 0) + seguinte) // 2
+    Patente.objects.filter(pk=patente.pk).update(ordem=ordem)
+    patente.ordem = ordem
+    invalidar_hierarquia(patente.instituicao_id)
+
+    if not rebalanceada and seguinte is not None and min(ordem - (anterior or 0), seguinte - ordem) < ESPACO_MINIMO:
+        agendar(rebalancear, patente.instituicao_id)
+    return ResultadoMovimento(ordem=ordem, rebalanceada=rebalanceada)
+
+
+@transaction.atomic
+def aplicar_ordem(instituicao_id, patente_ids):
+    """
+    Aplica a ordem completa `patente_ids` (todas as patentes da instituição,
+    da menor para a maior) com um único `bulk_update`.
+    """
+    patentes = {p.pk: p for p in Patente.objects.filter(instituicao_id=instituicao_id).only('id', 'ordem')}
+    if len(patente_ids) != len(set(patente_ids)) or set(patente_ids) != set(patentes):
+        raise ValidationError('A lista deve conter cada patente da instituição exatamente uma vez.')
+    alteradas = []
+    for posicao, patente_id in enumerate(patente_ids, start=1):
+        patente = patentes[patente_id]
+        if patente.ordem != posicao * INTERVALO:
+            patente.ordem = posicao * INTERVALO
+            alteradas.append(patente)
+    if alteradas:
+        Patente.objects.bulk_update(alteradas, ['ordem'])
+        invalidar_hierarquia(instituicao_id)
+    return len(alteradas)
@@ -0,0 +1,161 @@
+# usuario/permissoes.py
+"""
+Controle de acesso por função (RBAC) compilado em bitsets.
+
+Cada `Permission` do Django ocupa um bit (a posição é o próprio id). O
+mapeamento Função -> Permissões de uma instituição é compilado em um dicionário
+{funcao_id: bitset} e guardado no cache sob uma versão por instituição, que é
+incrementada sempre que as permissões de uma função mudam. As permissões
+efetivas de um usuário são o OU dos bitsets das suas funções (lidas do snapshot
+de autorização) e uma verificação custa um único E bit a bit.
+
+A versão só é incrementada no cache do processo que fez a mudança; com um
+cache local por processo, os demais recompilam quando o compilado expira
+(`PERMISSOES_TIMEOUT`, o mesmo prazo do snapshot de autorização).
+"""
+import threading
+import time
+
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from utils.cache import obter_versao, incrementar_versao
+from .autorizacao import AUTORIZACAO_TIMEOUT, obter_autorizacao
+from .models import Funcao
+
+
+PERMISSOES_TIMEOUT = AUTORIZACAO_TIMEOUT
+
+
+def _chave_versao(instituicao_id):
+    return f'usuario:permissoes:versao:{instituicao_id}'
+
+
+# --- ÍNDICE DE PERMISSÕES ('app_label.codename' -> bit) ---
+
+# Intervalo mínimo entre recargas provocadas por nomes desconhecidos: um nome
+# inexistente (ex.: vindo da requisição) não pode custar uma consulta a cada vez.
+RECARGA_MINIMA = 60  # segundos
+
+_bits = {}
+_recarregado_em = None
+_lock = threading.Lock()
+
+
+def _recarregar_bits():
+    global _bits, _recarregado_em
+    with _lock:
+        _bits = {
+            f'{app_label}.{codename}': pk
+            for pk, app_label, codename in Permission.objects.values_list('id', 'content_type__app_label', 'codename')
+        }
+        _recarregado_em = time.monotonic()
+
+
+def bit_da_permissao(perm):
+    """ Posição do bit da permissão, ou None se ela não existir. """
+    if perm not in _bits and (_recarregado_em is None or time.monotonic() - _recarregado_em >= RECARGA_MINIMA):
+        _recarregar_bits()
+    return _bits.get(perm)
+
+
+def mascara(*perms):
+    """ Bitset com todas as permissões informadas (None se alguma não existir). """
+    valor = 0
+    for perm in perms:
+        bit = bit_da_permissao(perm)
+        if bit is None:
+            return None
+        valor |= 1 << bit
+    return valor
+
+
+# --- COMPILAÇÃO POR INSTITUIÇÃO ---
+
+def compilar_instituicao(instituicao_id):
+    """ Retorna {funcao_id: bitset} da instituição, do cache ou compilando com uma consulta. """
+    chave = f'usuario:permissoes:{instituicao_id}:{obter_versao(_chave_versao(instituicao_id))}'
+    compilado = cache.get(chave)
+    if compilado is None:
+        compilado = {}
+        linhas = Funcao.permissoes.through.objects.filter(funcao__instituicao_id=instituicao_id).values_list('funcao_id', 'permission_id')
+        for funcao_id, permission_id in linhas:
+            compilado[funcao_id] = compilado.get(funcao_id, 0) | (1 << permission_id)
+        cache.set(chave, compilado, PERMISSOES_TIMEOUT)
+    return compilado
+
+
+def permissoes_efetivas(user):
+    """ Bitset das permissões do usuário na sua instituição (memorizado no objeto do usuário). """
+    efetivas = getattr(user, '_permissoes_efetivas', None)
+    if efetivas is None:
+        autorizacao = obter_autorizacao(user)
+        efetivas = 0
+        if autorizacao.instituicao_id and autorizacao.funcao_ids:
+            compilado = compilar_instituicao(autorizacao.instituicao_id)
+            for funcao_id in autorizacao.funcao_ids:
+                efetivas |= compilado.get(funcao_id, 0)
+        user._permissoes_efetivas = efetivas
+    return efetivas
+
+
+def tem_permissao(user, *perms, instituicao_id=None):
+    """
+    Verifica se o usuário possui todas as permissões, concedidas pelas suas
+    funções. Com `instituicao_id`, exige também que ele pertença a ela.
+    O superusuário sempre tem acesso.
+    """
+    if not getattr(user, 'is_authenticated', False):
+        return False
+    if user.is_superuser:
+        return True
+    if instituicao_id is not None and obter_autorizacao(user).instituicao_id != instituicao_id:
+        return False
+    requerida = mascara(*perms)
+    if requerida is None:
+        return False
+    return permissoes_efetivas(user) & requerida == requerida
+
+
+# --- VIEWS ---
+
+# As views declaram `permissao_requerida` em `InstituicaoAdminRequiredMixin`
+# (instituicao/mixins.py), que consulta `tem_permissao` na instituição da URL.
+
+def normalizar_permissoes(valor):
+    """ Aceita None, uma string ou um iterável de strings e retorna uma tupla. """
+    if not valor:
+        return ()
+    if isinstance(valor, str):
+        return (valor,)
+    return tuple(valor)
+
+
+# --- INVALIDAÇÃO ---
+
+def invalidar_permissoes(*instituicao_ids):
+    def invalidar():
+        for instituicao_id in instituicao_ids:
+            incrementar_versao(_chave_versao(instituicao_id))
+    transaction.on_commit(invalidar)
+
+
+@receiver(post_save, sender=Funcao)
+@receiver(post_delete, sender=Funcao)
+def funcao_alterada(sender, instance, **kwargs):
+    invalidar_permissoes(instance.instituicao_id)
+
+
+@receiver(m2m_changed, sender=Funcao.permissoes.through)
+def permissoes_da_funcao_alteradas(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidar_permissoes(instance.instituicao_id)
+    else:
+        # `permission.funcoes.add(...)`: invalida as instituições das funções afetadas.
+        funcoes = Funcao.objects.all() if pk_set is None else Funcao.objects.filter(pk__in=pk_set)
+        invalidar_permissoes(*set(funcoes.values_list('instituicao_id', flat=True)))
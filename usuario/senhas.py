@@ -0,0 +1,48 @@
+# usuario/senhas.py
+"""
+Criptografia de senhas em lote, num pool de processos (ver `usuario.importacao`).
+
+Os processos do pool são iniciados com `spawn`, não com `fork`: copiar um
+worker web com várias threads (gunicorn, pool de `utils.tarefas`) herdaria
+travas seguradas por outras threads e poderia deixar o filho travado. O pool
+é criado uma vez por processo e reaproveitado entre importações, então o
+custo de iniciar os processos só é pago na primeira. Como os filhos não
+herdam a memória do pai, recebem os `PASSWORD_HASHERS` em vigor ao criar o
+pool (ex.: um `override_settings`). Este módulo não importa modelos, porque
+os processos filhos o importam antes de `django.setup()`.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+_pools = {}
+_trava_pools = threading.Lock()
+
+
+def _inicializar_worker(hashers):
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    settings.PASSWORD_HASHERS = hashers
+
+
+def criptografar(senhas):
+    """ Hash de cada senha; as vazias viram senha inutilizável. """
+    return [make_password(senha) if senha else make_password(None) for senha in senhas]
+
+
+def obter_pool(workers):
+    """ Pool com `workers` processos, criado na primeira chamada e reaproveitado. """
+    hashers = list(settings.PASSWORD_HASHERS)
+    chave = (workers, tuple(hashers))
+    with _trava_pools:
+        if chave not in _pools:
+            _pools[chave] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_inicializar_worker, initargs=(hashers,),
+            )
+        return _pools[chave]
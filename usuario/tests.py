@@ -1,3 +1,573 @@
-from django.test import TestCase
+import io
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from instituicao.models import Estado, Municipio, TipoInstituicao, Instituicao
+from utils.paginacao import codificar_cursor
+from .forms import UserProfileEditForm
+from .hierarquia import obter_hierarquia
+from .importacao import ImportadorUsuarios
+from .ordenacao import INTERVALO, mover_patente, aplicar_ordem
+from .modelo_hierarquia import aplicar_modelo
+from .models import UserProfile, Cargo, Patente, Funcao, ItemModeloHierarquia
+
+
+class DiretorioUsuariosTests(TestCase):
+    """ O diretório (`user_list`) é paginado por cursor, com filtros e modo JSON. """
+
+    @classmethod
+    def setUpTestData(cls):
+        estado = Estado.objects.create(nome='São Paulo', uf='SP')
+        tipo = TipoInstituicao.objects.create(nome='Guarda Civil Municipal')
+        cls.gcm = Instituicao.objects.create(tipo=tipo, municipio=Municipio.objects.create(estado=estado, nome='Guaíra'))
+        outra = Instituicao.objects.create(tipo=tipo, municipio=Municipio.objects.create(estado=estado, nome='Barretos'))
+        cls.admin = User.objects.create_superuser('admin_si', 'si@example.com', 'senha')
+        for i in range(120):
+            user = User.objects.create_user(f'agente{i:03d}', f'agente{i}@example.com', first_name='Ana' if i % 3 == 0 else 'Bruno')
+            UserProfile.objects.filter(user=user).update(
+                instituicao=cls.gcm if i % 2 else outra,
+                status_vinculo=UserProfile.StatusVinculo.ATIVO if i % 4 else UserProfile.StatusVinculo.PENDENTE,
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def _todas_as_paginas(self, **parametros):
+        usernames, cursor = [], None
+        while True:
+            dados = self.client.get(reverse('usuario:user_list'), {**parametros, 'formato': 'json', **({'cursor': cursor} if cursor else {})}).json()
+            usernames += [r['username'] for r in dados['resultados']]
+            cursor = dados['proximo']
+            if not cursor:
+                return usernames
+
+    def test_paginas_percorrem_todos_os_usuarios_em_ordem(self):
+        usernames = self._todas_as_paginas()
+        esperados = list(User.objects.order_by('username').values_list('username', flat=True))
+        self.assertEqual(usernames, esperados)
+
+    def test_filtros_e_busca(self):
+        usernames = self._todas_as_paginas(instituicao=self.gcm.pk, status=UserProfile.StatusVinculo.ATIVO, q='ana')
+        esperados = sorted(f'agente{i:03d}' for i in range(120) if i % 2 and i % 4 and i % 3 == 0)
+        self.assertEqual(usernames, esperados)
+
+    def test_consultas_nao_dependem_da_pagina(self):
+        primeira = self.client.get(reverse('usuario:user_list'), {'formato': 'json'}).json()
+        # sessão + usuário + página
+        with self.assertNumQueries(3):
+            self.client.get(reverse('usuario:user_list'), {'formato': 'json', 'cursor': primeira['proximo']})
+        # + opções de instituição do filtro e snapshot de autorização do cabeçalho
+        with self.assertNumQueries(5):
+            self.client.get(reverse('usuario:user_list'), {'cursor': primeira['proximo']})
+
+    def test_email_so_para_equipe_e_mesma_instituicao(self):
+        membro = User.objects.get(username='agente001')  # da GCM
+        self.client.force_login(membro)
+        resultados = self.client.get(reverse('usuario:user_list'), {'formato': 'json', 'instituicao': ''}).json()['resultados']
+        visiveis = {r['username'] for r in resultados if r['email']}
+        self.assertTrue(visiveis)
+        self.assertEqual(visiveis, {r['username'] for r in resultados if r['instituicao'] == self.gcm.nome_gerado})
+        html = self.client.get(reverse('usuario:user_list')).content.decode()
+        self.assertIn('agente1@example.com', html)
+        self.assertNotIn('agente0@example.com', html)
+
+        self.client.force_login(self.admin)
+        resultados = self.client.get(reverse('usuario:user_list'), {'formato': 'json'}).json()['resultados']
+        self.assertTrue(all(r['email'] for r in resultados))
+
+    def test_cursor_invalido_volta_ao_inicio(self):
+        resposta = self.client.get(reverse('usuario:user_list'), {'cursor': 'lixo', 'formato': 'json'})
+        self.assertEqual(resposta.json()['resultados'][0]['username'], 'admin_si')
+
+    def test_cursor_com_valores_de_tipo_errado_volta_ao_inicio(self):
+        for valores in (['a', 'abc'], [None, None], [['x'], 1], ['agente010', {'id': 1}]):
+            with self.subTest(valores=valores):
+                resposta = self.client.get(reverse('usuario:user_list'), {'cursor': codificar_cursor(valores), 'formato': 'json'})
+                self.assertEqual(resposta.status_code, 200)
+                self.assertEqual(resposta.json()['resultados'][0]['username'], 'admin_si')
+        resposta = self.client.get(reverse('usuario:user_list'), {'cursor': codificar_cursor(['a', 'abc'])})
+        self.assertEqual(resposta.status_code, 200)
+
+
+class PermissoesPorFuncaoTests(TestCase):
+    """ Permissões concedidas pelas funções do membro, compiladas em bitsets por instituição. """
+
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth.models import Permission
+
+        estado = Estado.objects.create(nome='São Paulo', uf='SP')
+        tipo = TipoInstituicao.objects.create(nome='Guarda Civil Municipal')
+        cls.gcm = Instituicao.objects.create(tipo=tipo, municipio=Municipio.objects.create(estado=estado, nome='Guaíra'))
+        cls.outra = Instituicao.objects.create(tipo=tipo, municipio=Municipio.objects.create(estado=estado, nome='Barretos'))
+        cls.perms = {p.codename: p for p in Permission.objects.filter(content_type__app_label='usuario')}
+        cls.leitura = Funcao.objects.create(instituicao=cls.gcm, nome='Leitura')
+        cls.leitura.permissoes.set([cls.perms['view_cargo'], cls.perms['view_patente'], cls.perms['view_funcao']])
+        cls.cadastro = Funcao.objects.create(instituicao=cls.gcm, nome='Cadastro')
+        cls.cadastro.permissoes.set([cls.perms['add_cargo']])
+        cls.membro = User.objects.create_user('membro')
+        UserProfile.objects.filter(user=cls.membro).update(instituicao=cls.gcm)
+        cls.membro.userprofile.funcoes.add(cls.leitura, cls.cadastro)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.membro)
+
+    def _pode(self, *perms, instituicao=None):
+        from .permissoes import tem_permissao
+
+        # Um objeto novo por verificação: as permissões efetivas ficam memorizadas no usuário.
+        return tem_permissao(User.objects.get(pk=self.membro.pk), *perms, instituicao_id=instituicao.pk if instituicao else None)
+
+    def test_compilacao_e_ou_entre_funcoes(self):
+        from .permissoes import compilar_instituicao, mascara
+
+        compilado = compilar_instituicao(self.gcm.pk)
+        self.assertEqual(compilado[self.leitura.pk], mascara('usuario.view_cargo', 'usuario.view_patente', 'usuario.view_funcao'))
+        self.assertEqual(compilado[self.cadastro.pk], 1 << self.perms['add_cargo'].pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(compilar_instituicao(self.gcm.pk), compilado)
+
+        # Cada permissão vem de uma função diferente: o usuário tem o OU das duas.
+        self.assertTrue(self._pode('usuario.view_cargo', 'usuario.add_cargo'))
+        self.assertTrue(self._pode('usuario.add_cargo', instituicao=self.gcm))
+        self.assertFalse(self._pode('usuario.add_cargo', instituicao=self.outra))
+        self.assertFalse(self._pode('usuario.delete_cargo'))
+        self.assertFalse(self._pode('usuario.inexistente'))
+
+    def test_mudancas_nas_funcoes_invalidam_o_compilado(self):
+        self.assertTrue(self._pode('usuario.add_cargo'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cadastro.permissoes.remove(self.perms['add_cargo'])
+        self.assertFalse(self._pode('usuario.add_cargo'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.perms['add_patente'].funcoes.add(self.leitura)  # pelo lado da permissão
+        self.assertTrue(self._pode('usuario.add_patente'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.leitura.delete()
+        self.assertFalse(self._pode('usuario.view_cargo'))
+
+    def test_mixin_permite_e_nega_pelas_funcoes(self):
+        url = reverse('instituicao:gerenciar_hierarquia', args=[self.gcm.pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        # Sem a permissão de cadastro de patente: 403.
+        self.assertEqual(self.client.post(url, {'form_type': 'patente', 'nome': 'Classe A'}).status_code, 403)
+        # As mesmas permissões não valem em outra instituição.
+        self.assertEqual(self.client.get(reverse('instituicao:gerenciar_hierarquia', args=[self.outra.pk])).status_code, 403)
+        # Sem funções, nada.
+        self.client.force_login(User.objects.create_user('sem_funcao'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_form_type_desconhecido_devolve_400_sem_consultar_permissoes(self):
+        from . import permissoes
+
+        url = reverse('instituicao:gerenciar_hierarquia', args=[self.gcm.pk])
+        permissoes.bit_da_permissao('usuario.add_cargo')  # índice carregado
+        for form_type in ('lixo', 'user', ''):
+            with CaptureQueriesContext(connection) as consultas:
+                resposta = self.client.post(url, {'form_type': form_type, 'nome': 'X'})
+            self.assertEqual(resposta.status_code, 400)
+            self.assertFalse([c for c in consultas.captured_queries if 'auth_permission' in c['sql']])
+        # Um nome inexistente não recarrega o índice a cada chamada.
+        with self.assertNumQueries(0):
+            self.assertIsNone(permissoes.bit_da_permissao('usuario.add_inexistente'))
+            self.assertIsNone(permissoes.bit_da_permissao('usuario.add_inexistente'))
+
+        resposta = self.client.post(url, {'form_type': 'cargo', 'nome': 'Inspetor'})
+        self.assertRedirects(resposta, url, fetch_redirect_response=False)
+        self.assertTrue(Cargo.objects.filter(instituicao=self.gcm, nome='Inspetor').exists())
+
+
+class HierarquiaSnapshotTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        estado = Estado.objects.create(nome='São Paulo', uf='SP')
+        tipo = TipoInstituicao.objects.create(nome='Guarda Civil Municipal')
+        cls.gcm = Instituicao.objects.create(tipo=tipo, municipio=Municipio.objects.create(estado=estado, nome='Guaíra'))
+        Cargo.objects.create(instituicao=cls.gcm, nome='Inspetor')
+        Cargo.objects.create(instituicao=cls.gcm, nome='Guarda')
+        Patente.objects.create(instituicao=cls.gcm, nome='Cabo', ordem=2)
+        Patente.objects.create(instituicao=cls.gcm, nome='Soldado', ordem=1)
+        Funcao.objects.create(instituicao=cls.gcm, nome='Ronda')
+        cls.perfil = User.objects.create_user('agente').userprofile
+        cls.perfil.instituicao = cls.gcm
+        cls.perfil.save()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_snapshot_em_uma_consulta_e_na_ordem_dos_modelos(self):
+        with self.assertNumQueries(1):
+            hierarquia = obter_hierarquia(self.gcm.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(obter_hierarquia(self.gcm.pk), hierarquia)
+        self.assertEqual([c.nome for c in hierarquia.cargos], ['Guarda', 'Inspetor'])
+        self.assertEqual([p.nome for p in hierarquia.patentes], ['Soldado', 'Cabo'])
+        self.assertEqual(hierarquia.funcoes[0].rotulo, 'Ronda (Guaíra)')
+
+    def test_formulario_renderiza_opcoes_sem_consultas(self):
+        obter_hierarquia(self.gcm.pk)
+        form = UserProfileEditForm(instance=self.perfil)
+        with self.assertNumQueries(0):
+            html = ''.join(str(form[campo]) for campo in ('cargo', 'patente', 'funcoes'))
+        self.assertIn('Soldado', html)
+        self.assertIn('Ronda', html)
+
+    def test_rotulo_sem_consultas_por_objeto(self):
+        cargos = list(Cargo.objects.filter(instituicao=self.gcm))
+        str(cargos[0])  # carrega a instituição no cache
+        with self.assertNumQueries(0):
+            self.assertEqual([str(c) for c in cargos], ['Guarda (Guaíra)', 'Inspetor (Guaíra)'])
+        patente = Patente.objects.select_related('instituicao__municipio').first()
+        cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(str(patente), 'Soldado (Guaíra)')
+
+    def test_perfil_com_orcamento_de_consultas(self):
+        self.perfil.cargo = Cargo.objects.get(nome='Inspetor')
+        self.perfil.save()
+        self.client.force_login(User.objects.create_superuser('admin_si', 'si@example.com', 'senha'))
+        url = reverse('usuario:user_profile', args=[self.perfil.pk])
+        self.client.get(url)
+        # sessão + usuário + perfil; o rótulo do cargo vem do cache de instituições.
+        with self.assertNumQueries(3):
+            resposta = self.client.get(url)
+        self.assertContains(resposta, 'Inspetor (Guaíra)')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportacaoUsuariosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        estado = Estado.objects.create(nome='São Paulo', uf='SP')
+        tipo = TipoInstituicao.objects.create(nome='Guarda Civil Municipal')
+        cls.gcm = Instituicao.objects.create(tipo=tipo, municipio=Municipio.objects.create(estado=estado, nome='Guaíra'))
+        Cargo.objects.create(instituicao=cls.gcm, nome='Guarda')
+        Patente.objects.create(instituicao=cls.gcm, nome='Soldado', ordem=1)
+        Funcao.objects.create(instituicao=cls.gcm, nome='Ronda')
+        Funcao.objects.create(instituicao=cls.gcm, nome='Trânsito')
+        User.objects.create_user('existente')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_importa_em_lote_e_relata_erros_por_linha(self):
+        csv = io.StringIO(
+            'username,senha,nome,email,cargo,patente,funcoes,admin\n'
+            'ana,Segredo123,Ana,ana@example.com,guarda,Soldado,Ronda; trânsito,sim\n'
+            'bruno,,Bruno,,,,,\n'
+            'existente,x,,,,,,\n'
+            'ana,x,,,,,,\n'
+            'carla,x,,,Coronel,,,\n'
+            'davi,x,,email-invalido,,,,\n'
+        )
+        # Lotes de 2, no pool de processos, para exercitar a sobreposição entre criptografia e gravação.
+        with patch('usuario.importacao.LIMITE_EM_PROCESSO', 0):
+            resultado = ImportadorUsuarios(self.gcm, workers=1, batch_size=2).importar_arquivo(csv)
+
+        self.assertEqual(resultado.criados, 2)
+        self.assertEqual([erro.linha for erro in resultado.erros], [4, 5, 6, 7])
+        ana = UserProfile.objects.select_related('user', 'cargo', 'patente').get(user__username='ana')
+        self.assertTrue(ana.user.check_password('Segredo123'))
+        self.assertEqual((ana.cargo.nome, ana.patente.nome, ana.instituicao_id), ('Guarda', 'Soldado', self.gcm.pk))
+        self.assertEqual(sorted(ana.funcoes.values_list('nome', flat=True)), ['Ronda', 'Trânsito'])
+        self.assertTrue(ana.is_admin_instituicao)
+        self.assertFalse(User.objects.get(username='bruno').has_usable_password())
+
+    def test_pool_de_senhas_usa_spawn_e_e_reaproveitado(self):
+        from .senhas import obter_pool
+
+        pool = obter_pool(1)
+        self.assertIs(obter_pool(1), pool)
+        self.assertEqual(pool._mp_context.get_start_method(), 'spawn')
+
+    def test_pagina_de_upload(self):
+        admin = User.objects.create_superuser('admin_si', 'si@example.com', 'senha')
+        self.client.force_login(admin)
+        arquivo = io.BytesIO('username;nome\nelisa;Elisa\n'.encode('utf-8'))
+        arquivo.name = 'agentes.csv'
+        resposta = self.client.post(reverse('usuario:importar_usuarios'), {
+            'instituicao': self.gcm.pk, 'arquivo': arquivo, 'delimitador': ';',
+        })
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.context['resultado'].criados, 1)
+        self.assertEqual(User.objects.get(username='elisa').userprofile.instituicao, self.gcm)
+
+
+    def test_csv_malformado_vira_erro_do_formulario(self):
+        admin = User.objects.create_superuser('admin_si', 'si@example.com', 'senha')
+        self.client.force_login(admin)
+        # Campo acima de csv.field_size_limit(): o leitor levanta csv.Error.
+        arquivo = io.BytesIO(f'username,nome\nfabio,Fábio\ngil,"{"x" * 200_000}"\n'.encode('utf-8'))
+        arquivo.name = 'agentes.csv'
+        resposta = self.client.post(reverse('usuario:importar_usuarios'), {
+            'instituicao': self.gcm.pk, 'arquivo': arquivo, 'delimitador': ',',
+        })
+        self.assertEqual(resposta.status_code, 200)
+        erro = resposta.context['form'].errors['arquivo'][0]
+        self.assertIn('CSV malformado na linha 3', erro)
+        self.assertIn('1 usuário(s)', erro)
+        # As linhas anteriores à malformada foram gravadas.
+        self.assertTrue(User.objects.filter(username='fabio').exists())
+
+
+@override_settings(TAREFAS_SINCRONAS=True)
+class OrdenacaoPatentesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        estado = Estado.objects.create(nome='São Paulo', uf='SP')
+        tipo = TipoInstituicao.objects.create(nome='Guarda Civil Municipal')
+        cls.gcm = Instituicao.objects.create(tipo=tipo, municipio=Municipio.objects.create(estado=estado, nome='Guaíra'))
+        cls.patentes = [
+            Patente.objects.create(instituicao=cls.gcm, nome=nome, ordem=(i + 1) * INTERVALO)
+            for i, nome in enumerate(['Soldado', 'Cabo', 'Sargento', 'Tenente'])
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def nomes(self):
+        return list(Patente.objects.filter(instituicao=self.gcm).order_by('ordem').values_list('nome', flat=True))
+
+    def test_mover_grava_uma_unica_linha(self):
+        tenente = self.patentes[3]
+        with CaptureQueriesContext(connection) as consultas:
+            mover_patente(tenente, antes=self.patentes[0].pk)
+        escritas = [c['sql'] for c in consultas.captured_queries if c['sql'].startswith('UPDATE')]
+        self.assertEqual(len(escritas), 1)
+        self.assertEqual(self.nomes(), ['Tenente', 'Soldado', 'Cabo', 'Sargento'])
+        mover_patente(tenente, depois=self.patentes[2].pk)
+        self.assertEqual(self.nomes(), ['Soldado', 'Cabo', 'Sargento', 'Tenente'])
+
+    def test_rebalanceia_quando_o_espaco_acaba(self):
+        Patente.objects.filter(pk=self.patentes[1].pk).update(ordem=INTERVALO + 4)
+        # Espaço pequeno após o movimento: rebalanceamento agendado para depois do commit.
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = mover_patente(self.patentes[3], antes=self.patentes[1].pk)
+        self.assertFalse(resultado.rebalanceada)
+        self.assertEqual(self.nomes(), ['Soldado', 'Tenente', 'Cabo', 'Sargento'])
+        self.assertEqual(sorted(Patente.objects.values_list('ordem', flat=True)), [INTERVALO * i for i in range(1, 5)])
+        # Sem espaço algum: rebalanceia na hora.
+        Patente.objects.filter(pk=self.patentes[0].pk).update(ordem=1)
+        resultado = mover_patente(self.patentes[2], antes=self.patentes[0].pk)
+        self.assertTrue(resultado.rebalanceada)
+        self.assertEqual(self.nomes(), ['Sargento', 'Soldado', 'Tenente', 'Cabo'])
+
+    def test_ordens_repetidas_sao_reespacadas_antes_de_mover(self):
+        # Cabo e Sargento com a mesma ordem (dados antigos): "antes do Sargento" seria ambíguo.
+        Patente.objects.filter(pk=self.patentes[2].pk).update(ordem=self.patentes[1].ordem)
+        resultado = mover_patente(self.patentes[3], antes=self.patentes[2].pk)
+        self.assertTrue(resultado.rebalanceada)
+        self.assertEqual(self.nomes(), ['Soldado', 'Cabo', 'Tenente', 'Sargento'])
+        self.assertEqual(len(set(Patente.objects.values_list('ordem', flat=True))), 4)
+
+    def test_formulario_recusa_ordem_repetida(self):
+        from .forms import PatenteForm
+
+        form = PatenteForm({'nome': 'Capitão', 'ordem': self.patentes[1].ordem}, instance=Patente(instituicao=self.gcm))
+        self.assertFalse(form.is_valid())
+        self.assertIn("'Cabo'", form.errors['ordem'][0])
+        self.assertTrue(PatenteForm({'nome': 'Capitão', 'ordem': 5 * INTERVALO}, instance=Patente(instituicao=self.gcm)).is_valid())
+        # Editar sem mudar a ordem continua válido.
+        self.assertTrue(PatenteForm({'nome': 'Cabo PM', 'ordem': self.patentes[1].ordem}, instance=self.patentes[1]).is_valid())
+
+        admin = User.objects.create_superuser('admin_si', 'si@example.com', 'senha')
+        self.client.force_login(admin)
+        self.client.post(reverse('instituicao:gerenciar_hierarquia', args=[self.gcm.pk]),
+                         {'form_type': 'patente', 'nome': 'Capitão', 'ordem': self.patentes[0].ordem})
+        self.assertFalse(Patente.objects.filter(nome='Capitão').exists())
+
+    def test_aplicar_ordem_completa(self):
+        ids = [p.pk for p in reversed(self.patentes)]
+        with self.assertNumQueries(4):  # leitura + savepoint + bulk_update + liberação
+            aplicar_ordem(self.gcm.pk, ids)
+        self.assertEqual(self.nomes(), ['Tenente', 'Sargento', 'Cabo', 'Soldado'])
+        with self.assertRaises(ValidationError):
+            aplicar_ordem(self.gcm.pk, ids[:2])
+
+    def test_endpoint_e_nova_patente_no_fim(self):
+        admin = User.objects.create_superuser('admin_si', 'si@example.com', 'senha')
+        self.client.force_login(admin)
+        url = reverse('instituicao:mover_patente', kwargs={'instituicao_pk': self.gcm.pk, 'pk': self.patentes[2].pk})
+        resposta = self.client.post(url, {'antes': self.patentes[0].pk}, content_type='application/json', HTTP_ACCEPT='application/json')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(self.nomes()[0], 'Sargento')
+        resposta = self.client.post(url, {'antes': 999}, content_type='application/json', HTTP_ACCEPT='application/json')
+        self.assertEqual(resposta.status_code, 400)
+
+        self.client.post(reverse('instituicao:gerenciar_hierarquia', args=[self.gcm.pk]), {'form_type': 'patente', 'nome': 'Capitão'})
+        self.assertEqual(self.nomes()[-1], 'Capitão')
+
+
+@override_settings(TAREFAS_SINCRONAS=True)
+class ModeloHierarquiaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.estado = Estado.objects.create(nome='São Paulo', uf='SP')
+        cls.tipo = TipoInstituicao.objects.create(nome='Guarda Civil Municipal')
+        cls.gcms = [
+            Instituicao.objects.create(tipo=cls.tipo, municipio=Municipio.objects.create(estado=cls.estado, nome=nome))
+            for nome in ('Guaíra', 'Barretos', 'Bebedouro')
+        ]
+        Categoria = ItemModeloHierarquia.Categoria
+        for categoria, nome, ordem in [
+            (Categoria.CARGO, 'Guarda', 0), (Categoria.PATENTE, 'Cabo', 2),
+            (Categoria.PATENTE, 'Soldado', 1), (Categoria.FUNCAO, 'Ronda', 0),
+        ]:
+            ItemModeloHierarquia.objects.create(tipo=cls.tipo, categoria=categoria, nome=nome, ordem=ordem)
+        # Já existe: ignorada na clonagem. A patente do modelo entra depois dela.
+        Patente.objects.create(instituicao=cls.gcms[0], nome='Soldado', ordem=1024)
+        Patente.objects.create(instituicao=cls.gcms[0], nome='Comandante', ordem=2048)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_aplica_a_todas_as_instituicoes_do_tipo(self):
+        resultado = aplicar_modelo(self.tipo.pk, lote=2)
+        self.assertEqual((resultado.instituicoes, resultado.inseridos, resultado.ignorados), (3, 11, 1))
+        patentes = Patente.objects.filter(instituicao=self.gcms[0]).order_by('ordem').values_list('nome', flat=True)
+        self.assertEqual(list(patentes), ['Soldado', 'Comandante', 'Cabo'])
+        self.assertEqual(list(Patente.objects.filter(instituicao=self.gcms[1]).values_list('nome', flat=True)), ['Soldado', 'Cabo'])
+        # Reaplicar não duplica nada.
+        self.assertEqual(aplicar_modelo(self.tipo.pk).inseridos, 0)
+
+    def test_aplicacao_em_segundo_plano_relata_contagens(self):
+        admin = User.objects.create_superuser('admin_si', 'si@example.com', 'senha')
+        self.client.force_login(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self.client.post(reverse('instituicao:aplicar_modelo_tipo', args=[self.tipo.pk]), HTTP_ACCEPT='application/json')
+        self.assertEqual(resposta.status_code, 202)
+        situacao = self.client.get(resposta.json()['situacao_url']).json()
+        self.assertEqual(situacao['estado'], 'concluida')
+        self.assertEqual(situacao['resultado'], {'instituicoes': 3, 'inseridos': 11, 'ignorados': 1})
+
+    def test_criacao_da_instituicao_aplica_o_modelo(self):
+        admin = User.objects.create_superuser('admin_si', 'si@example.com', 'senha')
+        self.client.force_login(admin)
+        municipio = Municipio.objects.create(estado=self.estado, nome='Olímpia')
+        resposta = self.client.post(reverse('instituicao:cria_instituicao'), {
+            'tipo': self.tipo.pk, 'estado': self.estado.pk, 'municipio': municipio.pk, 'aplicar_modelo': 'on',
+        })
+        self.assertEqual(resposta.status_code, 302)
+        instituicao = Instituicao.objects.get(municipio=municipio)
+        self.assertEqual(obter_hierarquia(instituicao.pk).escolhas('patente'), [
+            (p.pk, p.nome) for p in Patente.objects.filter(instituicao=instituicao).order_by('ordem')
+        ])
+        self.assertEqual([c.nome for c in obter_hierarquia(instituicao.pk).cargos], ['Guarda'])
+
+
+@override_settings(TAREFAS_SINCRONAS=True)
+class ExclusaoEmSegundoPlanoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        estado = Estado.objects.create(nome='São Paulo', uf='SP')
+        tipo = TipoInstituicao.objects.create(nome='Guarda Civil Municipal')
+        cls.gcm = Instituicao.objects.create(tipo=tipo, municipio=Municipio.objects.create(estado=estado, nome='Guaíra'))
+        cargo = Cargo.objects.create(instituicao=cls.gcm, nome='Guarda')
+        patentes = [Patente.objects.create(instituicao=cls.gcm, nome=f'Classe {i}') for i in range(3)]
+        funcao = Funcao.objects.create(instituicao=cls.gcm, nome='Ronda')
+        cls.membros = []
+        for i in range(5):
+            profile = User.objects.create_user(f'gcm{i}').userprofile
+            profile.instituicao, profile.cargo, profile.patente = cls.gcm, cargo, patentes[i % 3]
+            profile.save()
+            profile.funcoes.add(funcao)
+            cls.membros.append(profile)
+        cls.admin = User.objects.create_superuser('admin_si', 'si@example.com', 'senha')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_instituicao_some_das_listagens_antes_da_exclusao(self):
+        from .exclusao import excluir_instituicao_em_segundo_plano
+
+        excluir_instituicao_em_segundo_plano(self.gcm)  # sem executar os callbacks: a tarefa não roda
+        self.assertFalse(Instituicao.objects.ativas().filter(pk=self.gcm.pk).exists())
+        resposta = self.client.get(reverse('instituicao:lista_instituicoes'), {'formato': 'json'})
+        self.assertEqual(resposta.json()['resultados'], [])
+        self.assertEqual(self.client.get(reverse('instituicao:edita_instituicao', args=[self.gcm.pk])).status_code, 404)
+
+    def test_exclusao_da_instituicao_em_lotes(self):
+        from .exclusao import excluir_instituicao
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self.client.post(reverse('instituicao:exclui_instituicao', args=[self.gcm.pk]), HTTP_ACCEPT='application/json')
+        self.assertEqual(resposta.status_code, 202)
+        situacao = self.client.get(resposta.json()['situacao_url']).json()
+        self.assertEqual((situacao['estado'], situacao['feito'], situacao['total']), ('concluida', 15, 15))
+        self.assertEqual(situacao['resultado']['membros_desvinculados'], 5)
+        self.assertFalse(Instituicao.objects.filter(pk=self.gcm.pk).exists())
+        self.assertFalse(Patente.objects.exists())
+        # Os membros continuam existindo, sem vínculo.
+        self.assertEqual(UserProfile.objects.filter(user__username__startswith='gcm', instituicao=None, cargo=None).count(), 5)
+        self.assertFalse(UserProfile.funcoes.through.objects.exists())
+        self.assertEqual(excluir_instituicao(self.gcm.pk, lote=2), {
+            'membros_desvinculados': 0, 'funcoes_atribuidas': 0, 'funcoes': 0, 'cargos': 0, 'patentes': 0,
+        })
+
+    def test_exclusao_interrompida_e_retomada(self):
+        from . import exclusao
+        from utils.tarefas import obter_tarefa
+
+        excluir = exclusao._excluir
+        chamadas = []
+
+        def falhar_no_segundo_lote(queryset):
+            chamadas.append(1)
+            if len(chamadas) == 2:
+                raise RuntimeError('worker reiniciado')
+            excluir(queryset)
+
+        with patch.object(exclusao, '_excluir', falhar_no_segundo_lote):
+            with self.assertRaises(RuntimeError), self.captureOnCommitCallbacks(execute=True):
+                tarefa_id = exclusao.excluir_instituicao_em_segundo_plano(self.gcm)
+        self.assertEqual(obter_tarefa(tarefa_id)['estado'], 'falhou')
+        self.assertEqual(list(exclusao.exclusoes_pendentes()), [self.gcm])
+        # Parou no meio: membros desvinculados e funções atribuídas excluídas, o resto ficou.
+        self.assertFalse(UserProfile.objects.filter(instituicao=self.gcm).exists())
+        self.assertTrue(Funcao.objects.filter(instituicao=self.gcm).exists())
+
+        # A ação do admin reagenda a exclusão, que continua de onde parou.
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self.client.post(reverse('admin:instituicao_instituicao_changelist'), {
+                'action': 'retomar_exclusao', '_selected_action': [self.gcm.pk],
+            })
+        self.assertEqual(resposta.status_code, 302)
+        self.assertFalse(Instituicao.objects.filter(pk=self.gcm.pk).exists())
+
+    def test_comando_retomar_exclusoes(self):
+        from django.core.management import call_command
+
+        Instituicao.objects.filter(pk=self.gcm.pk).update(excluindo=True)
+        UserProfile.objects.filter(pk=self.membros[0].pk).update(instituicao=None, cargo=None, patente=None)
+        saida = io.StringIO()
+        call_command('retomar_exclusoes', '--lote', '2', stdout=saida)
+        self.assertIn('excluída', saida.getvalue())
+        self.assertFalse(Instituicao.objects.filter(pk=self.gcm.pk).exists())
+        self.assertFalse(Cargo.objects.exists())
+        call_command('retomar_exclusoes', stdout=saida)  # sem pendências
+
+    def test_exclusao_do_usuario(self):
+        profile = self.membros[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self.client.post(reverse('usuario:user_delete', args=[profile.pk]))
+        self.assertRedirects(resposta, reverse('usuario:user_list'), fetch_redirect_response=False)
+        self.assertFalse(User.objects.filter(pk=profile.user_id).exists())
+        self.assertFalse(UserProfile.objects.filter(pk=profile.pk).exists())
+        self.assertEqual(UserProfile.funcoes.through.objects.count(), 4)
@@ -1,5 +1,6 @@
 # usuario/urls.py
 from django.urls import path
+from utils.breadcrumbs import Migalha, registrar
 from . import views
 
 app_name = 'usuario'
@@ -14,4 +15,16 @@ urlpatterns = [
 
     # Rota para o Painel de Administração SI
     path('admin-si/', views.AdministracaoSIView.as_view(), name='painel_admin_si'),
-]
\ No newline at end of file
+    path('admin-si/importar-usuarios/', views.ImportarUsuariosView.as_view(), name='importar_usuarios'),
+]
+
+# Breadcrumbs (ver utils/breadcrumbs.py)
+registrar(app_name, {
+    'user_list': Migalha('Lista de Usuários'),
+    'user_create': Migalha('Novo Usuário', pai='user_list'),
+    'user_profile': Migalha('Perfil de {objeto.user.username}', pai='user_list', objeto='profile', padrao='Perfil de Usuário'),
+    'user_edit': Migalha('Editar', pai='user_profile'),
+    'user_delete': Migalha('Excluir', pai='user_profile'),
+    'painel_admin_si': Migalha('Administração SI'),
+    'importar_usuarios': Migalha('Importar Usuários', pai='painel_admin_si'),
+})
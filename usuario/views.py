@@ -1,18 +1,78 @@
 # usuario/views.py
+import io
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db import transaction
-from django.views.generic import ListView
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.generic import ListView, FormView
+from .autorizacao import obter_autorizacao
 from .models import UserProfile
-from .forms import AdminUserCreationForm, UserProfileEditForm
+from .forms import AdminUserCreationForm, UserProfileEditForm, FiltroUsuariosForm, ImportacaoUsuariosForm
+from .importacao import ImportadorUsuarios, COLUNAS
+from .exclusao import excluir_usuario_em_segundo_plano
 from instituicao.mixins import SuperuserRequiredMixin
+from utils.paginacao import paginar_keyset, url_proxima_pagina
+
+USUARIOS_POR_PAGINA = 50
+
+
+def _marcar_emails_visiveis(request, profiles):
+    """
+    `profile.email_visivel`: o e-mail só aparece para a equipe (staff e Admin
+    SI) e para membros da mesma instituição; o diretório não serve para
+    colher os endereços de todos os usuários.
+    """
+    user = request.user
+    todos = user.is_staff or user.is_superuser
+    instituicao_id = None if todos else obter_autorizacao(user).instituicao_id
+    for profile in profiles:
+        visivel = todos or (instituicao_id is not None and profile.instituicao_id == instituicao_id)
+        profile.email_visivel = profile.user.email if visivel else ''
+
+
+def _usuario_json(profile):
+    user = profile.user
+    return {
+        'id': profile.pk,
+        'username': user.username,
+        'nome': user.get_full_name(),
+        'email': profile.email_visivel or None,
+        'instituicao': profile.instituicao.nome_gerado if profile.instituicao else None,
+        'cargo': profile.cargo.nome if profile.cargo else None,
+        'patente': profile.patente.nome if profile.patente else None,
+        'status': profile.get_status_vinculo_display(),
+        'url': reverse('usuario:user_profile', args=[profile.pk]),
+    }
+
 
 @login_required
 def user_list(request):
-    """ Exibe a lista de todos os perfis de usuários do sistema. """
-    all_profiles = UserProfile.objects.select_related('user', 'instituicao', 'cargo', 'patente').all()
-    context = {'profiles': all_profiles}
+    """
+    Diretório de usuários, com filtros e busca por prefixo, paginado por cursor
+    (keyset) sobre `user__username`/id: o custo de cada página não depende do
+    tamanho da tabela. Com `?formato=json` devolve a página em JSON, para que o
+    front-end carregue as próximas páginas incrementalmente.
+    """
+    form = FiltroUsuariosForm(request.GET)
+    profiles = UserProfile.objects.select_related('user', 'instituicao', 'cargo', 'patente')
+    if form.is_valid():
+        profiles = form.filtrar(profiles)
+    else:
+        profiles = profiles.none()
+    pagina = paginar_keyset(profiles, ('user__username', 'id'), request.GET.get('cursor'), USUARIOS_POR_PAGINA)
+
+    proxima_url = url_proxima_pagina(request, pagina)
+    _marcar_emails_visiveis(request, pagina.itens)
+
+    if request.GET.get('formato') == 'json':
+        return JsonResponse({
+            'resultados': [_usuario_json(profile) for profile in pagina.itens],
+            'proximo': pagina.proximo,
+            'proxima_url': proxima_url,
+        })
+    context = {'form': form, 'profiles': pagina.itens, 'pagina': pagina, 'proxima_url': proxima_url}
     return render(request, 'usuario/user_list.html', context)
 
 @login_required
@@ -37,7 +97,7 @@ def user_create(request):
 @login_required
 def user_profile(request, pk):
     """ Exibe os detalhes de um perfil de usuário específico. """
-    profile = get_object_or_404(UserProfile.objects.select_related('user'), pk=pk)
+    profile = get_object_or_404(UserProfile.objects.select_related('user', 'instituicao', 'cargo'), pk=pk)
     return render(request, 'usuario/user_profile.html', {'profile': profile})
 
 @login_required
@@ -61,32 +121,57 @@ def user_edit(request, pk):
     return render(request, 'usuario/user_form.html', context)
 
 @login_required
-@transaction.atomic
 def user_delete(request, pk):
-    """ Exclui um usuário e seu perfil associado. """
-    profile = get_object_or_404(UserProfile, pk=pk)
+    """
+    Desativa o usuário e exclui o usuário e o perfil em segundo plano, em
+    lotes (ver `usuario.exclusao`). O progresso fica em `utils:situacao_tarefa`.
+    """
+    profile = get_object_or_404(UserProfile.objects.select_related('user'), pk=pk)
     if request.method == 'POST':
         user_to_delete = profile.user
         if user_to_delete:
-            user_username = user_to_delete.username
-            user_to_delete.delete()
-            messages.success(request, f'Usuário {user_username} e seu perfil foram excluídos com sucesso!')
+            tarefa_id = excluir_usuario_em_segundo_plano(user_to_delete, usuario=request.user)
+            if 'application/json' in request.headers.get('Accept', ''):
+                situacao_url = reverse('utils:situacao_tarefa', args=[tarefa_id])
+                return JsonResponse({'tarefa': tarefa_id, 'situacao_url': situacao_url}, status=202)
+            messages.success(request, f'O usuário {user_to_delete.username} foi desativado e será excluído com seu perfil em instantes.')
         else:
             profile.delete()
             messages.success(request, 'Perfil sem usuário associado foi excluído com sucesso!')
         return redirect('usuario:user_list')
     return render(request, 'usuario/user_delete.html', {'profile': profile})
 
-@login_required
-def user_list(request):
-    all_profiles = UserProfile.objects.select_related('user', 'instituicao', 'cargo', 'patente').all()
-    context = {'profiles': all_profiles}
-    return render(request, 'usuario/user_list.html', context)
-
 # --- PAINEL DE ADMINISTRAÇÃO SI ---
 class AdministracaoSIView(SuperuserRequiredMixin, ListView):
     """ View para a página central de administração do Nível SI. """
     template_name = 'usuario/administracao/painel_admin_si.html'
     def get_queryset(self):
         # Esta view não exibe uma lista, apenas serve como um hub de links.
-        return []
\ No newline at end of file
+        return []
+
+class ImportarUsuariosView(SuperuserRequiredMixin, FormView):
+    """ Upload de um CSV de agentes para cadastro em lote (ver `usuario.importacao`). """
+    template_name = 'usuario/administracao/importar_usuarios.html'
+    form_class = ImportacaoUsuariosForm
+    erros_exibidos = 200
+
+    def get_context_data(self, **kwargs):
+        kwargs.setdefault('colunas', COLUNAS)
+        return super().get_context_data(**kwargs)
+
+    def form_valid(self, form):
+        instituicao = form.cleaned_data['instituicao']
+        arquivo = io.TextIOWrapper(form.cleaned_data['arquivo'].file, encoding='utf-8-sig', newline='')
+        try:
+            resultado = ImportadorUsuarios(instituicao).importar_arquivo(arquivo, delimitador=form.cleaned_data['delimitador'])
+        except (ValueError, UnicodeDecodeError) as e:
+            form.add_error('arquivo', f'Arquivo inválido: {e}')
+            return self.form_invalid(form)
+
+        if resultado.criados:
+            messages.success(self.request, f'{resultado.criados} usuário(s) importado(s) para {instituicao}.')
+        if resultado.erros:
+            messages.warning(self.request, f'{len(resultado.erros)} linha(s) não foram importadas.')
+        return self.render_to_response(self.get_context_data(
+            form=self.form_class(), resultado=resultado, erros=resultado.erros[:self.erros_exibidos],
+        ))
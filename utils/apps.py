@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UtilsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'utils'
+
+    def ready(self):
+        # Registra o contador de consultas por alias (connection_created).
+        from . import replicas  # noqa: F401
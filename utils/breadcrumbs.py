@@ -0,0 +1,140 @@
+# utils/breadcrumbs.py
+"""
+Breadcrumbs declarativos.
+
+Cada app declara, ao lado das suas rotas, o título e a página "pai" de cada
+view nomeada (`registrar`). Ao final do URLconf (`core/urls.py`) as cadeias até
+a raiz e os argumentos de URL de cada nível são pré-compilados (`compilar`); por
+requisição resta apenas percorrer a cadeia da view já resolvida
+(`request.resolver_match`) e montar as URLs, o que o template tag
+`{% breadcrumb %}` (`utils.templatetags.navegacao`) faz. Títulos dinâmicos
+são preenchidos com objetos que a view já colocou no contexto, sem nenhuma
+consulta.
+"""
+from collections import namedtuple
+
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import reverse, NoReverseMatch
+from django.urls.resolvers import URLResolver
+
+
+class Migalha:
+    """
+    Um nível do breadcrumb.
+        titulo:     texto fixo ou com campos do objeto ('Perfil de {objeto.user.username}');
+        pai:        view do nível anterior (relativa ao namespace do app, se não tiver ':');
+        objeto:     variável de contexto usada nos campos do título;
+        padrao:     título usado quando o objeto não está no contexto;
+        kwargs_pai: {argumento da rota do pai: argumento desta rota}, quando os nomes diferem.
+    """
+
+    def __init__(self, titulo, pai=None, objeto=None, padrao=None, kwargs_pai=None):
+        self.titulo = titulo
+        self.pai = pai
+        self.objeto = objeto
+        self.padrao = padrao if padrao is not None else ('' if objeto else titulo)
+        self.kwargs_pai = kwargs_pai or {}
+
+    def formatar(self, contexto=None):
+        if not self.objeto:
+            return self.titulo
+        obj = contexto.get(self.objeto) if contexto is not None else None
+        if obj is None:
+            return self.padrao
+        try:
+            return self.titulo.format(objeto=obj)
+        except (AttributeError, KeyError, IndexError):
+            return self.padrao
+
+
+# Um nível compilado: `argumentos` são pares (argumento da rota do nível,
+# argumento da rota resolvida de onde vem o valor).
+Passo = namedtuple('Passo', ['view_name', 'migalha', 'argumentos'])
+
+_migalhas = {}
+_cadeias = {}
+
+
+def registrar(app_name, migalhas):
+    """ Registra {nome da url: Migalha} do app. Chamado no urls.py do app. """
+    for nome, migalha in migalhas.items():
+        if migalha.pai and ':' not in migalha.pai:
+            migalha.pai = f'{app_name}:{migalha.pai}'
+        _migalhas[f'{app_name}:{nome}'] = migalha
+
+
+def _argumentos_das_rotas(padroes, namespace='', herdados=()):
+    for padrao in padroes:
+        argumentos = herdados + tuple(padrao.pattern.regex.groupindex)
+        if isinstance(padrao, URLResolver):
+            prefixo = f'{namespace}{padrao.namespace}:' if padrao.namespace else namespace
+            yield from _argumentos_das_rotas(padrao.url_patterns, prefixo, argumentos)
+        elif padrao.name:
+            yield f'{namespace}{padrao.name}', argumentos
+
+
+def compilar(urlpatterns):
+    """
+    Pré-compila a cadeia (da raiz até a view) de cada migalha registrada.
+    Chamado ao final do URLconf raiz; erros de declaração aparecem na carga.
+    """
+    rotas = {}
+    for nome, argumentos in _argumentos_das_rotas(urlpatterns):
+        rotas.setdefault(nome, argumentos)
+
+    _cadeias.clear()
+    for view_name in _migalhas:
+        cadeia = []
+        atual, origem = view_name, {arg: arg for arg in rotas.get(view_name, ())}
+        while atual is not None:
+            if atual not in rotas:
+                raise ImproperlyConfigured(f"Breadcrumb '{view_name}': a rota '{atual}' não existe.")
+            if atual not in _migalhas:
+                raise ImproperlyConfigured(f"Breadcrumb '{view_name}': a rota '{atual}' não tem migalha registrada.")
+            if len(cadeia) > len(_migalhas):
+                raise ImproperlyConfigured(f"Breadcrumb '{view_name}': ciclo na cadeia de pais.")
+            migalha = _migalhas[atual]
+            try:
+                argumentos = tuple((arg, origem[arg]) for arg in rotas[atual])
+            except KeyError as e:
+                raise ImproperlyConfigured(
+                    f"Breadcrumb '{view_name}': sem valor para o argumento {e} de '{atual}'."
+                ) from None
+            cadeia.append(Passo(atual, migalha, argumentos))
+            # O pai recebe os argumentos desta rota, renomeados por `kwargs_pai`.
+            origem = {
+                arg_pai: origem[arg_filho]
+                for arg_pai, arg_filho in {**{a: a for a in origem}, **migalha.kwargs_pai}.items()
+                if arg_filho in origem
+            }
+            atual = migalha.pai
+        _cadeias[view_name] = tuple(reversed(cadeia))
+
+
+def itens_do_breadcrumb(request, contexto=None):
+    """
+    Lista de {'title', 'url'} da view resolvida na requisição. Os títulos
+    dinâmicos são preenchidos com os objetos de `contexto` (o do template).
+    """
+    match = getattr(request, 'resolver_match', None)
+    view_name = match.view_name if match else None
+    user = getattr(request, 'user', None)
+
+    if user is not None and user.is_authenticated:
+        itens = [{'title': 'Dashboard', 'url': reverse('painel:dashboard')}]
+    elif view_name == 'painel:home':
+        return [{'title': 'Página Inicial', 'url': reverse('painel:home')}]
+    else:
+        itens = [{'title': 'Início', 'url': reverse('painel:home')}]
+
+    cadeia = _cadeias.get(view_name, ())
+    for i, passo in enumerate(cadeia):
+        if i == len(cadeia) - 1:
+            url = request.path
+        else:
+            try:
+                url = reverse(passo.view_name, kwargs={arg: match.kwargs[origem] for arg, origem in passo.argumentos})
+            except NoReverseMatch:
+                url = None
+        itens.append({'title': passo.migalha.formatar(contexto), 'url': url})
+    return itens
@@ -0,0 +1,46 @@
+# utils/cache.py
+"""
+Utilitários de cache versionado.
+
+Em vez de apagar entradas uma a uma, cada grupo de dados possui um contador de
+versão guardado no cache do Django. As chaves dos dados incluem a versão atual;
+invalidar o grupo é apenas incrementar o contador, e as entradas antigas
+expiram sozinhas.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def _versao_inicial():
+    # Baseada no relógio para que um contador despejado do cache nunca volte a
+    # um valor já usado (o que ressuscitaria entradas antigas).
+    return int(time.time() * 1000)
+
+
+def obter_versao(chave):
+    """ Retorna a versão atual do grupo `chave`, criando-a se necessário. """
+    versao = cache.get(chave)
+    if versao is None:
+        cache.add(chave, _versao_inicial(), None)
+        versao = cache.get(chave)
+    return versao
+
+
+def incrementar_versao(chave):
+    """ Invalida o grupo `chave`, tornando obsoletas todas as entradas da versão anterior. """
+    try:
+        return cache.incr(chave)
+    except ValueError:
+        versao = _versao_inicial()
+        cache.set(chave, versao, None)
+        return versao
+
+
+def obter_versoes(*chaves):
+    """ Como `obter_versao`, mas para várias chaves com uma única ida ao cache. """
+    versoes = cache.get_many(chaves)
+    for chave in chaves:
+        if chave not in versoes:
+            versoes[chave] = obter_versao(chave)
+    return [versoes[chave] for chave in chaves]
@@ -0,0 +1,339 @@
+# utils/estaticos.py
+"""
+Arquivos estáticos para produção (com `DEBUG = False`).
+
+`ArmazenamentoEstaticoComprimido` (backend de `collectstatic`):
+- grava nomes com o hash do conteúdo (`ManifestStaticFilesStorage`);
+- grava irmãos `.gz` e, com o pacote opcional `brotli`, `.br` de CSS, JS,
+  SVG, ícones e fontes não compactadas, quando compactar compensa;
+- regrava PNG/JPEG grandes otimizados e gera, para cada um, versões WebP
+  reduzidas (`imagem.<hash>.640w.webp`) e no tamanho original; elas entram no
+  manifesto com a chave `imagem.png@640w.webp` (ver o template tag
+  `imagem_responsiva`);
+- grava em `relatorio_estaticos.json` os bytes economizados (ver o comando
+  `relatorio_estaticos`).
+
+`ServidorEstaticos` serve `STATIC_ROOT` no próprio processo, antes do Django
+(envolve a aplicação em `core/wsgi.py` e `core/asgi.py`): entrega a variante
+pré-compactada aceita pelo cliente e, para nomes com hash, cache imutável.
+"""
+import asyncio
+import gzip
+import inspect
+import io
+import json
+import logging
+import mimetypes
+import os
+import re
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # opcional: sem ele, só .gz
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+EXTENSOES_COMPACTAVEIS = ('.css', '.js', '.mjs', '.map', '.svg', '.json', '.webmanifest', '.txt', '.xml', '.html', '.ico', '.ttf', '.otf', '.eot')
+EXTENSOES_IMAGEM = ('.png', '.jpg', '.jpeg')
+# Imagens menores que isso ficam como estão.
+TAMANHO_MINIMO_IMAGEM = 64 * 1024
+LARGURAS_VARIANTES = (640, 1280, 1920)
+# Só grava a versão compactada se ela tiver no máximo esta fração do original.
+FRACAO_MAXIMA = 0.9
+RELATORIO = 'relatorio_estaticos.json'
+
+re_nome_com_hash = re.compile(r'\.[0-9a-f]{12}(?:\.\d+w)?\.\w+$')
+re_chave_variante = re.compile(r'^(?P<original>.+)@(?P<largura>\d+)w\.webp$')
+
+
+def chave_variante(nome, largura):
+    """ Chave, no manifesto, da variante WebP de `nome` com `largura` px. """
+    return f'{nome}@{largura}w.webp'
+
+
+def _gravar(caminho, conteudo):
+    temporario = caminho + '.tmp'
+    with open(temporario, 'wb') as arquivo:
+        arquivo.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+class ArmazenamentoEstaticoComprimido(ManifestStaticFilesStorage):
+    # Os .map do Bootstrap não fazem parte de static/: não reescreve as referências a eles.
+    patterns = tuple(
+        (extensao, tuple(p for p in padroes if 'sourceMappingURL' not in (p if isinstance(p, str) else p[0])))
+        for extensao, padroes in ManifestStaticFilesStorage.patterns
+    )
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        anterior = self.ler_relatorio()
+        relatorio = {'compactados': {}, 'imagens': {}}
+        for nome, nome_hash in list(self.hashed_files.items()):
+            if re_chave_variante.match(nome):
+                continue
+            extensao = os.path.splitext(nome)[1].lower()
+            try:
+                if extensao in EXTENSOES_COMPACTAVEIS:
+                    relatorio['compactados'][nome] = self._compactar(nome_hash, anterior['compactados'].get(nome))
+                elif extensao in EXTENSOES_IMAGEM and self.size(nome_hash) >= TAMANHO_MINIMO_IMAGEM:
+                    relatorio['imagens'][nome] = self._otimizar_imagem(nome, nome_hash, anterior['imagens'].get(nome))
+            except Exception:
+                # Um arquivo problemático não deve derrubar o collectstatic: fica só o original com hash.
+                logger.warning('Não foi possível otimizar %s.', nome, exc_info=True)
+        # As variantes WebP entraram em `hashed_files` depois do manifesto salvo pelo `super()`.
+        self.save_manifest()
+        _gravar(self.path(RELATORIO), json.dumps(relatorio, indent=1, sort_keys=True).encode())
+
+    def ler_relatorio(self):
+        """ Relatório do último `collectstatic` ({'compactados': ..., 'imagens': ...}). """
+        try:
+            with open(self.path(RELATORIO), 'rb') as arquivo:
+                return json.load(arquivo)
+        except (OSError, ValueError):
+            return {'compactados': {}, 'imagens': {}}
+
+    # O nome com hash identifica o conteúdo: o que já foi gerado para ele numa execução anterior é reaproveitado.
+
+    def _compactar(self, nome_hash, anterior=None):
+        caminho = self.path(nome_hash)
+        if anterior and anterior.get('arquivo') == nome_hash and all(
+            os.path.exists(f'{caminho}.{sufixo}') for sufixo in ('gz', 'br') if sufixo in anterior
+        ) and ('br' in anterior or brotli is None):
+            return anterior
+        with open(caminho, 'rb') as arquivo:
+            original = arquivo.read()
+        tamanhos = {'arquivo': nome_hash, 'original': len(original)}
+        variantes = [('gz', lambda dados: gzip.compress(dados, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variantes.append(('br', lambda dados: brotli.compress(dados, quality=11)))
+        for sufixo, compactar in variantes:
+            compactado = compactar(original)
+            if len(compactado) <= len(original) * FRACAO_MAXIMA:
+                _gravar(f'{caminho}.{sufixo}', compactado)
+                tamanhos[sufixo] = len(compactado)
+        return tamanhos
+
+    def _otimizar_imagem(self, nome, nome_hash, anterior=None):
+        from PIL import Image, ImageOps
+
+        caminho = self.path(nome_hash)
+        base = os.path.splitext(nome_hash)[0]
+        if anterior and anterior.get('arquivo') == nome_hash and all(
+            os.path.exists(self.path(f'{base}.{largura}w.webp')) for largura in anterior['webp']
+        ):
+            for largura in anterior['webp']:
+                self.hashed_files[chave_variante(nome, largura)] = f'{base}.{largura}w.webp'
+            return anterior
+
+        tamanhos = {'arquivo': nome_hash, 'original': os.path.getsize(caminho)}
+        with Image.open(caminho) as aberta:
+            formato = aberta.format
+            imagem = ImageOps.exif_transpose(aberta)
+            imagem.load()
+        if imagem.mode not in ('RGB', 'RGBA'):
+            imagem = imagem.convert('RGBA')
+
+        # Regrava no mesmo formato (a URL não muda), se ficar menor.
+        buffer = io.BytesIO()
+        if formato == 'PNG':
+            imagem.save(buffer, 'PNG', optimize=True)
+        else:
+            imagem.convert('RGB').save(buffer, 'JPEG', quality=85, optimize=True, progressive=True)
+        if buffer.tell() < tamanhos['original']:
+            _gravar(caminho, buffer.getvalue())
+        tamanhos['otimizado'] = os.path.getsize(caminho)
+
+        larguras = [largura for largura in LARGURAS_VARIANTES if largura < imagem.width] + [imagem.width]
+        tamanhos['webp'] = {}
+        for largura in larguras:
+            variante = imagem
+            if largura != imagem.width:
+                variante = imagem.resize((largura, round(imagem.height * largura / imagem.width)), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            variante.save(buffer, 'WEBP', quality=80, method=4)
+            nome_variante = f'{base}.{largura}w.webp'
+            _gravar(self.path(nome_variante), buffer.getvalue())
+            self.hashed_files[chave_variante(nome, largura)] = nome_variante
+            tamanhos['webp'][str(largura)] = buffer.tell()
+        return tamanhos
+
+
+def variantes_webp(nome):
+    """
+    [(largura, url)] das variantes WebP da imagem estática `nome`, da menor
+    para a maior; vazia sem o `ArmazenamentoEstaticoComprimido` (ex.: em DEBUG).
+    """
+    from django.contrib.staticfiles.storage import staticfiles_storage
+
+    indice = _indice_variantes(staticfiles_storage)
+    return [(largura, staticfiles_storage.url(chave)) for largura, chave in indice.get(nome, ())]
+
+
+_indices = {}
+
+
+def _indice_variantes(storage):
+    arquivos = getattr(storage, 'hashed_files', None)
+    if not arquivos:
+        return {}
+    # O manifesto é carregado uma vez por processo: o índice é montado uma vez por manifesto.
+    indice = _indices.get(id(arquivos))
+    if indice is None:
+        indice = {}
+        for chave in arquivos:
+            encontrado = re_chave_variante.match(chave)
+            if encontrado:
+                indice.setdefault(encontrado['original'], []).append((int(encontrado['largura']), chave))
+        for variantes in indice.values():
+            variantes.sort()
+        _indices.clear()
+        _indices[id(arquivos)] = indice
+    return indice
+
+
+# --- SERVIDOR EM PROCESSO ---
+
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+CACHE_CURTO = 'public, max-age=60'
+BLOCO = 64 * 1024
+
+
+class ArquivoEstatico:
+    __slots__ = ('caminho', 'tamanho', 'etag')
+
+    def __init__(self, caminho, estado):
+        self.caminho = caminho
+        self.tamanho = estado.st_size
+        self.etag = f'"{estado.st_size:x}-{int(estado.st_mtime):x}"'
+
+
+class ServidorEstaticos:
+    """
+    Envolve uma aplicação WSGI ou ASGI e responde às requisições GET/HEAD
+    sob `STATIC_URL` com os arquivos de `STATIC_ROOT`, indexados uma vez na
+    criação. O que não estiver no índice segue para a aplicação.
+    """
+
+    def __init__(self, aplicacao, raiz=None, prefixo=None):
+        self.aplicacao = aplicacao
+        self.raiz = str(raiz or settings.STATIC_ROOT)
+        prefixo = prefixo or settings.STATIC_URL
+        self.prefixo = '/' + prefixo.strip('/') + '/'
+        self.arquivos = self._indexar()
+        self.assincrono = inspect.iscoroutinefunction(aplicacao) or inspect.iscoroutinefunction(
+            getattr(aplicacao, '__call__', None)
+        )
+
+    def _indexar(self):
+        arquivos = {}
+        pendentes = ['']
+        while pendentes:
+            relativo = pendentes.pop()
+            try:
+                entradas = os.scandir(os.path.join(self.raiz, relativo))
+            except FileNotFoundError:
+                continue
+            with entradas:
+                for entrada in entradas:
+                    nome = f'{relativo}/{entrada.name}' if relativo else entrada.name
+                    if entrada.is_dir():
+                        pendentes.append(nome)
+                    elif entrada.is_file():
+                        arquivos[nome] = ArquivoEstatico(entrada.path, entrada.stat())
+        return arquivos
+
+    def resolver(self, metodo, caminho, aceita_codificacao='', if_none_match=''):
+        """ (status, cabeçalhos, ArquivoEstatico ou None) da requisição, ou None se não for conosco. """
+        if metodo not in ('GET', 'HEAD') or not caminho.startswith(self.prefixo):
+            return None
+        nome = unquote(caminho[len(self.prefixo):])
+        arquivo = self.arquivos.get(nome)
+        if arquivo is None or nome.endswith(('.gz', '.br')):
+            return None
+
+        tipo, _ = mimetypes.guess_type(nome)
+        tipo = tipo or 'application/octet-stream'
+        if tipo.startswith('text/') or tipo in ('application/javascript', 'application/json'):
+            tipo += '; charset=utf-8'
+        cabecalhos = [
+            ('Content-Type', tipo),
+            ('Cache-Control', CACHE_IMUTAVEL if re_nome_com_hash.search(nome) else CACHE_CURTO),
+        ]
+        codificacoes = codificacoes_aceitas(aceita_codificacao)
+        compactados = [(sufixo, codificacao) for sufixo, codificacao in (('.br', 'br'), ('.gz', 'gzip'))
+                       if nome + sufixo in self.arquivos]
+        if compactados:
+            cabecalhos.append(('Vary', 'Accept-Encoding'))
+        for sufixo, codificacao in compactados:
+            if codificacao in codificacoes:
+                arquivo = self.arquivos[nome + sufixo]
+                cabecalhos.append(('Content-Encoding', codificacao))
+                break
+        cabecalhos.append(('ETag', arquivo.etag))
+        if arquivo.etag in (if_none_match or ''):
+            return 304, cabecalhos, None
+        cabecalhos.append(('Content-Length', str(arquivo.tamanho)))
+        return 200, cabecalhos, (arquivo if metodo == 'GET' else None)
+
+    def __call__(self, *args):
+        if self.assincrono:
+            return self._asgi(*args)
+        return self._wsgi(*args)
+
+    def _wsgi(self, environ, start_response):
+        resolvido = self.resolver(
+            environ.get('REQUEST_METHOD', ''), environ.get('PATH_INFO', ''),
+            environ.get('HTTP_ACCEPT_ENCODING', ''), environ.get('HTTP_IF_NONE_MATCH', ''),
+        )
+        if resolvido is None:
+            return self.aplicacao(environ, start_response)
+        status, cabecalhos, arquivo = resolvido
+        start_response('200 OK' if status == 200 else '304 Not Modified', cabecalhos)
+        if arquivo is None:
+            return []
+        conteudo = open(arquivo.caminho, 'rb')
+        empacotar = environ.get('wsgi.file_wrapper')
+        return empacotar(conteudo, BLOCO) if empacotar else iter(lambda: conteudo.read(BLOCO), b'')
+
+    async def _asgi(self, scope, receive, send):
+        resolvido = None
+        if scope['type'] == 'http':
+            cabecalhos = {nome.decode('latin-1'): valor.decode('latin-1') for nome, valor in scope.get('headers', [])}
+            resolvido = self.resolver(
+                scope['method'], scope['path'], cabecalhos.get('accept-encoding', ''), cabecalhos.get('if-none-match', ''),
+            )
+        if resolvido is None:
+            return await self.aplicacao(scope, receive, send)
+        status, cabecalhos, arquivo = resolvido
+        await send({
+            'type': 'http.response.start', 'status': status,
+            'headers': [(nome.lower().encode('latin-1'), valor.encode('latin-1')) for nome, valor in cabecalhos],
+        })
+        if arquivo is None:
+            return await send({'type': 'http.response.body', 'body': b''})
+        with open(arquivo.caminho, 'rb') as conteudo:
+            while True:
+                bloco = await asyncio.to_thread(conteudo.read, BLOCO)
+                ultimo = len(bloco) < BLOCO
+                await send({'type': 'http.response.body', 'body': bloco, 'more_body': not ultimo})
+                if ultimo:
+                    break
+
+
+def codificacoes_aceitas(cabecalho):
+    """ Codificações de um `Accept-Encoding`, sem as recusadas explicitamente (`q=0`). """
+    aceitas = set()
+    for parte in cabecalho.split(','):
+        codificacao, _, parametros = parte.strip().partition(';')
+        if parametros.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        aceitas.add(codificacao.strip().lower())
+    return aceitas
@@ -0,0 +1,275 @@
+# utils/inventario_midia.py
+"""
+Inventário dos arquivos de mídia: órfãos, ausentes, duplicados e espaço por instituição.
+
+Os valores dos ImageFields (`Instituicao` e `UserProfile`) são lidos do banco
+com `values_list().iterator()` e a árvore de `MEDIA_ROOT` é percorrida com
+`os.scandir`; os dois lados vão, em lotes, para um banco SQLite temporário em
+disco, onde os cruzamentos são feitos em SQL. Assim a memória usada não
+depende do número de arquivos nem de linhas.
+
+Miniaturas (`utils.midia`) pertencem ao original com o mesmo hash: são órfãs
+quando nenhum registro aponta para ele. Arquivos mais novos que
+`idade_minima` nunca são considerados órfãos (um envio pode estar no meio da
+transação que grava o registro).
+"""
+import hashlib
+import os
+import posixpath
+import sqlite3
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db.models import FileField, Q
+
+from instituicao.models import Instituicao
+from usuario.models import UserProfile
+from .midia import DIRETORIO_DERIVADOS, hash_do_nome
+
+LOTE = 2000
+
+# (modelo, caminho até a instituição dona do arquivo)
+MODELOS = ((Instituicao, 'pk'), (UserProfile, 'instituicao_id'))
+
+
+@dataclass
+class Resumo:
+    arquivos: int = 0
+    bytes: int = 0
+    referencias: int = 0
+    orfaos: int = 0
+    bytes_orfaos: int = 0
+    ausentes: int = 0
+    grupos_duplicados: int = 0
+    bytes_duplicados: int = 0
+
+
+def campos_de_arquivo(modelo):
+    return [campo.name for campo in modelo._meta.get_fields() if isinstance(campo, FileField)]
+
+
+class InventarioMidia:
+    """ Use como context manager: o banco temporário é apagado ao sair. """
+
+    def __init__(self, raiz=None, idade_minima=24 * 60 * 60):
+        self.raiz = str(raiz or settings.MEDIA_ROOT)
+        self.limite_mtime = time.time() - idade_minima
+        self.resumo = Resumo()
+        # '' = banco temporário em disco, removido ao fechar a conexão.
+        self.db = sqlite3.connect('')
+        self.db.executescript("""
+            PRAGMA cache_size = -8000;
+            CREATE TABLE arquivos (
+                caminho TEXT PRIMARY KEY, tamanho INTEGER, mtime REAL, hash TEXT, derivado_de TEXT
+            ) WITHOUT ROWID;
+            CREATE TABLE referencias (
+                caminho TEXT, hash TEXT, instituicao_id INTEGER, modelo TEXT, pk INTEGER, campo TEXT
+            );
+        """)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.db.close()
+
+    # --- COLETA ---
+
+    def coletar(self):
+        self._coletar_referencias()
+        self._coletar_arquivos()
+        self.db.executescript("""
+            CREATE INDEX referencias_caminho ON referencias (caminho);
+            CREATE INDEX referencias_hash ON referencias (hash);
+            CREATE INDEX arquivos_derivado ON arquivos (derivado_de);
+            CREATE INDEX arquivos_tamanho ON arquivos (tamanho);
+        """)
+        self._calcular_duplicados()
+        self._resumir()
+        return self.resumo
+
+    def _coletar_referencias(self):
+        for modelo, dono in MODELOS:
+            rotulo = modelo._meta.label
+            for campo in campos_de_arquivo(modelo):
+                linhas = (
+                    modelo.objects.exclude(**{f'{campo}__isnull': True}).exclude(**{campo: ''})
+                    .order_by().values_list('pk', dono, campo).iterator(chunk_size=LOTE)
+                )
+                lote = []
+                for pk, instituicao_id, nome in linhas:
+                    lote.append((nome, hash_do_nome(nome), instituicao_id, rotulo, pk, campo))
+                    if len(lote) >= LOTE:
+                        self._inserir('referencias', lote)
+                        lote = []
+                self._inserir('referencias', lote)
+
+    def _percorrer(self):
+        """ (caminho relativo, stat) de cada arquivo sob a raiz. """
+        pendentes = ['']
+        while pendentes:
+            relativo = pendentes.pop()
+            try:
+                entradas = os.scandir(os.path.join(self.raiz, relativo))
+            except FileNotFoundError:
+                continue
+            with entradas:
+                for entrada in entradas:
+                    caminho = posixpath.join(relativo, entrada.name)
+                    if entrada.is_dir(follow_symlinks=False):
+                        pendentes.append(caminho)
+                    elif entrada.is_file(follow_symlinks=False):
+                        yield caminho, entrada.stat(follow_symlinks=False)
+
+    def _coletar_arquivos(self):
+        lote = []
+        for caminho, estado in self._percorrer():
+            digest = hash_do_nome(caminho)
+            if caminho.startswith(DIRETORIO_DERIVADOS + '/'):
+                linha = (caminho, estado.st_size, estado.st_mtime, None, digest)
+            else:
+                linha = (caminho, estado.st_size, estado.st_mtime, digest, None)
+            lote.append(linha)
+            if len(lote) >= LOTE:
+                self._inserir('arquivos', lote)
+                lote = []
+        self._inserir('arquivos', lote)
+
+    def _inserir(self, tabela, linhas):
+        if linhas:
+            marcadores = ', '.join('?' * len(linhas[0]))
+            self.db.executemany(f'INSERT OR IGNORE INTO {tabela} VALUES ({marcadores})', linhas)
+
+    def _calcular_duplicados(self):
+        """ Calcula o hash dos originais sem hash no nome que têm o mesmo tamanho de outro arquivo. """
+        candidatos = self.db.execute("""
+            SELECT caminho FROM arquivos
+            WHERE hash IS NULL AND derivado_de IS NULL AND tamanho IN (
+                SELECT tamanho FROM arquivos WHERE derivado_de IS NULL GROUP BY tamanho HAVING COUNT(*) > 1
+            )
+        """)
+        # Os hashes vão para outra tabela enquanto a consulta sobre `arquivos` está aberta.
+        self.db.execute('CREATE TEMP TABLE hashes (caminho TEXT PRIMARY KEY, hash TEXT) WITHOUT ROWID')
+        self.db.executemany(
+            'INSERT INTO hashes VALUES (?, ?)',
+            ((caminho, self._hash_do_arquivo(caminho)) for (caminho,) in candidatos),
+        )
+        self.db.execute("""
+            UPDATE arquivos SET hash = hashes.hash FROM hashes WHERE hashes.caminho = arquivos.caminho
+        """)
+
+    def _hash_do_arquivo(self, caminho):
+        digest = hashlib.sha256()
+        try:
+            with open(os.path.join(self.raiz, caminho), 'rb') as arquivo:
+                for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+                    digest.update(bloco)
+        except OSError:
+            return None
+        return digest.hexdigest()
+
+    # --- CONSULTAS ---
+
+    _SQL_ORFAOS = """
+        SELECT caminho, tamanho FROM arquivos a
+        WHERE mtime < :limite AND CASE
+            WHEN derivado_de IS NULL THEN NOT EXISTS (SELECT 1 FROM referencias r WHERE r.caminho = a.caminho)
+            ELSE NOT EXISTS (SELECT 1 FROM referencias r WHERE r.hash = a.derivado_de)
+        END
+        ORDER BY caminho
+    """
+
+    def orfaos(self):
+        """ (caminho, tamanho) dos arquivos sem registro, em ordem. """
+        return self.db.execute(self._SQL_ORFAOS, {'limite': self.limite_mtime})
+
+    def ausentes(self):
+        """ (modelo, pk, campo, caminho) dos registros cujo arquivo não existe. """
+        return self.db.execute("""
+            SELECT modelo, pk, campo, caminho FROM referencias r
+            WHERE NOT EXISTS (SELECT 1 FROM arquivos a WHERE a.caminho = r.caminho)
+            ORDER BY modelo, pk
+        """)
+
+    def duplicados(self):
+        """ (hash, quantidade, bytes, um dos caminhos) dos grupos de arquivos com o mesmo conteúdo. """
+        return self.db.execute("""
+            SELECT hash, COUNT(*), SUM(tamanho), MIN(caminho) FROM arquivos
+            WHERE hash IS NOT NULL GROUP BY hash HAVING COUNT(*) > 1 ORDER BY SUM(tamanho) DESC
+        """)
+
+    def espaco_por_instituicao(self):
+        """
+        (instituicao_id, arquivos, bytes), da que mais ocupa para a que menos:
+        brasões, fotos dos membros e as miniaturas de cada um. Um arquivo
+        compartilhado conta para cada instituição que o usa.
+        """
+        return self.db.execute("""
+            SELECT instituicao_id, COUNT(*), SUM(tamanho) FROM (
+                SELECT r.instituicao_id, a.caminho, a.tamanho
+                FROM referencias r JOIN arquivos a ON a.caminho = r.caminho
+                WHERE r.instituicao_id IS NOT NULL
+                UNION
+                SELECT r.instituicao_id, a.caminho, a.tamanho
+                FROM referencias r JOIN arquivos a ON a.derivado_de = r.hash
+                WHERE r.instituicao_id IS NOT NULL
+            ) GROUP BY instituicao_id ORDER BY SUM(tamanho) DESC
+        """)
+
+    def _resumir(self):
+        r = self.resumo
+        r.arquivos, r.bytes = self.db.execute('SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM arquivos').fetchone()
+        r.referencias = self.db.execute('SELECT COUNT(*) FROM referencias').fetchone()[0]
+        r.orfaos, r.bytes_orfaos = self.db.execute(
+            f'SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM ({self._SQL_ORFAOS})', {'limite': self.limite_mtime}
+        ).fetchone()
+        r.ausentes = self.db.execute(
+            'SELECT COUNT(*) FROM referencias r WHERE NOT EXISTS (SELECT 1 FROM arquivos a WHERE a.caminho = r.caminho)'
+        ).fetchone()[0]
+        for _, quantidade, total, _ in self.duplicados():
+            r.grupos_duplicados += 1
+            r.bytes_duplicados += total - total // quantidade
+
+    # --- LIMPEZA ---
+
+    def apagar_orfaos(self, simular=False, ao_apagar=None):
+        """
+        Apaga os órfãos, conferindo de novo no banco, a cada lote, que nenhum
+        registro passou a usá-los desde a coleta. Retorna (arquivos, bytes).
+        """
+        apagados = bytes_apagados = 0
+        cursor = self.orfaos()
+        while lote := cursor.fetchmany(LOTE // 4):
+            em_uso = _ainda_referenciados([caminho for caminho, _ in lote])
+            for caminho, tamanho in lote:
+                if caminho in em_uso:
+                    continue
+                if not simular:
+                    try:
+                        os.remove(os.path.join(self.raiz, caminho))
+                    except FileNotFoundError:
+                        continue
+                apagados += 1
+                bytes_apagados += tamanho
+                if ao_apagar is not None:
+                    ao_apagar(caminho, tamanho)
+        return apagados, bytes_apagados
+
+
+def _ainda_referenciados(caminhos):
+    """ Dos `caminhos`, os que algum registro usa agora (originais pelo nome, miniaturas pelo hash). """
+    originais = [c for c in caminhos if not c.startswith(DIRETORIO_DERIVADOS + '/')]
+    hashes = {hash_do_nome(c) for c in caminhos if c.startswith(DIRETORIO_DERIVADOS + '/')} - {None}
+    em_uso = set()
+    for modelo, _ in MODELOS:
+        for campo in campos_de_arquivo(modelo):
+            filtro = Q(**{f'{campo}__in': originais})
+            for digest in hashes:
+                filtro |= Q(**{f'{campo}__contains': digest})
+            for nome in modelo.objects.filter(filtro).values_list(campo, flat=True):
+                em_uso.add(nome)
+                digest = hash_do_nome(nome)
+                if digest in hashes:
+                    em_uso.update(c for c in caminhos if hash_do_nome(c) == digest)
+    return em_uso
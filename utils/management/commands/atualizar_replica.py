@@ -0,0 +1,36 @@
+# utils/management/commands/atualizar_replica.py
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from utils.replicas import atualizar_replica, replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Copia o banco primário sobre as réplicas SQLite de REPLICAS_LEITURA com a API de backup '
+        'online do SQLite. Com --intervalo, repete a cópia até ser interrompido.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalo', type=float, help='Segundos entre as cópias (padrão: uma só).')
+        parser.add_argument('--paginas', type=int, default=1024, help='Páginas copiadas por passo do backup.')
+
+    def handle(self, *args, **options):
+        aliases = replicas()
+        if not aliases:
+            raise CommandError('Nenhuma réplica configurada (defina SI_REPLICA_SQLITE).')
+        for alias in aliases:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f'A réplica "{alias}" não é SQLite: use a replicação do próprio banco.')
+
+        while True:
+            for alias in aliases:
+                segundos = atualizar_replica(alias, paginas=options['paginas'])
+                if options['verbosity']:
+                    self.stdout.write(f'{alias}: atualizada em {segundos:.2f} s')
+            if not options['intervalo']:
+                break
+            time.sleep(options['intervalo'])
@@ -0,0 +1,225 @@
+# utils/management/commands/benchmark_carga.py
+
+import json
+import statistics
+import subprocess
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from instituicao.models import Estado, Municipio, Instituicao
+from usuario.models import UserProfile
+
+CENARIOS = [
+    'painel:dashboard',
+    'instituicao:lista_instituicoes',
+    'instituicao:lista_membros',
+    'usuario:user_list',
+    'instituicao:ajax_carregar_municipios',
+    'instituicao:gerenciar_hierarquia',
+]
+
+
+def percentil(ordenados, fracao):
+    return ordenados[max(int(len(ordenados) * fracao) - 1, 0)]
+
+
+def resumir(amostras, duracao):
+    """ Requisições, erros, vazão e latências (ms) de uma lista de (ms, consultas, ok). """
+    tempos = sorted(ms for ms, _, ok in amostras if ok)
+    resumo = {
+        'requisicoes': len(amostras),
+        'erros': sum(1 for *_, ok in amostras if not ok),
+        'vazao': round(len(amostras) / duracao, 1),
+        'consultas_por_requisicao': round(statistics.mean(c for _, c, _ in amostras), 2) if amostras else None,
+    }
+    if tempos:
+        resumo.update({
+            'media_ms': round(statistics.mean(tempos), 2),
+            'p50_ms': round(statistics.median(tempos), 2),
+            'p95_ms': round(percentil(tempos, 0.95), 2),
+            'p99_ms': round(percentil(tempos, 0.99), 2),
+        })
+    return resumo
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Teste de carga em processo: várias threads, cada uma com o seu Client e a sua conexão, '
+        'percorrem as páginas principais e os endpoints AJAX (painel, instituições, membros, '
+        'usuários, municípios, hierarquia) sobre o banco atual (ver gerar_dados). Mostra vazão, '
+        'p50/p95/p99 e consultas por requisição, grava tudo em JSON e compara com um JSON anterior.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--duracao', type=float, default=10, help='Segundos medidos.')
+        parser.add_argument('--aquecimento', type=float, default=2, help='Segundos descartados no início.')
+        parser.add_argument('--instituicao', type=int, help='PK da instituição das páginas de membros e hierarquia (padrão: a com mais membros).')
+        parser.add_argument('--saida', default='benchmark_carga.json', help='Arquivo JSON com os resultados.')
+        parser.add_argument('--comparar', help='JSON de uma execução anterior (ex.: de outro commit).')
+
+    def handle(self, *args, **options):
+        instituicao = self._instituicao(options['instituicao'])
+        estado = Estado.objects.annotate(n=Count('municipios')).order_by('-n').first()
+        if estado is None:
+            raise CommandError('Banco sem estados: rode "python manage.py gerar_dados" antes.')
+        urls = {
+            'painel:dashboard': reverse('painel:dashboard'),
+            'instituicao:lista_instituicoes': reverse('instituicao:lista_instituicoes'),
+            'instituicao:lista_membros': reverse('instituicao:lista_membros', args=[instituicao.pk]),
+            'usuario:user_list': reverse('usuario:user_list'),
+            'instituicao:ajax_carregar_municipios': f"{reverse('instituicao:ajax_carregar_municipios')}?estado_id={estado.pk}",
+            'instituicao:gerenciar_hierarquia': reverse('instituicao:gerenciar_hierarquia', args=[instituicao.pk]),
+        }
+
+        admin = User.objects.create_superuser(f'benchmark_carga_{int(time.time() * 1000)}', password=None)
+        try:
+            with override_settings(ALLOWED_HOSTS=['*'], DEBUG=False):
+                amostras = self._executar(admin, urls, options)
+        finally:
+            admin.delete()
+
+        resultado = {
+            'commit': _commit(),
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'configuracao': {
+                'threads': options['threads'], 'duracao': options['duracao'], 'aquecimento': options['aquecimento'],
+                'instituicao': instituicao.pk, 'estado': estado.uf, 'banco': connection.vendor,
+            },
+            'dados': {
+                'estados': Estado.objects.count(),
+                'municipios': Municipio.objects.count(),
+                'instituicoes': Instituicao.objects.count(),
+                'perfis': UserProfile.objects.count(),
+                'membros_instituicao': instituicao.n,
+            },
+            'cenarios': {nome: resumir(amostras[nome], options['duracao']) for nome in CENARIOS},
+            'total': resumir([a for nome in CENARIOS for a in amostras[nome]], options['duracao']),
+        }
+        with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+
+        anterior = None
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as arquivo:
+                anterior = json.load(arquivo)
+        self._relatorio(resultado, anterior)
+        self.stdout.write(f'\nResultados gravados em {options["saida"]}')
+
+    def _instituicao(self, pk):
+        instituicoes = Instituicao.objects.ativas().annotate(n=Count('userprofile'))
+        if pk is not None:
+            instituicao = instituicoes.filter(pk=pk).first()
+            if instituicao is None:
+                raise CommandError(f'Instituição {pk} não encontrada (ou inativa).')
+            return instituicao
+        instituicao = instituicoes.order_by('-n', 'pk').first()
+        if instituicao is None:
+            raise CommandError('Banco sem instituições: rode "python manage.py gerar_dados" antes.')
+        return instituicao
+
+    def _executar(self, admin, urls, options):
+        # As sessões são criadas antes das threads: logins simultâneos disputariam a escrita no banco.
+        clientes = []
+        for _ in range(options['threads']):
+            cliente = Client()
+            cliente.force_login(admin)
+            clientes.append(cliente)
+
+        amostras = {nome: [] for nome in CENARIOS}
+        trava = threading.Lock()
+        inicio_medicao = time.monotonic() + options['aquecimento']
+        fim = inicio_medicao + options['duracao']
+
+        def trabalhador(deslocamento, cliente):
+            consultas = [0]
+
+            def contar(execute, sql, params, many, context):
+                consultas[0] += 1
+                return execute(sql, params, many, context)
+
+            locais = {nome: [] for nome in CENARIOS}
+            try:
+                with connection.execute_wrapper(contar):
+                    i = deslocamento
+                    while (agora := time.monotonic()) < fim:
+                        nome = CENARIOS[i % len(CENARIOS)]
+                        i += 1
+                        consultas[0] = 0
+                        inicio = time.perf_counter()
+                        try:
+                            ok = cliente.get(urls[nome]).status_code == 200
+                        except Exception:
+                            ok = False
+                        ms = (time.perf_counter() - inicio) * 1000
+                        if agora >= inicio_medicao:
+                            locais[nome].append((ms, consultas[0], ok))
+            finally:
+                connection.close()
+            with trava:
+                for nome, lista in locais.items():
+                    amostras[nome].extend(lista)
+
+        # Cada thread começa num cenário diferente, para não baterem todas na mesma página.
+        threads = [threading.Thread(target=trabalhador, args=(n, cliente)) for n, cliente in enumerate(clientes)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return amostras
+
+    def _relatorio(self, resultado, anterior):
+        dados = resultado['dados']
+        self.stdout.write(
+            f'{dados["perfis"]:,} perfis, {dados["instituicoes"]:,} instituições, {dados["municipios"]:,} municípios; '
+            f'{resultado["configuracao"]["threads"]} threads, {resultado["configuracao"]["duracao"]:g}s\n'
+        )
+        self.stdout.write(f'{"cenário":<38} {"req/s":>8} {"p50":>8} {"p95":>8} {"p99":>8} {"consultas":>10} {"erros":>6}')
+        linhas = [(nome, resultado['cenarios'][nome]) for nome in CENARIOS] + [('total', resultado['total'])]
+        for nome, resumo in linhas:
+            self.stdout.write(
+                f'{nome:<38} {resumo["vazao"]:8.1f} {resumo.get("p50_ms", 0):8.2f} {resumo.get("p95_ms", 0):8.2f} '
+                f'{resumo.get("p99_ms", 0):8.2f} {resumo["consultas_por_requisicao"] or 0:10.2f} {resumo["erros"]:6d}'
+            )
+        if anterior is None:
+            return
+
+        self.stdout.write(f'\nComparado com {anterior.get("commit") or "?"} ({anterior.get("data", "?")}):')
+        self.stdout.write(f'{"cenário":<38} {"req/s":>9} {"p50":>9} {"p95":>9} {"consultas":>10}')
+        anteriores = dict(anterior.get('cenarios', {}), total=anterior.get('total', {}))
+        for nome, resumo in linhas:
+            antes = anteriores.get(nome)
+            if not antes:
+                continue
+            self.stdout.write(
+                f'{nome:<38} {self._variacao(antes, resumo, "vazao")} {self._variacao(antes, resumo, "p50_ms")} '
+                f'{self._variacao(antes, resumo, "p95_ms")} '
+                f'{(resumo["consultas_por_requisicao"] or 0) - (antes.get("consultas_por_requisicao") or 0):+10.2f}'
+            )
+
+    @staticmethod
+    def _variacao(antes, depois, chave):
+        """ Variação percentual de `chave`; '-' quando falta um dos lados. """
+        if not antes.get(chave) or chave not in depois:
+            return f'{"-":>9}'
+        return f'{(depois[chave] - antes[chave]) / antes[chave] * 100:+8.1f}%'
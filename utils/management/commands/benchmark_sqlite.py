@@ -0,0 +1,112 @@
+# utils/management/commands/benchmark_sqlite.py
+
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+BACKENDS = [
+    ('padrão', 'django.db.backends.sqlite3'),
+    ('ajustado', 'core.backends.sqlite3'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara o backend SQLite padrão do Django com o core.backends.sqlite3 sob leituras e '
+        'escritas concorrentes (threads, cada uma com a sua conexão), num banco temporário: '
+        'operações por segundo, p50/p95 e erros "database is locked".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duracao', type=float, default=5, help='Segundos por backend.')
+        parser.add_argument('--leitores', type=int, default=4)
+        parser.add_argument('--escritores', type=int, default=2)
+        parser.add_argument('--linhas', type=int, default=20_000)
+
+    def handle(self, *args, **options):
+        diretorio = tempfile.mkdtemp(prefix='benchmark_sqlite_')
+        try:
+            for rotulo, engine in BACKENDS:
+                alias = f'benchmark_{engine.replace(".", "_")}'
+                self._registrar(alias, engine, os.path.join(diretorio, f'{alias}.sqlite3'))
+                try:
+                    self._popular(alias, options['linhas'])
+                    self._medir(rotulo, alias, options)
+                finally:
+                    connections[alias].close()
+                    del connections.settings[alias]
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+    def _registrar(self, alias, engine, nome):
+        configuradas = connections.configure_settings({'default': {'ENGINE': engine, 'NAME': nome}})
+        connections.settings[alias] = configuradas['default']
+
+    def _popular(self, alias, linhas):
+        with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+            cursor.execute('CREATE TABLE conta (id INTEGER PRIMARY KEY, grupo INTEGER, saldo INTEGER)')
+            cursor.execute('CREATE INDEX conta_grupo ON conta (grupo)')
+            cursor.executemany('INSERT INTO conta (grupo, saldo) VALUES (%s, %s)', [(i % 100, 0) for i in range(linhas)])
+
+    def _medir(self, rotulo, alias, options):
+        linhas = options['linhas']
+        fim = time.monotonic() + options['duracao']
+        resultados = {'leitura': [], 'escrita': []}
+        erros = {'leitura': 0, 'escrita': 0}
+        trava = threading.Lock()
+
+        def ler(cursor):
+            cursor.execute('SELECT COUNT(*), SUM(saldo) FROM conta WHERE grupo = %s', [random.randrange(100)])
+            cursor.fetchone()
+
+        def escrever(cursor):
+            # Lê e depois escreve na mesma transação: o caso em que BEGIN comum gera "database is locked".
+            with transaction.atomic(using=alias):
+                conta = random.randrange(1, linhas + 1)
+                cursor.execute('SELECT saldo FROM conta WHERE id = %s', [conta])
+                saldo = cursor.fetchone()[0]
+                cursor.execute('UPDATE conta SET saldo = %s WHERE id = %s', [saldo + 1, conta])
+
+        def trabalhador(tipo, operacao):
+            tempos, falhas = [], 0
+            try:
+                with connections[alias].cursor() as cursor:
+                    while time.monotonic() < fim:
+                        inicio = time.perf_counter()
+                        try:
+                            operacao(cursor)
+                        except OperationalError:
+                            falhas += 1
+                            continue
+                        tempos.append((time.perf_counter() - inicio) * 1000)
+            finally:
+                connections[alias].close()
+            with trava:
+                resultados[tipo].extend(tempos)
+                erros[tipo] += falhas
+
+        threads = [threading.Thread(target=trabalhador, args=('leitura', ler)) for _ in range(options['leitores'])]
+        threads += [threading.Thread(target=trabalhador, args=('escrita', escrever)) for _ in range(options['escritores'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.stdout.write(f'\n{rotulo} ({connections.settings[alias]["ENGINE"]})')
+        for tipo, tempos in resultados.items():
+            if not tempos:
+                self.stdout.write(f'  {tipo:<8} nenhuma operação concluída, {erros[tipo]} erros')
+                continue
+            tempos.sort()
+            self.stdout.write(
+                f'  {tipo:<8} {len(tempos) / options["duracao"]:9.0f} ops/s   '
+                f'p50 {statistics.median(tempos):7.2f} ms   p95 {tempos[int(len(tempos) * 0.95) - 1]:7.2f} ms   '
+                f'{erros[tipo]} erros'
+            )
@@ -0,0 +1,216 @@
+# utils/management/commands/gerar_dados.py
+
+import itertools
+import random
+import re
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import BigIntegerField, Count, Max
+from django.db.models.functions import Cast, Substr
+
+from instituicao.cache import invalidar_instituicoes, invalidar_municipios
+from instituicao.models import Estado, Municipio, TipoInstituicao, Instituicao, formatar_nome_gerado
+from usuario.autorizacao import invalidar_todas_autorizacoes
+from usuario.models import UserProfile, Cargo, Patente, Funcao
+from usuario.ordenacao import INTERVALO
+
+# UF, nome e número de municípios (IBGE): 5.570 no total.
+ESTADOS = [
+    ('AC', 'Acre', 22), ('AL', 'Alagoas', 102), ('AP', 'Amapá', 16), ('AM', 'Amazonas', 62),
+    ('BA', 'Bahia', 417), ('CE', 'Ceará', 184), ('DF', 'Distrito Federal', 1), ('ES', 'Espírito Santo', 78),
+    ('GO', 'Goiás', 246), ('MA', 'Maranhão', 217), ('MT', 'Mato Grosso', 141), ('MS', 'Mato Grosso do Sul', 79),
+    ('MG', 'Minas Gerais', 853), ('PA', 'Pará', 144), ('PB', 'Paraíba', 223), ('PR', 'Paraná', 399),
+    ('PE', 'Pernambuco', 185), ('PI', 'Piauí', 224), ('RJ', 'Rio de Janeiro', 92), ('RN', 'Rio Grande do Norte', 167),
+    ('RS', 'Rio Grande do Sul', 497), ('RO', 'Rondônia', 52), ('RR', 'Roraima', 15), ('SC', 'Santa Catarina', 295),
+    ('SP', 'São Paulo', 645), ('SE', 'Sergipe', 75), ('TO', 'Tocantins', 139),
+]
+TIPOS = [
+    'Guarda Civil Municipal', 'Polícia Militar', 'Polícia Civil', 'Corpo de Bombeiros Militar',
+    'Defesa Civil', 'Polícia Penal', 'Departamento de Trânsito', 'Polícia Científica',
+]
+CARGOS = ['Agente', 'Inspetor', 'Subinspetor', 'Comandante', 'Subcomandante', 'Corregedor', 'Ouvidor', 'Analista']
+PATENTES = [
+    'Soldado', 'Cabo', 'Terceiro-Sargento', 'Segundo-Sargento', 'Primeiro-Sargento', 'Subtenente', 'Aspirante',
+    'Segundo-Tenente', 'Primeiro-Tenente', 'Capitão', 'Major', 'Tenente-Coronel', 'Coronel',
+]
+FUNCOES = ['Ronda Escolar', 'Patrulha Maria da Penha', 'Canil', 'Ronda Ostensiva', 'Trânsito', 'Central de Monitoramento', 'Administrativo', 'Corregedoria']
+NOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Fábio', 'Gabriela', 'Hugo', 'Isabela', 'João', 'Karina', 'Lucas']
+SOBRENOMES = ['Silva', 'Souza', 'Oliveira', 'Santos', 'Pereira', 'Lima', 'Costa', 'Almeida', 'Ribeiro', 'Gomes']
+
+
+def _nomes(base, quantidade, prefixo):
+    """ Os nomes de `base` e, passando deles, '<prefixo> <n>'. """
+    return [base[i] if i < len(base) else f'{prefixo} {i + 1}' for i in range(quantidade)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera uma massa de dados sintética com bulk_create: os 27 estados e ~5.570 municípios, '
+        'tipos de instituição, instituições com cargos, patentes e funções, e usuários com '
+        'perfil e funções (até 1 milhão). Pode ser rodado de novo para somar dados: estados e '
+        'municípios que já existem são mantidos, e os usuários vão para todas as instituições.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tipos', type=int, default=len(TIPOS))
+        parser.add_argument('--instituicoes', type=int, default=2_000, help='Instituições novas.')
+        parser.add_argument('--cargos', type=int, default=6, help='Por instituição.')
+        parser.add_argument('--patentes', type=int, default=10, help='Por instituição.')
+        parser.add_argument('--funcoes', type=int, default=6, help='Por instituição.')
+        parser.add_argument('--usuarios', type=int, default=10_000, help='Usuários novos, com perfil.')
+        parser.add_argument('--prefixo', default='sint', help='Prefixo do username dos usuários gerados.')
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5_000)
+
+    def handle(self, *args, **options):
+        if options['usuarios'] > 1_000_000:
+            raise CommandError('No máximo 1 milhão de usuários por execução.')
+        self.aleatorio = random.Random(options['semente'])
+        self.batch_size = options['batch_size']
+        self.verbosity = options['verbosity']
+
+        municipios = self._etapa('Estados e municípios', self._localidades)
+        tipos = self._etapa('Tipos de instituição', self._tipos, options['tipos'])
+        instituicoes = self._etapa('Instituições', self._instituicoes, tipos, municipios, options['instituicoes'])
+        self._etapa('Cargos, patentes e funções', self._hierarquia, instituicoes, options)
+        self._etapa('Usuários, perfis e funções', self._usuarios, options)
+
+        invalidar_municipios()
+        invalidar_instituicoes()
+        invalidar_todas_autorizacoes()
+
+    def _etapa(self, titulo, funcao, *args):
+        inicio = time.perf_counter()
+        resultado, criados = funcao(*args)
+        segundos = time.perf_counter() - inicio
+        if self.verbosity:
+            self.stdout.write(f'{titulo}: {criados:,} linhas em {segundos:.1f}s ({criados / max(segundos, 1e-9):,.0f}/s)')
+        return resultado
+
+    def _lotes(self, objetos):
+        objetos = iter(objetos)
+        while lote := list(itertools.islice(objetos, self.batch_size)):
+            yield lote
+
+    def _localidades(self):
+        criados = len(Estado.objects.bulk_create(
+            [Estado(uf=uf, nome=nome) for uf, nome, _ in ESTADOS], ignore_conflicts=True,
+        ))
+        estados = {estado.uf: estado for estado in Estado.objects.all()}
+        existentes = dict(Estado.objects.annotate(n=Count('municipios')).values_list('uf', 'n'))
+        novos = (
+            Municipio(estado=estados[uf], nome=f'Município {uf} {n:03d}')
+            for uf, _, total in ESTADOS if uf in estados
+            for n in range(existentes.get(uf, 0) + 1, total + 1)
+        )
+        with transaction.atomic():
+            for lote in self._lotes(novos):
+                criados += len(Municipio.objects.bulk_create(lote, ignore_conflicts=True))
+        return list(Municipio.objects.select_related('estado').order_by('id')), criados
+
+    def _tipos(self, quantidade):
+        nomes = _nomes(TIPOS, quantidade, 'Tipo Sintético')
+        criados = len(TipoInstituicao.objects.bulk_create([TipoInstituicao(nome=nome) for nome in nomes], ignore_conflicts=True))
+        return list(TipoInstituicao.objects.filter(nome__in=nomes)), criados
+
+    def _instituicoes(self, tipos, municipios, quantidade):
+        """ Pares (tipo, município) ainda sem instituição, espalhados pelos municípios. """
+        existentes = set(Instituicao.objects.values_list('tipo_id', 'municipio_id'))
+        municipios = municipios[:]
+        self.aleatorio.shuffle(municipios)
+        pares = ((tipo, municipio) for tipo in tipos for municipio in municipios)
+        novas = (
+            Instituicao(tipo=tipo, municipio=municipio, nome_gerado=formatar_nome_gerado(tipo.nome, municipio.nome, municipio.estado.uf))
+            for tipo, municipio in itertools.islice((par for par in pares if (par[0].pk, par[1].pk) not in existentes), quantidade)
+        )
+        criadas = []
+        with transaction.atomic():
+            for lote in self._lotes(novas):
+                criadas += Instituicao.objects.bulk_create(lote)
+        return criadas, len(criadas)
+
+    def _hierarquia(self, instituicoes, options):
+        cargos = _nomes(CARGOS, options['cargos'], 'Cargo')
+        patentes = _nomes(PATENTES, options['patentes'], 'Patente')
+        funcoes = _nomes(FUNCOES, options['funcoes'], 'Função')
+        criados = 0
+        with transaction.atomic():
+            for lote in self._lotes(instituicoes):
+                for modelo, nomes in ((Cargo, cargos), (Patente, patentes), (Funcao, funcoes)):
+                    criados += len(modelo.objects.bulk_create([
+                        modelo(instituicao=instituicao, nome=nome, **({'ordem': (i + 1) * INTERVALO} if modelo is Patente else {}))
+                        for instituicao in lote for i, nome in enumerate(nomes)
+                    ], batch_size=self.batch_size))
+        return None, criados
+
+    def _mapa_hierarquia(self):
+        """ {instituicao_id: ([cargos], [patentes], [funções])} de todas as instituições ativas. """
+        mapa = {pk: ([], [], []) for pk in Instituicao.objects.ativas().order_by('pk').values_list('pk', flat=True)}
+        for posicao, modelo in enumerate((Cargo, Patente, Funcao)):
+            for pk, instituicao_id in modelo.objects.filter(instituicao_id__in=mapa).values_list('pk', 'instituicao_id').iterator(chunk_size=self.batch_size):
+                mapa[instituicao_id][posicao].append(pk)
+        return mapa
+
+    @staticmethod
+    def _proximo_indice(prefixo):
+        """
+        Índice seguinte ao maior sufixo numérico já usado com `prefixo`: contar
+        os usuários colidiria com os existentes se algum gerado antes tiver sido
+        apagado ou se outros usernames compartilharem o prefixo.
+        """
+        ultimo = User.objects.filter(username__regex=rf'^{re.escape(prefixo)}[0-9]+$').aggregate(
+            ultimo=Max(Cast(Substr('username', len(prefixo) + 1), BigIntegerField()))
+        )['ultimo']
+        return 0 if ultimo is None else ultimo + 1
+
+    def _usuarios(self, options):
+        """
+        Usuários com perfil nas instituições ativas, com distribuição desigual
+        (poucas instituições grandes, muitas pequenas, como em produção).
+        """
+        hierarquia = self._mapa_hierarquia()
+        if not hierarquia or not options['usuarios']:
+            return None, 0
+        instituicoes = list(hierarquia)
+        acumulados = list(itertools.accumulate(1 / (i + 1) for i in range(len(instituicoes))))
+        prefixo = options['prefixo']
+        inicio = self._proximo_indice(prefixo)
+        status = [UserProfile.StatusVinculo.ATIVO] * 8 + [UserProfile.StatusVinculo.PENDENTE, UserProfile.StatusVinculo.SEM_VINCULO]
+        Vinculo = UserProfile.funcoes.through
+        criados = 0
+        for primeiro in range(inicio, inicio + options['usuarios'], self.batch_size):
+            quantidade = min(self.batch_size, inicio + options['usuarios'] - primeiro)
+            with transaction.atomic():
+                usuarios = User.objects.bulk_create([
+                    User(
+                        username=f'{prefixo}{i:07d}', email=f'{prefixo}{i}@example.com', password='!',
+                        first_name=self.aleatorio.choice(NOMES), last_name=self.aleatorio.choice(SOBRENOMES),
+                    )
+                    for i in range(primeiro, primeiro + quantidade)
+                ])
+                perfis = []
+                for usuario, instituicao_id in zip(usuarios, self.aleatorio.choices(instituicoes, cum_weights=acumulados, k=quantidade)):
+                    cargos, patentes, _ = hierarquia[instituicao_id]
+                    perfis.append(UserProfile(
+                        user_id=usuario.pk, instituicao_id=instituicao_id,
+                        cargo_id=self.aleatorio.choice(cargos) if cargos else None,
+                        patente_id=self.aleatorio.choice(patentes) if patentes else None,
+                        status_vinculo=self.aleatorio.choice(status),
+                        is_admin_instituicao=self.aleatorio.random() < 0.02,
+                    ))
+                perfis = UserProfile.objects.bulk_create(perfis)
+                vinculos = []
+                for perfil in perfis:
+                    funcoes = hierarquia[perfil.instituicao_id][2]
+                    vinculos += [
+                        Vinculo(userprofile_id=perfil.pk, funcao_id=funcao)
+                        for funcao in self.aleatorio.sample(funcoes, min(self.aleatorio.randint(0, 2), len(funcoes)))
+                    ]
+                Vinculo.objects.bulk_create(vinculos, batch_size=self.batch_size)
+            criados += len(usuarios) + len(perfis) + len(vinculos)
+            if self.verbosity > 1:
+                self.stdout.write(f'  {primeiro - inicio + quantidade:,} usuários')
+        return None, criados
@@ -0,0 +1,79 @@
+# utils/management/commands/limpar_midia.py
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from instituicao.models import Instituicao
+from utils.inventario_midia import InventarioMidia
+
+
+class Command(BaseCommand):
+    help = (
+        'Confere os arquivos de MEDIA_ROOT contra os brasões e fotos gravados no banco: lista '
+        'órfãos (sem registro), ausentes (registro sem arquivo), duplicados (mesmo conteúdo) e o '
+        'espaço usado por instituição. Com --apagar, remove os órfãos (--simular só mostra quais).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--apagar', action='store_true', help='Apaga os arquivos órfãos.')
+        parser.add_argument('--simular', action='store_true', help='Com --apagar, lista o que seria apagado sem apagar.')
+        parser.add_argument(
+            '--idade-minima', type=float, default=24,
+            help='Horas: arquivos mais novos que isso nunca são tratados como órfãos.',
+        )
+        parser.add_argument('--exemplos', type=int, default=20, help='Quantos itens listar em cada seção.')
+        parser.add_argument('--raiz', help='Diretório a conferir (padrão: MEDIA_ROOT).')
+
+    def handle(self, *args, **options):
+        exemplos = options['exemplos']
+        with InventarioMidia(options['raiz'], idade_minima=options['idade_minima'] * 3600) as inventario:
+            resumo = inventario.coletar()
+            self.stdout.write(
+                f'{resumo.arquivos} arquivo(s), {filesizeformat(resumo.bytes)}; {resumo.referencias} referência(s) no banco.'
+            )
+
+            self._secao(f'Órfãos: {resumo.orfaos} ({filesizeformat(resumo.bytes_orfaos)})', (
+                f'  {caminho} ({filesizeformat(tamanho)})' for caminho, tamanho in inventario.orfaos()
+            ), resumo.orfaos, exemplos)
+            self._secao(f'Ausentes: {resumo.ausentes}', (
+                f'  {modelo} #{pk} {campo}: {caminho}' for modelo, pk, campo, caminho in inventario.ausentes()
+            ), resumo.ausentes, exemplos)
+            self._secao(
+                f'Duplicados: {resumo.grupos_duplicados} grupo(s), {filesizeformat(resumo.bytes_duplicados)} a mais',
+                (f'  {digest[:12]}: {quantidade} cópias de {caminho} ({filesizeformat(total)})'
+                 for digest, quantidade, total, caminho in inventario.duplicados()),
+                resumo.grupos_duplicados, exemplos,
+            )
+            self._espaco_por_instituicao(inventario, exemplos)
+
+            if options['apagar'] and resumo.orfaos:
+                self._apagar(inventario, options['simular'], options['verbosity'])
+            elif resumo.orfaos:
+                self.stdout.write(self.style.WARNING('Use --apagar para remover os órfãos.'))
+
+    def _secao(self, titulo, linhas, total, exemplos):
+        self.stdout.write(titulo)
+        for posicao, linha in enumerate(linhas):
+            if posicao == exemplos:
+                self.stdout.write(f'  ... e mais {total - exemplos}.')
+                break
+            self.stdout.write(linha)
+
+    def _espaco_por_instituicao(self, inventario, exemplos):
+        maiores = inventario.espaco_por_instituicao().fetchmany(exemplos)
+        self.stdout.write('Espaço por instituição (brasões, fotos dos membros e miniaturas):')
+        nomes = Instituicao.objects.in_bulk([pk for pk, _, _ in maiores])
+        for pk, arquivos, total in maiores:
+            nome = nomes[pk].nome_gerado if pk in nomes else f'#{pk} (excluída)'
+            self.stdout.write(f'  {nome}: {arquivos} arquivo(s), {filesizeformat(total)}')
+
+    def _apagar(self, inventario, simular, verbosidade):
+        def ao_apagar(caminho, tamanho):
+            if simular or verbosidade > 1:
+                self.stdout.write(f'  {"apagaria" if simular else "apagado"}: {caminho}')
+
+        arquivos, total = inventario.apagar_orfaos(simular=simular, ao_apagar=ao_apagar)
+        if simular:
+            self.stdout.write(self.style.WARNING(f'{arquivos} órfão(s) ({filesizeformat(total)}) seriam apagados.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{arquivos} órfão(s) apagado(s), {filesizeformat(total)} liberados.'))
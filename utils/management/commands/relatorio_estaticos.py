@@ -0,0 +1,49 @@
+# utils/management/commands/relatorio_estaticos.py
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from utils.estaticos import ArmazenamentoEstaticoComprimido
+
+
+class Command(BaseCommand):
+    help = (
+        'Mostra os bytes economizados pelo último collectstatic com o ArmazenamentoEstaticoComprimido: '
+        'compactação .gz/.br dos arquivos de texto e otimização e versões WebP das imagens.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exemplos', type=int, default=10, help='Quantos arquivos listar em cada seção.')
+
+    def handle(self, *args, **options):
+        relatorio = ArmazenamentoEstaticoComprimido().ler_relatorio()
+        compactados, imagens = relatorio['compactados'], relatorio['imagens']
+        if not compactados and not imagens:
+            self.stdout.write(self.style.WARNING('Nenhum relatório encontrado: rode o collectstatic com DEBUG = False.'))
+            return
+
+        original = sum(t['original'] for t in compactados.values())
+        self.stdout.write(f'Arquivos compactados: {len(compactados)}, {filesizeformat(original)} sem compactação')
+        for sufixo in ('gz', 'br'):
+            # Sem a variante, o cliente recebe o original.
+            total = sum(t.get(sufixo, t['original']) for t in compactados.values())
+            if any(sufixo in t for t in compactados.values()):
+                self.stdout.write(f'  .{sufixo}: {filesizeformat(total)} ({self._economia(original, total)})')
+        maiores = sorted(compactados.items(), key=lambda item: item[1]['original'] - item[1].get('gz', item[1]['original']), reverse=True)
+        for nome, t in maiores[:options['exemplos']]:
+            self.stdout.write(f'  {nome}: {filesizeformat(t["original"])} -> {filesizeformat(t.get("gz", t["original"]))} (.gz)')
+
+        original = sum(t['original'] for t in imagens.values())
+        otimizado = sum(t['otimizado'] for t in imagens.values())
+        webp = sum(t['webp'][max(t['webp'], key=int)] for t in imagens.values())
+        self.stdout.write(f'Imagens: {len(imagens)}, {filesizeformat(original)} originais')
+        self.stdout.write(f'  otimizadas (mesmo formato): {filesizeformat(otimizado)} ({self._economia(original, otimizado)})')
+        self.stdout.write(f'  WebP no tamanho original: {filesizeformat(webp)} ({self._economia(original, webp)})')
+        for nome, t in sorted(imagens.items(), key=lambda item: item[1]['original'], reverse=True)[:options['exemplos']]:
+            variantes = ', '.join(f'{largura}w {filesizeformat(tamanho)}' for largura, tamanho in sorted(t['webp'].items(), key=lambda v: int(v[0])))
+            self.stdout.write(f'  {nome}: {filesizeformat(t["original"])} -> {filesizeformat(t["otimizado"])}; WebP {variantes}')
+
+    def _economia(self, antes, depois):
+        if not antes:
+            return '0%'
+        return f'{filesizeformat(antes - depois)} a menos, -{(antes - depois) / antes:.0%}'
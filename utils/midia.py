@@ -0,0 +1,173 @@
+# utils/midia.py
+"""
+Armazenamento de imagens por conteúdo (brasões e fotos de perfil).
+
+O nome de cada arquivo enviado é o SHA-256 do seu conteúdo
+(`brasoes/ab/ab12...ef.png`), com a extensão do formato detectado na imagem
+(não a do nome enviado): reenviar uma imagem idêntica não grava nada, só
+aponta para o arquivo que já existe. Miniaturas de tamanho fixo em WebP e PNG
+(`derivados/ab/ab12...ef-96.webp`) são geradas em segundo plano
+(`utils.tarefas`), para originais novos e também quando um original existente
+ainda não tem todas (ex.: falha anterior ou tamanhos novos em `TAMANHOS`).
+Duas tarefas do mesmo conteúdo podem concorrer: cada miniatura só é gravada
+se o seu nome determinístico ainda estiver livre, e a cópia com sufixo que o
+storage criaria numa colisão é descartada. Como o conteúdo de uma URL nunca
+muda, originais e miniaturas podem ser servidos com cache imutável (ver
+`servir_midia` e o template tag `miniatura`).
+"""
+import hashlib
+import io
+import logging
+import os
+import posixpath
+import re
+
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils.deconstruct import deconstructible
+
+from .tarefas import agendar
+
+logger = logging.getLogger(__name__)
+
+# Lado (px) do quadrado de cada miniatura: o dobro do tamanho exibido, para telas de alta densidade.
+TAMANHOS = {'p': 96, 'm': 160, 'g': 320}
+FORMATOS = ('webp', 'png')
+DIRETORIO_DERIVADOS = 'derivados'
+
+# Extensão gravada para cada formato detectado pelo Pillow.
+EXTENSOES = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp', 'BMP': '.bmp', 'TIFF': '.tif'}
+
+re_endereco_conteudo = re.compile(r'(?:^|/)([0-9a-f]{2})/(\1[0-9a-f]{62})(?:-\d+)?\.\w+$')
+
+
+def calcular_hash(conteudo):
+    """ SHA-256 (hex) de um arquivo, lido em blocos. """
+    digest = hashlib.sha256()
+    if hasattr(conteudo, 'seek'):
+        conteudo.seek(0)
+    for bloco in conteudo.chunks():
+        digest.update(bloco)
+    conteudo.seek(0)
+    return digest.hexdigest()
+
+
+def hash_do_nome(nome):
+    """ Hash de um nome endereçado por conteúdo, ou None para nomes comuns (arquivos antigos). """
+    encontrado = re_endereco_conteudo.search(str(nome or ''))
+    return encontrado.group(2) if encontrado else None
+
+
+def caminho_derivado(digest, tamanho, formato):
+    return posixpath.join(DIRETORIO_DERIVADOS, digest[:2], f'{digest}-{TAMANHOS[tamanho]}.{formato}')
+
+
+def derivados_faltando(digest, armazenamento):
+    """ [(tamanho, formato)] das miniaturas do original `digest` que ainda não existem. """
+    return [
+        (tamanho, formato) for tamanho in TAMANHOS for formato in FORMATOS
+        if not armazenamento.exists(caminho_derivado(digest, tamanho, formato))
+    ]
+
+
+def extensao_da_imagem(conteudo, nome):
+    """ Extensão do formato detectado no conteúdo; a do nome (minúscula) se não for uma imagem conhecida. """
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        conteudo.seek(0)
+        formato = Image.open(conteudo).format
+    except (OSError, UnidentifiedImageError):
+        formato = None
+    finally:
+        conteudo.seek(0)
+    return EXTENSOES.get(formato) or os.path.splitext(nome)[1].lower()
+
+
+@deconstructible
+class ArmazenamentoPorConteudo(FileSystemStorage):
+    """ FileSystemStorage que nomeia os arquivos pelo hash do conteúdo e não grava duplicatas. """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = calcular_hash(content)
+        extensao = extensao_da_imagem(content, name)
+        nome = posixpath.join(posixpath.dirname(name.replace('\\', '/')), digest[:2], digest + extensao)
+        if not self.exists(nome):
+            nome = super().save(nome, content, max_length=max_length)
+        elif not derivados_faltando(digest, self):
+            return nome
+        agendar(gerar_derivados, nome)
+        return nome
+
+
+armazenamento_por_conteudo = ArmazenamentoPorConteudo()
+
+
+def gerar_derivados(nome, armazenamento=None):
+    """ Gera as miniaturas que faltam para o original `nome`. Retorna quantas foram gravadas. """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    armazenamento = armazenamento or default_storage
+    digest = hash_do_nome(nome)
+    if digest is None:
+        return 0
+    faltando = derivados_faltando(digest, armazenamento)
+    if not faltando:
+        return 0
+    try:
+        with armazenamento.open(nome) as arquivo:
+            original = ImageOps.exif_transpose(Image.open(arquivo))
+            original = original.convert('RGBA')
+    except (OSError, UnidentifiedImageError):
+        logger.warning('Não foi possível gerar miniaturas de %s.', nome, exc_info=True)
+        return 0
+    gravadas = 0
+    for tamanho, formato in faltando:
+        caminho = caminho_derivado(digest, tamanho, formato)
+        if armazenamento.exists(caminho):  # gravada por outra tarefa enquanto esta trabalhava
+            continue
+        miniatura = ImageOps.contain(original, (TAMANHOS[tamanho], TAMANHOS[tamanho]), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        if formato == 'webp':
+            miniatura.save(buffer, 'WEBP', quality=85, method=6)
+        else:
+            miniatura.save(buffer, 'PNG', optimize=True)
+        gravado = armazenamento.save(caminho, ContentFile(buffer.getvalue()))
+        if gravado != caminho:
+            # Perdeu a corrida entre o exists() e o save(): o storage gravou com
+            # sufixo um arquivo que nenhuma URL referencia.
+            armazenamento.delete(gravado)
+            continue
+        gravadas += 1
+    return gravadas
+
+
+# Miniaturas já vistas no disco (são imutáveis): evita um stat por renderização.
+_derivados_existentes = set()
+LIMITE_DERIVADOS_CONHECIDOS = 10_000
+
+
+def url_miniatura(arquivo, tamanho='p', formato='webp'):
+    """
+    URL da miniatura de um ImageField (ou nome de arquivo). Enquanto ela não
+    existe (ou para arquivos antigos, sem hash no nome), devolve a URL do
+    original. '' se não houver arquivo.
+    """
+    nome = getattr(arquivo, 'name', arquivo)
+    if not nome:
+        return ''
+    digest = hash_do_nome(nome)
+    if digest is None:
+        return default_storage.url(nome)
+    caminho = caminho_derivado(digest, tamanho, formato)
+    if caminho not in _derivados_existentes:
+        if not default_storage.exists(caminho):
+            return default_storage.url(nome)
+        if len(_derivados_existentes) >= LIMITE_DERIVADOS_CONHECIDOS:
+            _derivados_existentes.clear()
+        _derivados_existentes.add(caminho)
+    return default_storage.url(caminho)
@@ -0,0 +1,119 @@
+# utils/paginacao.py
+"""
+Paginação por cursor (keyset / seek).
+
+Em vez de OFFSET, cada página é buscada a partir dos valores de ordenação da
+última linha da página anterior (`WHERE (a, b) > (x, y) ORDER BY a, b LIMIT n`).
+Com um índice que cubra a ordenação, o custo de qualquer página é o mesmo,
+independente do tamanho da tabela ou de quão "funda" ela esteja. Não há
+contagem total nem saltos para uma página arbitrária: só "próxima".
+"""
+import base64
+import json
+from dataclasses import dataclass
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+@dataclass
+class PaginaKeyset:
+    itens: list
+    proximo: str = None  # cursor da próxima página; None na última
+
+    @property
+    def tem_proxima(self):
+        return self.proximo is not None
+
+
+def codificar_cursor(valores):
+    dados = json.dumps(list(valores), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(dados).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor, quantidade):
+    """ Valores do cursor, ou None se ele estiver ausente ou malformado. """
+    if not cursor:
+        return None
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        return None
+    if not isinstance(valores, list) or len(valores) != quantidade:
+        return None
+    return valores
+
+
+def _campo_do_modelo(modelo, caminho):
+    partes = caminho.split('__')
+    for parte in partes[:-1]:
+        modelo = modelo._meta.get_field(parte).related_model
+    return modelo._meta.get_field(partes[-1])
+
+
+def validar_cursor(modelo, campos, valores):
+    """
+    Converte os valores do cursor para o tipo de cada campo de ordenação, ou
+    retorna None se algum não servir (cursor adulterado): `null` ou um texto
+    num campo numérico viram a primeira página, em vez de erro na consulta.
+    """
+    convertidos = []
+    for campo, valor in zip(campos, valores):
+        if valor is None or isinstance(valor, (list, dict)):
+            return None
+        try:
+            convertidos.append(_campo_do_modelo(modelo, campo).to_python(valor))
+        except (ValidationError, TypeError, ValueError):
+            return None
+    return convertidos
+
+
+def _valor(obj, campo):
+    for parte in campo.split('__'):
+        obj = obj[parte] if isinstance(obj, dict) else getattr(obj, parte)
+    return obj
+
+
+def filtro_apos(campos, valores):
+    """
+    Q equivalente a `(campos) > (valores)` em ordem lexicográfica. O limite
+    redundante `campos[0] >= valores[0]` permite ao banco percorrer o índice
+    do primeiro campo a partir do cursor, em vez de unir os ramos do OR e
+    ordenar o resultado.
+    """
+    condicao = Q()
+    for i, campo in enumerate(campos):
+        iguais = {c: v for c, v in zip(campos[:i], valores[:i])}
+        condicao |= Q(**iguais, **{f'{campo}__gt': valores[i]})
+    return Q(**{f'{campos[0]}__gte': valores[0]}) & condicao
+
+
+def paginar_keyset(queryset, campos, cursor=None, tamanho=50):
+    """
+    Retorna a página de `queryset` que vem depois de `cursor`, em ordem
+    crescente de `campos` (o último deve ser único, ex.: 'id'). Os campos podem
+    atravessar relações ('user__username'); os objetos da página devem tê-las
+    carregadas (`select_related`) para que o próximo cursor não gere consultas.
+    """
+    campos = tuple(campos)
+    valores = decodificar_cursor(cursor, len(campos))
+    if valores is not None:
+        valores = validar_cursor(queryset.model, campos, valores)
+    if valores is not None:
+        queryset = queryset.filter(filtro_apos(campos, valores))
+    itens = list(queryset.order_by(*campos)[:tamanho + 1])
+    proximo = None
+    if len(itens) > tamanho:
+        itens = itens[:tamanho]
+        proximo = codificar_cursor(_valor(itens[-1], campo) for campo in campos)
+    return PaginaKeyset(itens=itens, proximo=proximo)
+
+
+def url_proxima_pagina(request, pagina):
+    """ Query string da próxima página (mantendo os filtros da requisição), ou None na última. """
+    if not pagina.tem_proxima:
+        return None
+    parametros = request.GET.copy()
+    parametros['cursor'] = pagina.proximo
+    parametros.pop('formato', None)
+    return f'?{parametros.urlencode()}'
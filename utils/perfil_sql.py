@@ -0,0 +1,168 @@
+# utils/perfil_sql.py
+"""
+Perfil das consultas SQL de cada requisição (opcional, para produção).
+
+Ativado com `PERFIL_SQL_AMOSTRAGEM` (variável de ambiente `SI_PERFIL_SQL`):
+a fração das requisições que é medida, de 0 (desligado: o middleware sai da
+cadeia com `MiddlewareNotUsed`) a 1 (todas).
+
+Numa requisição sorteada, todas as consultas passam por um
+`connection.execute_wrapper` que anota o tempo e a "impressão digital" da
+consulta (o SQL com valores, listas de `IN` e linhas de `VALUES` trocados por
+`?`). Ao final:
+- a resposta ganha o cabeçalho `Server-Timing` (`db` e, se houver, `n1`),
+  visível na aba de rede do navegador;
+- uma linha de log JSON (logger `utils.perfil_sql`) registra view, número de
+  consultas, tempo no banco, consultas repetidas com os mesmos parâmetros e
+  os padrões N+1: a mesma impressão digital executada `PERFIL_SQL_LIMITE_N1`
+  vezes ou mais, com a pilha (templates e código do projeto) que a disparou.
+"""
+import functools
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+LIMITE_N1 = 5
+PROFUNDIDADE_PILHA = 8
+
+_literais = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+@functools.lru_cache(maxsize=2048)
+def impressao_digital(sql):
+    """ SQL sem valores: consultas que só diferem nos parâmetros têm a mesma impressão. """
+    for padrao, troca in _literais:
+        sql = padrao.sub(troca, sql)
+    return sql.strip()
+
+
+def _pilha():
+    """ Templates (nome:linha) e código do projeto que levaram à consulta, do mais interno para fora. """
+    raiz = str(settings.BASE_DIR) + os.sep
+    pilha = []
+    quadro = sys._getframe(2)
+    while quadro is not None and len(pilha) < PROFUNDIDADE_PILHA:
+        codigo = quadro.f_code
+        if codigo.co_name == 'render_annotated':
+            # django.template.base.Node.render_annotated: o nó do template sendo renderizado.
+            no = quadro.f_locals.get('self')
+            origem, token = getattr(no, 'origin', None), getattr(no, 'token', None)
+            if origem is not None and token is not None:
+                local = f'{origem.template_name or origem.name}:{token.lineno}'
+                if local not in pilha:
+                    pilha.append(local)
+        elif codigo.co_filename.startswith(raiz) and 'site-packages' not in codigo.co_filename:
+            pilha.append(f'{os.path.relpath(codigo.co_filename, raiz)}:{quadro.f_lineno} ({codigo.co_name})')
+        quadro = quadro.f_back
+    return pilha
+
+
+class PerfilSQL:
+    """ Execute wrapper que acumula as consultas de uma requisição. """
+
+    def __init__(self, limite_n1=LIMITE_N1):
+        self.limite_n1 = limite_n1
+        self.consultas = 0
+        self.duracao = 0.0
+        self.por_impressao = Counter()
+        self.exemplos = {}
+        self.pilhas = {}
+        self.identicas = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duracao += time.perf_counter() - inicio
+            self.consultas += 1
+            impressao = impressao_digital(sql)
+            self.por_impressao[impressao] += 1
+            self.identicas[(sql, repr(params))] += 1
+            vezes = self.por_impressao[impressao]
+            if vezes == 1:
+                self.exemplos[impressao] = sql
+            elif vezes == self.limite_n1:
+                # A pilha só é capturada quando o padrão aparece: custo zero nas demais consultas.
+                self.pilhas[impressao] = _pilha()
+
+    @property
+    def duplicadas(self):
+        """ Consultas repetidas com os mesmos parâmetros (cada repetição além da primeira). """
+        return sum(vezes - 1 for vezes in self.identicas.values())
+
+    def padroes_n1(self):
+        return [
+            {
+                'id': hashlib.sha1(impressao.encode()).hexdigest()[:10],
+                'vezes': self.por_impressao[impressao],
+                'sql': self.exemplos[impressao][:300],
+                'pilha': pilha,
+            }
+            for impressao, pilha in self.pilhas.items()
+        ]
+
+
+class PerfilSQLMiddleware:
+    """ Mede as consultas de uma amostra das requisições. Deve ser o primeiro da lista, depois do SecurityMiddleware. """
+
+    def __init__(self, get_response):
+        self.amostragem = getattr(settings, 'PERFIL_SQL_AMOSTRAGEM', 0)
+        if not self.amostragem:
+            raise MiddlewareNotUsed
+        self.limite_n1 = getattr(settings, 'PERFIL_SQL_LIMITE_N1', LIMITE_N1)
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= self.amostragem:
+            return self.get_response(request)
+
+        perfil = PerfilSQL(self.limite_n1)
+        inicio = time.perf_counter()
+        with ExitStack() as pilha:
+            for conexao in connections.all():
+                pilha.enter_context(conexao.execute_wrapper(perfil))
+            resposta = self.get_response(request)
+        total = time.perf_counter() - inicio
+
+        n1 = perfil.padroes_n1()
+        metricas = [f'db;dur={perfil.duracao * 1000:.1f};desc="{perfil.consultas} consultas"']
+        if n1:
+            metricas.append(f'n1;desc="{len(n1)} padrões N+1"')
+        if resposta.has_header('Server-Timing'):
+            metricas.insert(0, resposta['Server-Timing'])
+        resposta['Server-Timing'] = ', '.join(metricas)
+
+        dados = {
+            'metodo': request.method,
+            'caminho': request.path,
+            'view': getattr(getattr(request, 'resolver_match', None), 'view_name', None),
+            'status': resposta.status_code,
+            'duracao_ms': round(total * 1000, 1),
+            'consultas': perfil.consultas,
+            'db_ms': round(perfil.duracao * 1000, 1),
+            'duplicadas': perfil.duplicadas,
+            'n1': n1,
+        }
+        logger.log(logging.WARNING if n1 else logging.INFO, 'perfil_sql %s', json.dumps(dados, ensure_ascii=False), extra={'perfil_sql': dados})
+        return resposta
@@ -0,0 +1,195 @@
+# utils/replicas.py
+"""
+Leituras em réplicas, escritas no primário (`default`).
+
+Opcional: ativado em `core/settings.py` quando a variável de ambiente
+`SI_REPLICA_SQLITE` aponta para o arquivo da réplica (`REPLICAS_LEITURA`).
+
+`ReplicaMiddleware` libera a réplica só para requisições seguras (GET, HEAD,
+OPTIONS) de views não fixadas no primário (`usar_primario` /
+`UsarPrimarioMixin`). Depois de um POST (ou outro método que escreve), a
+sessão guarda um prazo de `REPLICA_JANELA_PRIMARIO` segundos durante o qual
+as leituras daquele usuário continuam no primário: ele vê o que acabou de
+gravar mesmo que a réplica ainda não tenha recebido a mudança.
+
+`RoteadorReplicas` manda as leituras liberadas a uma réplica (rodízio) e
+todo o resto ao primário: escritas, leituras dentro de `atomic`, comandos,
+tarefas em segundo plano. Fora de uma requisição, nada vai para a réplica.
+
+Localmente, a réplica é um segundo arquivo SQLite copiado do primário pela
+API de backup online do SQLite (`atualizar_replica` e o comando de mesmo
+nome). As consultas executadas em cada alias são contadas por processo
+(`metricas()`, view `utils:metricas_banco`).
+"""
+import contextvars
+import itertools
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS')
+CHAVE_SESSAO = 'replica:primario_ate'
+JANELA_PRIMARIO = 10  # segundos
+
+_leitura_liberada = contextvars.ContextVar('leitura_em_replica', default=False)
+_rodizio = itertools.count()
+
+_trava_metricas = threading.Lock()
+_consultas = Counter()
+_decisoes = Counter()
+
+
+def replicas():
+    return list(getattr(settings, 'REPLICAS_LEITURA', ()))
+
+
+def _contar(contador, chave):
+    with _trava_metricas:
+        contador[chave] += 1
+
+
+def metricas():
+    """ Consultas executadas por alias e decisões do roteador, desde o início do processo. """
+    with _trava_metricas:
+        return {'consultas': dict(_consultas), 'decisoes': dict(_decisoes)}
+
+
+def zerar_metricas():
+    with _trava_metricas:
+        _consultas.clear()
+        _decisoes.clear()
+
+
+@contextmanager
+def leitura_em_replica(liberada=True):
+    """ Libera (ou proíbe, com `liberada=False`) leituras em réplica no bloco. """
+    token = _leitura_liberada.set(liberada)
+    try:
+        yield
+    finally:
+        _leitura_liberada.reset(token)
+
+
+def primario():
+    """ Força o primário no bloco (ex.: ler logo depois de gravar numa view GET). """
+    return leitura_em_replica(False)
+
+
+class RoteadorReplicas:
+
+    def db_for_read(self, model, **hints):
+        disponiveis = replicas()
+        if not disponiveis or not _leitura_liberada.get():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Dentro de uma transação, a leitura precisa ver o que ela gravou.
+            _contar(_decisoes, 'primario_transacao')
+            return DEFAULT_DB_ALIAS
+        _contar(_decisoes, 'replica')
+        return disponiveis[next(_rodizio) % len(disponiveis)]
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplicas têm os mesmos dados do primário.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replicas()
+
+
+# --- VIEWS FIXADAS NO PRIMÁRIO ---
+
+def usar_primario(view):
+    """ Decorator: a view sempre lê do primário. """
+    @wraps(view)
+    def envolvida(*args, **kwargs):
+        return view(*args, **kwargs)
+    envolvida.usar_primario = True
+    return envolvida
+
+
+class UsarPrimarioMixin:
+    """ Mixin de CBV: a view sempre lê do primário. """
+    usar_primario = True
+
+
+class ReplicaMiddleware:
+    """ Decide, por requisição, se as leituras podem ir para uma réplica. Deve vir depois do SessionMiddleware. """
+
+    def __init__(self, get_response):
+        if not replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.janela = getattr(settings, 'REPLICA_JANELA_PRIMARIO', JANELA_PRIMARIO)
+
+    def __call__(self, request):
+        try:
+            resposta = self.get_response(request)
+        finally:
+            token = getattr(request, '_token_replica', None)
+            if token is not None:
+                _leitura_liberada.reset(token)
+        if request.method not in METODOS_SEGUROS and hasattr(request, 'session'):
+            request.session[CHAVE_SESSAO] = time.time() + self.janela
+        return resposta
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'view_class', view_func)
+        if request.method not in METODOS_SEGUROS or getattr(view, 'usar_primario', False):
+            motivo = 'primario_view'
+        elif hasattr(request, 'session') and request.session.get(CHAVE_SESSAO, 0) > time.time():
+            motivo = 'primario_sessao'
+        else:
+            request._token_replica = _leitura_liberada.set(True)
+            return None
+        _contar(_decisoes, motivo)
+        return None
+
+
+# --- MÉTRICAS ---
+
+def _contador_de_consultas(alias):
+    def contar(execute, sql, params, many, context):
+        _contar(_consultas, alias)
+        return execute(sql, params, many, context)
+    return contar
+
+
+@receiver(connection_created)
+def instalar_contador(sender, connection, **kwargs):
+    if replicas() and not getattr(connection, '_contador_replicas', False):
+        connection.execute_wrappers.append(_contador_de_consultas(connection.alias))
+        connection._contador_replicas = True
+
+
+# --- RÉPLICA LOCAL (SQLITE) ---
+
+def atualizar_replica(destino, origem=DEFAULT_DB_ALIAS, paginas=1024):
+    """
+    Copia o banco `origem` sobre o da réplica `destino` com a API de backup
+    online do SQLite, `paginas` por passo (o primário continua aceitando
+    escritas entre os passos). Retorna os segundos gastos.
+    """
+    import sqlite3
+
+    inicio = time.perf_counter()
+    # Conexões próprias, fora de qualquer transação das conexões do Django
+    # (um backup lido de dentro de um `atomic` esperaria o lock para sempre).
+    leitura = sqlite3.connect(str(connections[origem].settings_dict['NAME']), uri=True)
+    copia = sqlite3.connect(str(connections[destino].settings_dict['NAME']), uri=True)
+    try:
+        leitura.backup(copia, pages=paginas)
+    finally:
+        copia.close()
+        leitura.close()
+    return time.perf_counter() - inicio
@@ -0,0 +1,111 @@
+# utils/tarefas.py
+"""
+Tarefas em segundo plano, executadas no próprio processo.
+
+Um pool pequeno de threads executa a função depois do commit da transação
+corrente (nada roda se ela for desfeita). Cada tarefa fecha as conexões com o
+banco ao terminar. Com `TAREFAS_SINCRONAS = True` nas configurações (útil em
+testes e em scripts), a tarefa roda na hora, na thread de quem a agendou.
+
+Tarefas longas iniciadas pela interface usam `iniciar_tarefa`: a função
+recebe uma `Tarefa` para relatar o progresso, que fica no cache e pode ser
+consultado em `utils:situacao_tarefa` (o cache precisa ser compartilhado
+entre os processos que servem as requisições; ver CACHES nas configurações).
+"""
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_trava = threading.Lock()
+
+
+def _obter_pool():
+    global _pool
+    with _trava:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'TAREFAS_WORKERS', 2), thread_name_prefix='tarefa'
+            )
+        return _pool
+
+
+def _executar(funcao, args, kwargs):
+    try:
+        return funcao(*args, **kwargs)
+    except Exception:
+        logger.exception('Falha na tarefa em segundo plano %s.', getattr(funcao, '__qualname__', funcao))
+        raise
+    finally:
+        connections.close_all()
+
+
+def agendar(funcao, *args, **kwargs):
+    """ Executa `funcao(*args, **kwargs)` em segundo plano após o commit. """
+    def enviar():
+        if getattr(settings, 'TAREFAS_SINCRONAS', False):
+            funcao(*args, **kwargs)
+        else:
+            _obter_pool().submit(_executar, funcao, args, kwargs)
+    transaction.on_commit(enviar)
+
+
+# --- TAREFAS COM PROGRESSO ---
+
+TAREFA_TIMEOUT = 60 * 60 * 24
+
+
+class Tarefa:
+    """ Situação de uma tarefa em segundo plano, guardada no cache. """
+
+    def __init__(self, tarefa_id, situacao):
+        self.id = tarefa_id
+        self.situacao = situacao
+
+    def _salvar(self):
+        cache.set(f'utils:tarefa:{self.id}', self.situacao, TAREFA_TIMEOUT)
+
+    def relatar(self, feito, total=None, **dados):
+        """ Atualiza o progresso (`feito` de `total`) e os dados parciais do resultado. """
+        self.situacao.update(estado='executando', feito=feito, **({'total': total} if total is not None else {}))
+        self.situacao['resultado'].update(dados)
+        self._salvar()
+
+    def _executar(self, funcao, args, kwargs):
+        self.relatar(0)
+        try:
+            resultado = funcao(*args, tarefa=self, **kwargs)
+        except Exception as e:
+            self.situacao.update(estado='falhou', erro=str(e))
+            self._salvar()
+            raise
+        self.situacao['estado'] = 'concluida'
+        if isinstance(resultado, dict):
+            self.situacao['resultado'].update(resultado)
+        self._salvar()
+
+
+def iniciar_tarefa(titulo, funcao, *args, usuario=None, **kwargs):
+    """
+    Agenda `funcao(*args, tarefa=<Tarefa>, **kwargs)` e devolve o id da tarefa.
+    Um dict devolvido pela função é juntado ao resultado.
+    """
+    tarefa = Tarefa(uuid.uuid4().hex, {
+        'titulo': titulo, 'estado': 'pendente', 'feito': 0, 'total': None,
+        'resultado': {}, 'erro': None, 'usuario_id': getattr(usuario, 'pk', None),
+    })
+    tarefa._salvar()
+    agendar(tarefa._executar, funcao, args, kwargs)
+    return tarefa.id
+
+
+def obter_tarefa(tarefa_id):
+    """ Situação da tarefa (dict) ou None se não existir ou tiver expirado. """
+    return cache.get(f'utils:tarefa:{tarefa_id}')
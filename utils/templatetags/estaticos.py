@@ -0,0 +1,25 @@
+# utils/templatetags/estaticos.py
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from utils.estaticos import variantes_webp
+
+register = template.Library()
+
+
+@register.simple_tag
+def imagem_responsiva(nome, alt='', sizes='100vw', **atributos):
+    """
+    `<picture>` da imagem estática `nome`, com as variantes WebP geradas pelo
+    `collectstatic` (ver utils/estaticos.py); sem elas, só o `<img>` original.
+    """
+    img = format_html(
+        '<img src="{}" alt="{}"{}>', static(nome), alt,
+        format_html_join('', ' {}="{}"', ((chave.replace('_', '-'), valor) for chave, valor in atributos.items())),
+    )
+    variantes = variantes_webp(nome)
+    if not variantes:
+        return img
+    srcset = ', '.join(f'{url} {largura}w' for largura, url in variantes)
+    return format_html('<picture><source type="image/webp" srcset="{}" sizes="{}">{}</picture>', srcset, sizes, img)
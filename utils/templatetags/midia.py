@@ -0,0 +1,19 @@
+# utils/templatetags/midia.py
+from django import template
+from django.templatetags.static import static
+
+from utils.midia import url_miniatura
+
+register = template.Library()
+
+
+@register.simple_tag
+def miniatura(arquivo, tamanho='p', padrao=None, formato='webp'):
+    """
+    URL da miniatura ('p', 'm' ou 'g'; ver utils/midia.py) de um ImageField,
+    ou do arquivo estático `padrao` se não houver imagem.
+    """
+    url = url_miniatura(arquivo, tamanho, formato)
+    if not url and padrao:
+        return static(padrao)
+    return url
@@ -0,0 +1,18 @@
+# utils/templatetags/navegacao.py
+from django import template
+
+from utils.breadcrumbs import itens_do_breadcrumb
+
+register = template.Library()
+
+
+@register.inclusion_tag('partials/breadcrumb.html', takes_context=True)
+def breadcrumb(context):
+    """
+    Renderiza o breadcrumb da página, com os títulos dinâmicos preenchidos
+    pelos objetos que a view já colocou no contexto.
+    """
+    request = context.get('request')
+    if request is None:
+        return {'itens': []}
+    return {'itens': itens_do_breadcrumb(request, context)}
@@ -1,3 +1,627 @@
-from django.test import TestCase
+import gzip
+import io
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import F
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from instituicao.models import Estado, Municipio, TipoInstituicao, Instituicao
+from usuario.models import UserProfile, Cargo, Patente, Funcao
+from .midia import TAMANHOS, FORMATOS, caminho_derivado, gerar_derivados, hash_do_nome, url_miniatura
+
+
+def imagem_png(cor='red', lado=400, formato='PNG'):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (lado, lado), cor).save(buffer, formato)
+    return buffer.getvalue()
+
+
+class MidiaTestMixin:
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracoes = override_settings(MEDIA_ROOT=self.media, TAREFAS_SINCRONAS=True)
+        configuracoes.enable()
+        self.addCleanup(configuracoes.disable)
+        estado = Estado.objects.create(nome='Estado Teste', uf='ET')
+        self.municipios = [Municipio.objects.create(nome=f'Cidade {i}', estado=estado) for i in range(3)]
+        self.tipo = TipoInstituicao.objects.create(nome='Polícia Militar')
+
+    def criar_instituicao(self, conteudo, nome='brasao.png', municipio=0):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Instituicao.objects.create(
+                tipo=self.tipo, municipio=self.municipios[municipio],
+                brasao_instituicao=SimpleUploadedFile(nome, conteudo, content_type='image/png'),
+            )
+
+
+class ArmazenamentoPorConteudoTests(MidiaTestMixin, TestCase):
+
+    def test_mesma_imagem_grava_um_unico_arquivo(self):
+        conteudo = imagem_png()
+        primeira = self.criar_instituicao(conteudo, 'um.png')
+        segunda = self.criar_instituicao(conteudo, 'dois.png', municipio=1)
+
+        self.assertEqual(primeira.brasao_instituicao.name, segunda.brasao_instituicao.name)
+        digest = hash_do_nome(primeira.brasao_instituicao.name)
+        self.assertIsNotNone(digest)
+        self.assertEqual(os.listdir(os.path.join(self.media, 'brasoes', digest[:2])), [f'{digest}.png'])
+
+    def test_miniaturas_geradas_e_usadas(self):
+        instituicao = self.criar_instituicao(imagem_png('blue'))
+        digest = hash_do_nome(instituicao.brasao_instituicao.name)
+        for tamanho in TAMANHOS:
+            for formato in FORMATOS:
+                self.assertTrue(os.path.exists(os.path.join(self.media, caminho_derivado(digest, tamanho, formato))))
+
+        url = url_miniatura(instituicao.brasao_instituicao, 'm')
+        self.assertTrue(url.endswith(f'{digest}-{TAMANHOS["m"]}.webp'))
+        html = Template("{% load midia %}{% miniatura arquivo 'm' %}").render(Context({'arquivo': instituicao.brasao_instituicao}))
+        self.assertEqual(html, url)
+
+    def test_extensao_vem_do_formato_detectado(self):
+        conteudo = imagem_png('orange', formato='JPEG')
+        jpg = self.criar_instituicao(conteudo, 'foto.jpg')
+        jpeg = self.criar_instituicao(conteudo, 'FOTO.JPEG', municipio=1)
+        self.assertEqual(jpg.brasao_instituicao.name, jpeg.brasao_instituicao.name)
+        self.assertTrue(jpg.brasao_instituicao.name.endswith('.jpg'))
+        # Um PNG enviado com nome de JPEG é gravado como .png.
+        png = self.criar_instituicao(imagem_png('gray'), 'enganoso.jpg', municipio=2)
+        self.assertTrue(png.brasao_instituicao.name.endswith('.png'))
+
+    def test_reenvio_gera_miniaturas_que_faltam(self):
+        conteudo = imagem_png('yellow')
+        instituicao = self.criar_instituicao(conteudo)
+        digest = hash_do_nome(instituicao.brasao_instituicao.name)
+        # Uma gravação anterior que falhou depois do original, antes das miniaturas.
+        faltando = os.path.join(self.media, caminho_derivado(digest, 'g', 'png'))
+        os.remove(faltando)
+        self.criar_instituicao(conteudo, municipio=1)
+        self.assertTrue(os.path.exists(faltando))
+
+    def test_tarefas_concorrentes_nao_deixam_miniaturas_orfas(self):
+        from django.core.files.storage import FileSystemStorage
+
+        instituicao = self.criar_instituicao(imagem_png('purple'))
+        nome = instituicao.brasao_instituicao.name
+        digest = hash_do_nome(nome)
+        diretorio = os.path.dirname(os.path.join(self.media, caminho_derivado(digest, 'p', 'webp')))
+        antes = sorted(os.listdir(diretorio))
+        todos = [(tamanho, formato) for tamanho in TAMANHOS for formato in FORMATOS]
+        armazenamento = FileSystemStorage(location=self.media)
+        # A segunda tarefa viu as miniaturas faltando antes de a primeira gravá-las...
+        with patch('utils.midia.derivados_faltando', return_value=todos):
+            self.assertEqual(gerar_derivados(nome, armazenamento), 0)
+            # ...ou até perdeu a corrida entre o exists() e o save().
+            vistos, exists = set(), armazenamento.exists
+            atrasado = lambda caminho: exists(caminho) if caminho in vistos else vistos.add(caminho)
+            with patch.object(armazenamento, 'exists', side_effect=atrasado):
+                self.assertEqual(gerar_derivados(nome, armazenamento), 0)
+        self.assertEqual(sorted(os.listdir(diretorio)), antes)
+
+    def test_arquivo_sem_hash_usa_original(self):
+        self.assertEqual(url_miniatura('brasoes/antigo.png'), '/media/brasoes/antigo.png')
+        self.assertEqual(url_miniatura(None), '')
+
+    @override_settings(DEBUG=True)
+    def test_midia_por_conteudo_com_cache_imutavel(self):
+        from .views import servir_midia
+
+        instituicao = self.criar_instituicao(imagem_png('green'))
+        resposta = servir_midia(RequestFactory().get('/'), instituicao.brasao_instituicao.name, document_root=self.media)
+        self.assertIn('immutable', resposta['Cache-Control'])
+
+
+class LimparMidiaTests(MidiaTestMixin, TestCase):
+
+    def gravar(self, caminho, conteudo):
+        completo = os.path.join(self.media, caminho)
+        os.makedirs(os.path.dirname(completo), exist_ok=True)
+        with open(completo, 'wb') as arquivo:
+            arquivo.write(conteudo)
+
+    def test_relatorio_e_remocao_de_orfaos(self):
+        from django.core.management import call_command
+
+        conteudo = imagem_png('purple')
+        instituicao = self.criar_instituicao(conteudo)
+        self.gravar('brasoes/antigo.png', conteudo)
+        self.gravar('derivados/00/' + '0' * 64 + '-96.webp', b'x')
+        Instituicao.objects.filter(pk=instituicao.pk).update(brasao_municipio='brasoes/sumiu.png')
+
+        saida = io.StringIO()
+        call_command('limpar_midia', '--idade-minima', '0', '--apagar', stdout=saida)
+        saida = saida.getvalue()
+
+        self.assertIn('Órfãos: 2', saida)
+        self.assertIn('Ausentes: 1', saida)
+        self.assertIn('Duplicados: 1 grupo(s)', saida)
+        self.assertIn(instituicao.nome_gerado, saida)
+        self.assertFalse(os.path.exists(os.path.join(self.media, 'brasoes/antigo.png')))
+        self.assertTrue(os.path.exists(os.path.join(self.media, instituicao.brasao_instituicao.name)))
+        digest = hash_do_nome(instituicao.brasao_instituicao.name)
+        self.assertTrue(os.path.exists(os.path.join(self.media, caminho_derivado(digest, 'p', 'webp'))))
+
+    def test_simulacao_nao_apaga(self):
+        from django.core.management import call_command
+
+        self.gravar('brasoes/antigo.png', b'abc')
+        call_command('limpar_midia', '--idade-minima', '0', '--apagar', '--simular', stdout=io.StringIO())
+        self.assertTrue(os.path.exists(os.path.join(self.media, 'brasoes/antigo.png')))
+
+
+class EstaticosComprimidosTests(TestCase):
+
+    def setUp(self):
+        origem, self.destino = tempfile.mkdtemp(), tempfile.mkdtemp()
+        for diretorio in (origem, self.destino):
+            self.addCleanup(shutil.rmtree, diretorio, ignore_errors=True)
+        os.makedirs(os.path.join(origem, 'css'))
+        os.makedirs(os.path.join(origem, 'images'))
+        with open(os.path.join(origem, 'css', 'site.css'), 'w') as arquivo:
+            arquivo.write('body { background: url("../images/fundo.png"); }\n' * 200)
+        with open(os.path.join(origem, 'images', 'fundo.png'), 'wb') as arquivo:
+            arquivo.write(imagem_png('orange', 800))
+        configuracoes = override_settings(
+            STATICFILES_DIRS=[origem], STATIC_ROOT=self.destino,
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'utils.estaticos.ArmazenamentoEstaticoComprimido'},
+            },
+        )
+        configuracoes.enable()
+        self.addCleanup(configuracoes.disable)
+
+    def coletar(self):
+        from django.core.management import call_command
+        from . import estaticos
+
+        with patch.object(estaticos, 'TAMANHO_MINIMO_IMAGEM', 0):
+            call_command('collectstatic', '--noinput', verbosity=0)
+
+    def test_collectstatic_grava_hash_compactados_e_variantes(self):
+        from django.contrib.staticfiles.storage import staticfiles_storage
+
+        self.coletar()
+        css = staticfiles_storage.stored_name('css/site.css')
+        self.assertRegex(css, r'^css/site\.[0-9a-f]{12}\.css$')
+        self.assertTrue(os.path.exists(os.path.join(self.destino, css + '.gz')))
+        html = Template("{% load estaticos %}{% imagem_responsiva 'images/fundo.png' alt='Fundo' %}").render(Context())
+        self.assertIn('.640w.webp 640w', html)
+        self.assertIn('.800w.webp 800w', html)
+
+        saida = io.StringIO()
+        from django.core.management import call_command
+        call_command('relatorio_estaticos', stdout=saida)
+        self.assertIn('Arquivos compactados: 1', saida.getvalue())
+        self.assertIn('Imagens: 1', saida.getvalue())
+
+    def test_servidor_entrega_variante_compactada(self):
+        from django.contrib.staticfiles.storage import staticfiles_storage
+        from .estaticos import ServidorEstaticos
+
+        self.coletar()
+        servidor = ServidorEstaticos(lambda environ, start_response: ['django'], raiz=self.destino, prefixo='/static/')
+        url = '/static/' + staticfiles_storage.stored_name('css/site.css')
+        respostas = []
+
+        def iniciar(status, cabecalhos):
+            respostas.append((status, dict(cabecalhos)))
+
+        corpo = b''.join(servidor({'REQUEST_METHOD': 'GET', 'PATH_INFO': url, 'HTTP_ACCEPT_ENCODING': 'gzip'}, iniciar))
+        status, cabecalhos = respostas[-1]
+        self.assertEqual((status, cabecalhos['Content-Encoding']), ('200 OK', 'gzip'))
+        self.assertIn('immutable', cabecalhos['Cache-Control'])
+        self.assertIn(b'background', gzip.decompress(corpo))
+
+        servidor({
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': url, 'HTTP_ACCEPT_ENCODING': 'gzip', 'HTTP_IF_NONE_MATCH': cabecalhos['ETag'],
+        }, iniciar)
+        self.assertEqual(respostas[-1][0], '304 Not Modified')
+        self.assertEqual(servidor({'REQUEST_METHOD': 'GET', 'PATH_INFO': '/outra/'}, iniciar), ['django'])
+
+
+class BreadcrumbTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        estado = Estado.objects.create(nome='São Paulo', uf='SP')
+        tipo = TipoInstituicao.objects.create(nome='Guarda Civil Municipal')
+        cls.gcm = Instituicao.objects.create(tipo=tipo, municipio=Municipio.objects.create(estado=estado, nome='Guaíra'))
+        cls.cargo = Cargo.objects.create(instituicao=cls.gcm, nome='Inspetor')
+        cls.admin = User.objects.create_superuser('admin_si', 'si@example.com', 'senha')
+
+    def test_rota_aninhada(self):
+        import re
+
+        self.client.force_login(self.admin)
+        resposta = self.client.get(reverse('instituicao:edita_cargo', args=[self.gcm.pk, self.cargo.pk]))
+        html = resposta.content.decode()
+        nav = html[html.index('<nav aria-label="breadcrumb">'):]
+        nav = nav[:nav.index('</nav>')]
+        itens = re.findall(r'<li class="breadcrumb-item[^"]*"[^>]*>(?:<a href="([^"]*)">)?([^<]*)', nav)
+        self.assertEqual(itens, [
+            (reverse('painel:dashboard'), 'Dashboard'),
+            (reverse('instituicao:detalhe_instituicao', args=[self.gcm.pk]), self.gcm.nome_gerado),
+            (reverse('instituicao:gerenciar_instituicao', args=[self.gcm.pk]), 'Gerenciamento'),
+            (reverse('instituicao:gerenciar_hierarquia', args=[self.gcm.pk]), 'Hierarquia'),
+            ('', 'Editar Inspetor'),
+        ])
+        self.assertIn('aria-current="page">Editar Inspetor', nav)
+
+
+class BackendSQLiteTests(TestCase):
+
+    def test_pragmas_e_begin_immediate(self):
+        from django.db import connection
+
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+@override_settings(REPLICAS_LEITURA=['replica'])
+class ReplicasTests(SimpleTestCase):
+
+    def setUp(self):
+        from . import replicas
+
+        self.replicas = replicas
+        self.roteador = replicas.RoteadorReplicas()
+
+    def test_roteador_so_usa_replica_quando_liberada(self):
+        self.assertEqual(self.roteador.db_for_read(Estado), 'default')
+        with self.replicas.leitura_em_replica():
+            self.assertEqual(self.roteador.db_for_read(Estado), 'replica')
+            self.assertEqual(self.roteador.db_for_write(Estado), 'default')
+            with self.replicas.primario():
+                self.assertEqual(self.roteador.db_for_read(Estado), 'default')
+        self.assertFalse(self.roteador.allow_migrate('replica', 'instituicao'))
+        self.assertTrue(self.roteador.allow_migrate('default', 'instituicao'))
+
+    def requisicao(self, metodo, view, sessao):
+        """ Passa a requisição pelo middleware; retorna se a view pôde ler da réplica. """
+        request = getattr(RequestFactory(), metodo)('/')
+        request.session = sessao
+        liberada = []
+
+        def get_response(request):
+            self.middleware.process_view(request, view, (), {})
+            liberada.append(self.replicas._leitura_liberada.get())
+            return None
+
+        self.middleware = self.replicas.ReplicaMiddleware(get_response)
+        self.middleware(request)
+        self.assertFalse(self.replicas._leitura_liberada.get())
+        return liberada[0]
+
+    def test_middleware_mantem_primario_apos_post(self):
+        from django.views.generic import TemplateView
+
+        def view(request):
+            return None
+
+        class ViewFixada(self.replicas.UsarPrimarioMixin, TemplateView):
+            pass
+
+        sessao = {}
+        self.assertTrue(self.requisicao('get', view, sessao))
+        self.assertFalse(self.requisicao('get', self.replicas.usar_primario(view), sessao))
+        self.assertFalse(self.requisicao('get', ViewFixada.as_view(), sessao))
+        self.assertFalse(self.requisicao('post', view, sessao))
+        self.assertFalse(self.requisicao('get', view, sessao))
+        sessao[self.replicas.CHAVE_SESSAO] = 0
+        self.assertTrue(self.requisicao('get', view, sessao))
+
+    def test_middleware_desligado_sem_replicas(self):
+        from django.core.exceptions import MiddlewareNotUsed
+
+        with override_settings(REPLICAS_LEITURA=[]), self.assertRaises(MiddlewareNotUsed):
+            self.replicas.ReplicaMiddleware(lambda request: None)
+
+
+class AtualizarReplicaTests(TransactionTestCase):
+
+    def test_copia_o_primario_para_o_arquivo_da_replica(self):
+        import sqlite3
+        from django.core.management import call_command
+        from django.db import connections
+
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio, ignore_errors=True)
+        connections.settings['replica_teste'] = connections.configure_settings({'default': {
+            'ENGINE': 'core.backends.sqlite3', 'NAME': os.path.join(diretorio, 'replica.sqlite3'),
+        }})['default']
+        self.addCleanup(connections.settings.pop, 'replica_teste')
+        Estado.objects.create(nome='Estado Teste', uf='ET')
+
+        saida = io.StringIO()
+        with override_settings(REPLICAS_LEITURA=['replica_teste']):
+            call_command('atualizar_replica', stdout=saida)
+        self.assertIn('replica_teste: atualizada', saida.getvalue())
+        copia = sqlite3.connect(os.path.join(diretorio, 'replica.sqlite3'))
+        self.addCleanup(copia.close)
+        self.assertEqual(copia.execute('SELECT uf FROM instituicao_estado').fetchall(), [('ET',)])
+
+
+@override_settings(PERFIL_SQL_AMOSTRAGEM=1, PERFIL_SQL_LIMITE_N1=3)
+class PerfilSQLTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        estado = Estado.objects.create(nome='Estado Teste', uf='ET')
+        for i in range(4):
+            Municipio.objects.create(nome=f'Cidade {i}', estado=estado)
+
+    def perfilar(self, get_response):
+        from django.http import HttpResponse
+        from .perfil_sql import PerfilSQLMiddleware
+
+        middleware = PerfilSQLMiddleware(lambda request: HttpResponse(get_response(request)))
+        with self.assertLogs('utils.perfil_sql') as logs:
+            resposta = middleware(RequestFactory().get('/'))
+        return resposta, logs.records[-1].perfil_sql
+
+    def test_impressao_digital_ignora_valores(self):
+        from .perfil_sql import impressao_digital
+
+        self.assertEqual(
+            impressao_digital('SELECT * FROM t WHERE id IN (%s, %s, %s) AND nome = \'x\' LIMIT 21'),
+            impressao_digital('SELECT * FROM t WHERE id IN (%s)  AND nome = \'y\' LIMIT 5'),
+        )
+
+    def test_n1_no_codigo_e_no_template(self):
+        def no_codigo(request):
+            return ''.join(m.estado.uf for m in Municipio.objects.all())
+
+        resposta, dados = self.perfilar(no_codigo)
+        self.assertEqual((dados['consultas'], dados['duplicadas']), (5, 3))
+        self.assertEqual(dados['n1'][0]['vezes'], 4)
+        self.assertTrue(dados['n1'][0]['pilha'][0].startswith('utils/tests.py:'))
+        self.assertIn('db;dur=', resposta['Server-Timing'])
+        self.assertIn('n1;desc="1 padrões N+1"', resposta['Server-Timing'])
+
+        def no_template(request):
+            template = Template('{% for m in municipios %}{{ m.estado.uf }}{% endfor %}')
+            return template.render(Context({'municipios': Municipio.objects.all()}))
+
+        resposta, dados = self.perfilar(no_template)
+        self.assertIn('<unknown source>:1', dados['n1'][0]['pilha'])
+
+    def test_sem_n1(self):
+        resposta, dados = self.perfilar(lambda request: str(list(Municipio.objects.select_related('estado'))))
+        self.assertEqual((dados['consultas'], dados['n1']), (1, []))
+        self.assertNotIn('n1;', resposta['Server-Timing'])
+
+    def test_desligado(self):
+        from django.core.exceptions import MiddlewareNotUsed
+        from .perfil_sql import PerfilSQLMiddleware
+
+        with override_settings(PERFIL_SQL_AMOSTRAGEM=0), self.assertRaises(MiddlewareNotUsed):
+            PerfilSQLMiddleware(lambda request: None)
+
+
+class Rota:
+    """
+    Orçamento de consultas de uma página, por papel (superusuário, admin da
+    instituição e membro comum), com os caches quentes.
+        kwargs:   {argumento da rota: objeto da massa de dados ('instituicao', 'tipo', 'cargo'...)};
+        consulta: query string da requisição.
+    """
+
+    def __init__(self, superusuario, admin, membro, kwargs=None, consulta=''):
+        self.orcamento = {'superusuario': superusuario, 'admin': admin, 'membro': membro}
+        self.kwargs = kwargs or {}
+        self.consulta = consulta
+
+
+# 2 = sessão + usuário (o piso de qualquer página autenticada com os caches quentes).
+# Ao criar uma rota, declare-a aqui; ao mudar um orçamento, diga no commit o porquê.
+INSTITUICAO = {'pk': 'instituicao'}
+NA_INSTITUICAO = {'instituicao_pk': 'instituicao'}
+
+ORCAMENTOS = {
+    'painel:home': Rota(2, 2, 2),
+    'painel:dashboard': Rota(5, 2, 2),
+    'autenticacao:login': Rota(2, 2, 2),
+    'autenticacao:logout': Rota(4, 4, 4),
+    'usuario:user_list': Rota(4, 4, 4),
+    'usuario:user_create': Rota(3, 2, 2),
+    'usuario:user_profile': Rota(5, 5, 5, {'pk': 'perfil'}),
+    'usuario:user_edit': Rota(6, 3, 3, {'pk': 'perfil'}),
+    'usuario:user_delete': Rota(3, 3, 3, {'pk': 'perfil'}),
+    'usuario:painel_admin_si': Rota(2, 2, 2),
+    'usuario:importar_usuarios': Rota(3, 2, 2),
+    'instituicao:lista_instituicoes': Rota(5, 2, 2),
+    'instituicao:cria_instituicao': Rota(4, 2, 2),
+    'instituicao:edita_instituicao': Rota(6, 2, 2, INSTITUICAO),
+    'instituicao:exclui_instituicao': Rota(3, 2, 2, INSTITUICAO),
+    'instituicao:ajax_carregar_municipios': Rota(2, 2, 2, consulta='estado_id={estado.pk}'),
+    'instituicao:ajax_buscar_municipios': Rota(2, 2, 2, consulta='q=cid'),
+    'instituicao:lista_tipos': Rota(3, 2, 2),
+    'instituicao:edita_tipo': Rota(3, 2, 2, {'pk': 'tipo'}),
+    'instituicao:exclui_tipo': Rota(3, 2, 2, {'pk': 'tipo'}),
+    'instituicao:aplicar_modelo_tipo': Rota(2, 2, 2, {'pk': 'tipo'}),
+    'instituicao:detalhe_instituicao': Rota(2, 2, 2, INSTITUICAO),
+    'instituicao:entrar_contexto': Rota(6, 6, 6, INSTITUICAO),
+    'instituicao:sair_contexto': Rota(2, 2, 2),
+    'instituicao:gerenciar_instituicao': Rota(2, 2, 2, INSTITUICAO),
+    'instituicao:lista_membros': Rota(4, 4, 2, NA_INSTITUICAO),
+    'instituicao:atribuir_membros': Rota(2, 2, 2, NA_INSTITUICAO),
+    'instituicao:gerenciar_hierarquia': Rota(2, 2, 2, NA_INSTITUICAO),
+    'instituicao:edita_cargo': Rota(3, 3, 2, {**NA_INSTITUICAO, 'pk': 'cargo'}),
+    'instituicao:exclui_cargo': Rota(3, 3, 2, {**NA_INSTITUICAO, 'pk': 'cargo'}),
+    'instituicao:edita_patente': Rota(3, 3, 2, {**NA_INSTITUICAO, 'pk': 'patente'}),
+    'instituicao:exclui_patente': Rota(3, 3, 2, {**NA_INSTITUICAO, 'pk': 'patente'}),
+    'instituicao:mover_patente': Rota(2, 2, 2, {**NA_INSTITUICAO, 'pk': 'patente'}),
+    'instituicao:ordenar_patentes': Rota(2, 2, 2, NA_INSTITUICAO),
+    'instituicao:edita_funcao': Rota(3, 3, 2, {**NA_INSTITUICAO, 'pk': 'funcao'}),
+    'instituicao:exclui_funcao': Rota(3, 3, 2, {**NA_INSTITUICAO, 'pk': 'funcao'}),
+}
+
+
+def rotas_nomeadas(namespaces=('painel', 'usuario', 'instituicao', 'autenticacao')):
+    """ 'namespace:nome' de todas as rotas nomeadas desses namespaces em core.urls. """
+    def percorrer(padroes, namespace):
+        for padrao in padroes:
+            if isinstance(padrao, URLResolver):
+                yield from percorrer(padrao.url_patterns, padrao.namespace or namespace)
+            elif isinstance(padrao, URLPattern) and padrao.name and namespace in namespaces:
+                yield f'{namespace}:{padrao.name}'
+
+    return sorted(set(percorrer(get_resolver().url_patterns, None)))
+
+
+class OrcamentoConsultasTests(TestCase):
+    """
+    Cada página dos apps, para cada papel, cabe no orçamento de consultas de
+    ORCAMENTOS, e o número de consultas não muda quando a massa de dados
+    cresce (instituições, membros, cargos, patentes e funções).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.estado = Estado.objects.create(nome='São Paulo', uf='SP')
+        cls.tipo = TipoInstituicao.objects.create(nome='Guarda Civil Municipal')
+        cls.outro_tipo = TipoInstituicao.objects.create(nome='Polícia Militar')
+        cls.superusuario = User.objects.create_superuser('admin_si', 'si@example.com', 'senha')
+        cls.instituicao = cls.criar_instituicao(0)
+        cls.cargo, cls.patente, cls.funcao = cls.criar_hierarquia(cls.instituicao, 0)
+        cls.admin = cls.criar_membro(cls.instituicao, 'admin_gcm', is_admin_instituicao=True)
+        cls.membro = cls.criar_membro(cls.instituicao, 'membro_gcm')
+        cls.perfil = cls.membro.userprofile
+        cls.crescer(1)
+
+    @classmethod
+    def criar_instituicao(cls, i):
+        municipio = Municipio.objects.create(estado=cls.estado, nome=f'Cidade {i}')
+        return Instituicao.objects.create(tipo=cls.tipo if i % 2 == 0 else cls.outro_tipo, municipio=municipio)
+
+    @classmethod
+    def criar_hierarquia(cls, instituicao, i):
+        return (
+            Cargo.objects.create(instituicao=instituicao, nome=f'Cargo {i}'),
+            Patente.objects.create(instituicao=instituicao, nome=f'Patente {i}', ordem=(i + 1) * 1000),
+            Funcao.objects.create(instituicao=instituicao, nome=f'Função {i}'),
+        )
+
+    @classmethod
+    def criar_membro(cls, instituicao, username, **campos):
+        user = User.objects.create_user(username, f'{username}@example.com', first_name=username.title())
+        cargo, patente, funcao = Cargo.objects.filter(instituicao=instituicao).first(), Patente.objects.filter(instituicao=instituicao).first(), Funcao.objects.filter(instituicao=instituicao).first()
+        UserProfile.objects.filter(user=user).update(
+            instituicao=instituicao, cargo=cargo, patente=patente,
+            status_vinculo=UserProfile.StatusVinculo.ATIVO, **campos,
+        )
+        user.userprofile.funcoes.add(funcao)
+        return user
+
+    @classmethod
+    def crescer(cls, fator):
+        """ Mais instituições (com hierarquia e membros) e mais membros e hierarquia na instituição medida. """
+        inicio = Instituicao.objects.count()
+        for i in range(inicio, inicio + 4 * fator):
+            outra = cls.criar_instituicao(i)
+            cls.criar_hierarquia(outra, i)
+            cls.criar_membro(outra, f'membro_{i}')
+        total = Cargo.objects.count()
+        for i in range(total, total + 3 * fator):
+            cls.criar_hierarquia(cls.instituicao, i)
+        for i in range(6 * fator):
+            cls.criar_membro(cls.instituicao, f'gcm_{inicio}_{i}')
+
+    def medir(self, nome, rota, usuario):
+        kwargs = {argumento: getattr(self, objeto).pk for argumento, objeto in rota.kwargs.items()}
+        url = reverse(nome, kwargs=kwargs)
+        if rota.consulta:
+            url += '?' + rota.consulta.format(estado=self.estado)
+        cache.clear()
+        self.client.force_login(usuario)
+        self.client.get(url)  # aquece os caches (autorização, hierarquia, instituições, municípios)
+        self.client.force_login(usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url)
+        self.assertLess(resposta.status_code, 500, f'{nome} ({url})')
+        # Copiadas já: os índices do CaptureQueriesContext se perdem quando o log de consultas da conexão enche.
+        return [consulta['sql'] for consulta in consultas.captured_queries]
+
+    def medir_todas(self):
+        papeis = {'superusuario': self.superusuario, 'admin': self.admin, 'membro': self.membro}
+        return {
+            (nome, papel): self.medir(nome, rota, usuario)
+            for nome, rota in ORCAMENTOS.items()
+            for papel, usuario in papeis.items()
+        }
+
+    def test_todas_as_rotas_tem_orcamento(self):
+        self.assertEqual(rotas_nomeadas(), sorted(ORCAMENTOS))
+
+    def test_orcamentos(self):
+        antes = self.medir_todas()
+        self.crescer(3)
+        depois = self.medir_todas()
+        for (nome, papel), consultas in depois.items():
+            orcamento = ORCAMENTOS[nome].orcamento[papel]
+            with self.subTest(rota=nome, papel=papel):
+                sql = '\n'.join(f'  {i}. {consulta}' for i, consulta in enumerate(consultas, 1))
+                self.assertLessEqual(len(consultas), orcamento, f'{nome} ({papel}): {len(consultas)} consultas, orçamento {orcamento}:\n{sql}')
+                self.assertEqual(len(consultas), len(antes[nome, papel]), f'{nome} ({papel}): as consultas cresceram com os dados:\n{sql}')
+
+
+class DadosSinteticosTests(TransactionTestCase):
+    # As threads do benchmark usam conexões próprias: precisam ver os dados já gravados.
+
+    def test_gerar_dados_e_benchmark_carga(self):
+        import json
+
+        from django.core.management import call_command
+
+        argumentos = ['--tipos', '2', '--instituicoes', '10', '--usuarios', '300', '--batch-size', '100', '--cargos', '2', '--funcoes', '3']
+        call_command('gerar_dados', *argumentos, stdout=io.StringIO())
+        self.assertEqual(Estado.objects.count(), 27)
+        self.assertEqual(Municipio.objects.count(), 5570)
+        self.assertEqual(Instituicao.objects.count(), 10)
+        self.assertEqual(Cargo.objects.count(), 20)
+        self.assertEqual(Funcao.objects.count(), 30)
+        self.assertEqual(UserProfile.objects.filter(user__username__startswith='sint').count(), 300)
+        self.assertFalse(UserProfile.objects.exclude(cargo__instituicao=F('instituicao')).exists())
+
+        # De novo: localidades mantidas, usuários continuam a numeração a partir do maior
+        # sufixo, mesmo com gerados apagados e outros usernames com o mesmo prefixo.
+        User.objects.filter(username__in=['sint0000010', 'sint0000011']).delete()
+        User.objects.create_user('sintetico')
+        call_command('gerar_dados', '--instituicoes', '0', '--usuarios', '50', stdout=io.StringIO())
+        self.assertEqual(Municipio.objects.count(), 5570)
+        self.assertTrue(User.objects.filter(username='sint0000349').exists())
+
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio, ignore_errors=True)
+        saida = os.path.join(diretorio, 'carga.json')
+        call_command('benchmark_carga', '--threads', '2', '--duracao', '0.5', '--aquecimento', '0', '--saida', saida, stdout=io.StringIO())
+        call_command(
+            'benchmark_carga', '--threads', '1', '--duracao', '0.3', '--aquecimento', '0',
+            '--saida', os.path.join(diretorio, 'depois.json'), '--comparar', saida, stdout=io.StringIO(),
+        )
+        with open(saida) as arquivo:
+            resultado = json.load(arquivo)
+        self.assertEqual(len(resultado['cenarios']), 6)
+        self.assertEqual(resultado['total']['erros'], 0)
+        self.assertGreater(resultado['total']['requisicoes'], 0)
+        self.assertFalse(User.objects.filter(username__startswith='benchmark_carga_').exists())
@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+app_name = 'utils'
+
+urlpatterns = [
+    path('metricas/banco/', views.metricas_banco, name='metricas_banco'),
+    path('<str:tarefa_id>/', views.situacao_tarefa, name='situacao_tarefa'),
+]
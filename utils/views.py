@@ -1,3 +1,38 @@
-from django.shortcuts import render
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.http import Http404, JsonResponse
+from django.views.static import serve
 
-# Create your views here.
+from . import replicas
+from .midia import hash_do_nome
+from .tarefas import obter_tarefa
+
+# Um ano: o nome dos arquivos endereçados por conteúdo muda junto com o conteúdo.
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+
+
+@login_required
+def situacao_tarefa(request, tarefa_id):
+    """ Progresso de uma tarefa em segundo plano (só para quem a iniciou ou superusuários). """
+    situacao = obter_tarefa(tarefa_id)
+    if situacao is None or not (request.user.is_superuser or situacao['usuario_id'] == request.user.pk):
+        raise Http404("Tarefa não encontrada.")
+    return JsonResponse({chave: valor for chave, valor in situacao.items() if chave != 'usuario_id'})
+
+
+@user_passes_test(lambda usuario: usuario.is_superuser)
+def metricas_banco(request):
+    """ Consultas por alias de banco e decisões do roteador de réplicas, neste processo. """
+    return JsonResponse({'replicas': replicas.replicas(), **replicas.metricas()})
+
+
+def servir_midia(request, path, document_root=None):
+    """
+    `django.views.static.serve` (desenvolvimento) com cache imutável para os
+    arquivos endereçados por conteúdo. Em produção, o servidor web deve enviar
+    o mesmo cabeçalho para `MEDIA_URL` (ex.: nginx `location /media/` com
+    `add_header Cache-Control "public, max-age=31536000, immutable"`).
+    """
+    resposta = serve(request, path, document_root=document_root)
+    if resposta.status_code == 200 and hash_do_nome(path):
+        resposta['Cache-Control'] = CACHE_IMUTAVEL
+    return resposta